@@ -1,116 +1,351 @@
-import io
-import pandas as pd
-import zipfile
-import base64
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Body
-from typing import Optional, Dict
-from fastapi.responses import StreamingResponse
+import asyncio
+import os
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Body, Query, Request, Response
+from typing import Optional, Dict, List
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import json
+import time
 import traceback
+from collections import Counter
 
 # Importamos las funciones de scoring que necesitan los dos contextos
-from services.scoring import run_scoring_loop_stream, run_single_scoring
+from services.scoring import run_dimensions_rescoring, run_scoring_loop_stream, run_single_scoring, SCORING_BATCH_SIZE
+from services.jobs import JobStore, get_job_manager
+from services.ingestion import UploadTooLargeError, iter_record_chunks, spool_upload
+from services.ranking import reweight_results
+from services.scoring_config import get_scoring_config
+from services.export import EXPORT_FORMATS, ExportUnavailableError, check_export_format, iter_csv, write_export_file
 
-# ¡CAMBIO CLAVE! Importamos las NUEVAS dependencias de contexto por separado
-from dependencies import get_qualitative_context, get_quantitative_context, get_thesis_context
+# El contexto (tesis + históricos) llega ya compacto y versionado en un único bundle
+from dependencies import get_context_bundle
+from services.context import ContextBundle
+from services.result_cache import get_result_cache
+from services.llm_scheduler import INTERACTIVE, get_llm_scheduler, llm_request_class
 
 router = APIRouter()
 
+
+def _job_store() -> JobStore:
+    """Base de jobs del worker; 503 si no se pudo abrir (los análisis van como stream directo)."""
+    manager = get_job_manager()
+    if manager is None:
+        raise HTTPException(status_code=503, detail="Los jobs de análisis no están disponibles en este servidor.")
+    return manager.store
+
+
+async def _direct_analysis_stream(
+    upload_path: str,
+    first_chunk: List[dict],
+    record_chunks,
+    context: ContextBundle,
+    request: Request,
+    batch_size: int,
+    force_rescore: bool,
+    max_concurrency: Optional[int]
+) -> StreamingResponse:
+    """Sin base de jobs: se lee el archivo completo y se puntúa en un stream directo (no reanudable)."""
+    import pandas as pd
+
+    try:
+        rest = await asyncio.to_thread(lambda: [record for chunk in record_chunks for record in chunk])
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO AL LEER EL ARCHIVO: {e}")
+        raise HTTPException(status_code=400, detail=f"Error al leer el archivo (asegúrate de que sea CSV o Excel válido): {e}")
+    finally:
+        os.remove(upload_path)
+    print(f"--- INICIANDO ANÁLISIS EN MODO STREAMING DIRECTO ({len(first_chunk) + len(rest)} filas, sin job) ---")
+    return StreamingResponse(
+        run_scoring_loop_stream(
+            pd.DataFrame(first_chunk + rest, dtype=object), context, is_disconnected=request.is_disconnected,
+            batch_size=batch_size, force_rescore=force_rescore, max_concurrency=max_concurrency
+        ),
+        media_type="text/event-stream"
+    )
+
 @router.post("/api/analyze")
 async def analyze_deals(
+    request: Request,
     new_deals_file: UploadFile = File(...),
-    # ¡CAMBIO CLAVE! Usamos Depends para obtener cada contexto por separado
-    df_qual_context: pd.DataFrame = Depends(get_qualitative_context),
-    df_quant_context: pd.DataFrame = Depends(get_quantitative_context),
-    thesis_context: str = Depends(get_thesis_context),
+    context: ContextBundle = Depends(get_context_bundle),
     # El header 'Accept' nos permite decidir si devolver un stream o no
-    accept: Optional[str] = Header(None)
+    accept: Optional[str] = Header(None),
+    # Modo lote: cuántas startups se envían en cada llamada al LLM (1 = una por llamada)
+    batch_size: int = SCORING_BATCH_SIZE,
+    # Puntuar también las startups ya evaluadas (históricos) y las repetidas dentro del archivo
+    force_rescore: bool = False,
+    # Máximo de llamadas al LLM en vuelo para este job (por defecto LLM_JOB_MAX_CONCURRENCY)
+    max_concurrency: Optional[int] = Query(None, ge=1)
 ):
     """
     Endpoint inteligente para analizar un archivo de startups.
-    - Si el cliente solicita 'text/event-stream', devuelve los resultados uno por uno.
+    - Si el cliente solicita 'text/event-stream', crea un job persistente y devuelve los
+      resultados uno por uno. El primer evento (`job`) trae el `job_id`; si la conexión se
+      corta, `GET /api/jobs/{job_id}/stream` con `Last-Event-ID` retoma desde ahí.
     - De lo contrario (no implementado actualmente), devolvería un JSON completo.
+    - Con `?batch_size=K` se puntúan K startups por llamada (limitado por la ventana del modelo).
+    - Las startups que ya están en los históricos no se envían al LLM: su fila trae
+      `historical_match` con la decisión y el puntaje anteriores. Las repetidas dentro del
+      archivo se puntúan una sola vez (`duplicate_of` = índice de la primera). Con
+      `?force_rescore=true` se puntúan todas.
+    - Las llamadas del job comparten el scheduler central con los demás jobs (por turnos) y
+      ceden el paso a los re-análisis interactivos; `?max_concurrency=N` limita las suyas.
+    - Archivos de más de MAX_UPLOAD_MB se rechazan con 413; el resto se lee por bloques, sin
+      cargar el archivo entero en memoria.
+    - Si la base de jobs no se puede abrir (p. ej. sistema de archivos de solo lectura), el
+      análisis va como stream directo: mismos eventos de filas y `stats`, sin `job` ni reanudación.
     """
     print(f"\n--- RECIBIDA PETICIÓN DE ANÁLISIS PARA '{new_deals_file.filename}' ---")
-    
-    try:
-        content = await new_deals_file.read()
-        filename = new_deals_file.filename.lower()
-        
-        # DEBUG: Inspect content to diagnose upload issues
-        print(f"DEBUG: Filename: {filename}")
-        print(f"DEBUG: Content length: {len(content)}")
-        
-        # Check if content is a Data URL (starts with 'data:')
-        # This happens if the frontend sends the file as a string instead of binary
-        if content.startswith(b'data:'):
-            print("⚠️ Data URL detected in backend. Decoding base64...")
-            try:
-                # Format is usually: data:application/vnd...;base64,UEsDB...
-                header, encoded = content.split(b',', 1)
-                content = base64.b64decode(encoded)
-                print(f"✅ Decoded Data URL. New content length: {len(content)}")
-                if len(content) > 20:
-                    print(f"DEBUG: First 20 bytes after decode: {content[:20]}")
-            except Exception as e:
-                print(f"❌ Error decoding Data URL: {e}")
-                # We continue with original content, though it will likely fail
-        
-        if len(content) > 20:
-            print(f"DEBUG: First 20 bytes: {content[:20]}")
-        else:
-            print(f"DEBUG: Content bytes: {content}")
-        
-        if filename.endswith('.xlsx'):
-            # Explicitly use openpyxl engine for .xlsx files
-            try:
-                df_to_score = pd.read_excel(io.BytesIO(content), engine='openpyxl')
-            except zipfile.BadZipFile:
-                print("⚠️ BadZipFile detected. The file might be a CSV renamed to .xlsx. Attempting to read as CSV.")
-                df_to_score = pd.read_csv(io.BytesIO(content))
-        else:
-            # Asumimos CSV por defecto
-            df_to_score = pd.read_csv(io.BytesIO(content))
-        
-        print(f"  -> Archivo leído. Shape: {df_to_score.shape}")
-        print(f"  -> Columnas: {df_to_score.columns.tolist()}")
-            
-    except Exception as e:
-        print(f"❌ ERROR CRÍTICO AL LEER EL ARCHIVO: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=400, detail=f"Error al leer el archivo (asegúrate de que sea CSV o Excel válido): {e}")
 
     # El frontend siempre pide un stream, así que esta es la ruta principal.
     if accept == "text/event-stream":
-        print("--- INICIANDO ANÁLISIS EN MODO STREAMING ---")
+        # El archivo se copia a disco por bloques (con límite de tamaño) y se parsea por trozos:
+        # el primer bloque valida el formato y arranca el job; el resto se lee en segundo plano.
+        try:
+            upload_path = await spool_upload(new_deals_file)
+        except UploadTooLargeError as e:
+            print(f"❌ ARCHIVO DEMASIADO GRANDE: {e}")
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            print(f"❌ ERROR CRÍTICO AL LEER EL ARCHIVO: {e}")
+            traceback.print_exc()
+            raise HTTPException(status_code=400, detail=f"Error al leer el archivo (asegúrate de que sea CSV o Excel válido): {e}")
+
+        try:
+            record_chunks = iter_record_chunks(upload_path, new_deals_file.filename)
+            first_chunk = await asyncio.to_thread(next, record_chunks, [])
+        except Exception as e:
+            os.remove(upload_path)
+            print(f"❌ ERROR CRÍTICO AL LEER EL ARCHIVO: {e}")
+            traceback.print_exc()
+            raise HTTPException(status_code=400, detail=f"Error al leer el archivo (asegúrate de que sea CSV o Excel válido): {e}")
+        if first_chunk:
+            print(f"  -> Columnas: {list(first_chunk[0].keys())}")
+
+        manager = get_job_manager()
+        if manager is None:
+            return await _direct_analysis_stream(
+                upload_path, first_chunk, record_chunks, context, request, batch_size, force_rescore, max_concurrency
+            )
+        job_id = manager.store.create_job(
+            new_deals_file.filename, first_chunk, batch_size, context.version, ingest_complete=False,
+            force_rescore=force_rescore, max_concurrency=max_concurrency
+        )
+        manager.ingest(job_id, record_chunks, len(first_chunk), upload_path)
+        print(f"--- INICIANDO ANÁLISIS EN MODO STREAMING (job {job_id}) ---")
         return StreamingResponse(
-            run_scoring_loop_stream(df_to_score, df_qual_context, df_quant_context, thesis_context),
-            media_type="text/event-stream"
+            manager.stream(
+                job_id, context,
+                # Si el usuario cierra la pestaña y no vuelve, el job se pausa (y deja de gastar cuota)
+                is_disconnected=request.is_disconnected
+            ),
+            media_type="text/event-stream",
+            headers={"X-Job-Id": job_id}
         )
     else:
         # Esta parte no se está usando actualmente, pero la dejamos por si se necesita en el futuro.
         raise HTTPException(status_code=400, detail="Este endpoint solo soporta análisis en modo streaming. Asegúrate de incluir el header 'Accept: text/event-stream'.")
 
+@router.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Estado y progreso de un job de análisis."""
+    job = _job_store().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'.")
+    return {
+        key: job[key]
+        for key in [
+            "id", "filename", "status", "error", "total_rows", "completed_rows", "ingest_complete", "ingest_error",
+            "cache_hits", "cache_misses", "context_version"
+        ]
+    }
+
+@router.get("/api/jobs/{job_id}/stream")
+async def stream_job(
+    job_id: str,
+    request: Request,
+    context: ContextBundle = Depends(get_context_bundle),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Reconecta al stream de un job. Repite las filas posteriores a `Last-Event-ID` y sigue
+    con las nuevas. Si el job estaba pausado o su worker se reinició, se retoma.
+    """
+    if _job_store().get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'.")
+    try:
+        last_seq = int(last_event_id or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El header 'Last-Event-ID' debe ser un número.")
+    return StreamingResponse(
+        get_job_manager().stream(job_id, context, last_event_id=last_seq, is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": job_id}
+    )
+
+@router.get("/api/jobs/{job_id}/export")
+async def export_job(job_id: str, export_format: str = Query("csv", alias="format")):
+    """
+    Descarga las filas ya puntuadas de un job (`?format=csv|xlsx|parquet`), con los
+    análisis anidados aplanados en columnas `sección.clave`. Se lee de la base por bloques:
+    el CSV se genera mientras se envía; XLSX y Parquet se escriben a un archivo temporal.
+    Si el job sigue corriendo, incluye las filas terminadas hasta ahora (header `X-Job-Status`).
+    """
+    store = _job_store()
+    job = store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'.")
+    try:
+        check_export_format(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="resultados_{job_id[:8]}.{export_format}"',
+        "X-Job-Status": job["status"],
+    }
+    if export_format == "csv":
+        return StreamingResponse(iter_csv(store, job_id), media_type=EXPORT_FORMATS["csv"], headers=headers)
+    path = await asyncio.to_thread(write_export_file, store, job_id, export_format)
+    return FileResponse(
+        path, media_type=EXPORT_FORMATS[export_format], headers=headers, background=BackgroundTask(os.remove, path)
+    )
+
 @router.post("/api/rerun-analysis")
 async def rerun_single_analysis(
+    response: Response,
     startup_data: Dict = Body(...),
-    # ¡CAMBIO CLAVE! También obtenemos los dos contextos para el re-análisis
-    df_qual_context: pd.DataFrame = Depends(get_qualitative_context),
-    df_quant_context: pd.DataFrame = Depends(get_quantitative_context),
-    thesis_context: str = Depends(get_thesis_context)
+    context: ContextBundle = Depends(get_context_bundle),
+    force_refresh: bool = False
 ):
     """
     Endpoint para re-analizar una única startup.
     Recibe los datos de la startup en formato JSON.
+    Si la misma startup ya se puntuó con el contexto actual, se devuelve desde la caché
+    (header `X-Result-Cache: HIT`) salvo que se pida `?force_refresh=true`.
     """
     if not startup_data:
         raise HTTPException(status_code=400, detail="No se proporcionaron datos de la startup.")
     
-    # ¡CAMBIO CLAVE! Pasamos los dos contextos a la función de re-análisis
-    updated_startup = await run_single_scoring(
-        startup_dict=startup_data,
-        df_qual_context=df_qual_context,
-        df_quant_context=df_quant_context,
-        thesis_context=thesis_context
-    )
+    # El bundle ya está serializado: no se vuelve a convertir ningún DataFrame por petición
+    stats = Counter()
+    # Un re-análisis es interactivo: pasa antes que las filas masivas en cola
+    with llm_request_class(INTERACTIVE):
+        updated_startup = await run_single_scoring(
+            startup_dict=startup_data, context=context, use_cache=not force_refresh, stats=stats
+        )
+    response.headers["X-Result-Cache"] = "HIT" if stats["cache_hits"] else "MISS"
     
-    return updated_startup
\ No newline at end of file
+    return updated_startup
+
+# Filas por petición de re-análisis parcial (cada una es una llamada al LLM)
+MAX_RERUN_ROWS = int(os.getenv("MAX_RERUN_ROWS", "200"))
+
+def _validate_rerun(rows_count: int, categories: List[str]) -> List[str]:
+    if rows_count == 0:
+        raise HTTPException(status_code=400, detail="No se indicó ninguna fila para re-analizar.")
+    if rows_count > MAX_RERUN_ROWS:
+        raise HTTPException(status_code=413, detail=f"Como máximo {MAX_RERUN_ROWS} filas por petición.")
+    config = get_scoring_config()
+    unknown = [category for category in categories if category not in config]
+    if not categories or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Categorías no válidas: {unknown or 'ninguna'}. Usa un subconjunto de: {', '.join(config)}."
+        )
+    # Sin repetidas y en el orden de scoring_config.json
+    return [category for category in config if category in categories]
+
+def _rerun_response(rescored, categories: List[str], started: float) -> dict:
+    failed = {
+        str(row.get("row_index", position)): missing
+        for position, (row, missing) in enumerate(rescored) if missing
+    }
+    return {
+        "categories": categories,
+        "rows": [row for row, _ in rescored],
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+@router.post("/api/rerun-dimensions")
+async def rerun_dimensions(
+    rows: List[Dict] = Body(..., embed=True),
+    categories: List[str] = Body(..., embed=True),
+    context: ContextBundle = Depends(get_context_bundle)
+):
+    """
+    Re-análisis parcial: vuelve a puntuar solo `categories` (subconjunto de scoring_config.json)
+    en cada una de `rows` (filas ya puntuadas), con un prompt acotado a esas dimensiones.
+    El resto del análisis se conserva y `final_weighted_score` se recalcula.
+    `failed` indica, por fila, las categorías que no se pudieron re-puntuar (conservan su valor).
+    """
+    categories = _validate_rerun(len(rows), categories)
+    started = time.perf_counter()
+    with llm_request_class(INTERACTIVE):
+        rescored = await run_dimensions_rescoring(rows, categories, context)
+    return _rerun_response(rescored, categories, started)
+
+@router.post("/api/jobs/{job_id}/rerun-dimensions")
+async def rerun_job_dimensions(
+    job_id: str,
+    row_indexes: List[int] = Body(..., embed=True),
+    categories: List[str] = Body(..., embed=True),
+    context: ContextBundle = Depends(get_context_bundle)
+):
+    """Igual que /api/rerun-dimensions con filas terminadas de un job; los resultados guardados se actualizan."""
+    store = _job_store()
+    if store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'.")
+    row_indexes = sorted(set(row_indexes))
+    categories = _validate_rerun(len(row_indexes), categories)
+    stored = store.results_for(job_id, row_indexes)
+    pending = [row_index for row_index in row_indexes if row_index not in stored]
+    if pending:
+        raise HTTPException(status_code=409, detail=f"Filas sin resultado todavía: {pending}.")
+    started = time.perf_counter()
+    with llm_request_class(INTERACTIVE):
+        rescored = await run_dimensions_rescoring([stored[row_index] for row_index in row_indexes], categories, context)
+    store.update_results(job_id, {row["row_index"]: row for row, _ in rescored})
+    return _rerun_response(rescored, categories, started)
+
+def _validate_weights(weights: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    if weights is None:
+        return None
+    try:
+        return {category: float(weight) for category, weight in weights.items()}
+    except (AttributeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'weights' debe ser un objeto {categoría: peso numérico}.")
+
+@router.post("/api/reweight")
+async def reweight_rows(
+    rows: List[Dict] = Body(..., embed=True),
+    weights: Optional[Dict] = Body(None, embed=True)
+):
+    """
+    Recalcula el puntaje final y el ranking de filas ya puntuadas con los pesos actuales
+    (o con `weights`), sin volver a llamar al LLM.
+    """
+    return await asyncio.to_thread(reweight_results, rows, _validate_weights(weights))
+
+@router.post("/api/jobs/{job_id}/reweight")
+async def reweight_job(job_id: str, weights: Optional[Dict] = Body(None, embed=True)):
+    """Igual que /api/reweight, con las filas ya terminadas de un job."""
+    store = _job_store()
+    if store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'.")
+    weights = _validate_weights(weights)
+    rows = [json.loads(result_json) for _, result_json in store.results_after(job_id, 0)]
+    return await asyncio.to_thread(reweight_results, rows, weights)
+
+@router.get("/api/cache/stats")
+async def get_cache_stats():
+    """Aciertos y fallos acumulados de la caché de resultados, y su ocupación en disco."""
+    return get_result_cache().stats()
+
+@router.get("/api/scheduler/stats")
+async def get_scheduler_stats(job_id: Optional[str] = None):
+    """Llamadas al LLM en cola y en vuelo por clase en este worker, y la espera estimada (de `job_id` si se indica)."""
+    return get_llm_scheduler().status(job_id)
\ No newline at end of file
@@ -0,0 +1,25 @@
+import os
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from dependencies import app_state
+from services.shared_state import MULTI_WORKER, get_worker_registry
+
+router = APIRouter()
+
+@router.get("/api/health")
+async def health():
+    """
+    Estado del worker que atiende la petición: 200 cuando terminó su startup, 503 mientras
+    carga. En modo multi-worker incluye el estado de todos los workers de la máquina.
+    """
+    bundle = app_state.get("context_bundle")
+    status = {
+        "status": "ready" if app_state.get("ready") else "starting",
+        "worker": os.getpid(),
+        "context_version": bundle.version if bundle is not None else None,
+    }
+    if MULTI_WORKER:
+        status["workers"] = get_worker_registry().workers()
+    return JSONResponse(status, status_code=200 if app_state.get("ready") else 503)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.metrics import render_prometheus
+from services.scoring import model_router
+
+router = APIRouter()
+
+@router.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Métricas del proceso en formato de texto de Prometheus: tiempos por etapa del scoring,
+    llamadas y tokens por modelo (éxitos, 429, not found, JSON inválido), respuestas por
+    defecto y tiempos de las peticiones HTTP.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/api/metrics/models")
+async def get_model_status():
+    """Estado del router de modelos: circuito, tasa de error y latencia mediana de cada modelo."""
+    return model_router.snapshot()
@@ -0,0 +1,394 @@
+"""
+Benchmark offline del pipeline de scoring: usa el backend fake (sin gastar cuota) y mide
+filas por minuto, latencia p50/p95 por fila, tiempo hasta el primer evento SSE, bytes de
+prompt por fila y pico de RSS.
+
+Uso (desde backend/):
+    python benchmark.py                                   # 10, 1.000 y 10.000 filas, los tres escenarios
+    python benchmark.py --rows 10,1000 --latency 0.2 --rate-429 0.05 --malformed 0.02
+    python benchmark.py --json bench.json                 # guarda los resultados
+    python benchmark.py --baseline bench.json             # compara y falla si hay regresiones
+
+Escenarios:
+    stream   run_scoring_loop_stream sobre un DataFrame
+    single   run_single_scoring fila a fila (SCORING_CONCURRENCY peticiones a la vez)
+    analyze  POST /api/analyze con un CSV, a través de la app ASGI completa (job + SSE)
+
+Cada combinación (escenario, filas) corre en un subproceso con cachés y base de jobs
+temporales, así los resultados no se contaminan entre sí y el pico de RSS es el de esa corrida.
+Por defecto las cuotas del limitador no frenan (se mide el pipeline, no la cuota de Google);
+`--real-quotas` usa las de MODEL_PRIORITY_CONFIG.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Dict, Iterator, List, Optional
+
+SCENARIOS = ["stream", "single", "analyze"]
+DEFAULT_ROWS = [10, 1000, 10000]
+
+SECTORES = ["fintech", "edtech", "healthtech", "agritech", "logística", "retail", "SaaS B2B", "climatech", "proptech"]
+PAISES = ["Perú", "Chile", "Colombia", "México", "Argentina", "Uruguay"]
+ETAPAS = ["pre-seed", "seed", "serie A"]
+CLIENTES = ["pymes", "bancos", "colegios", "clínicas", "agricultores", "retailers", "municipios"]
+
+
+# --- DATOS SINTÉTICOS ---
+
+def synthetic_rows(n: int, seed: int = 0) -> Iterator[dict]:
+    """Postulaciones inventadas pero variadas (cada una distinta, así no hay aciertos de caché)."""
+    rng = random.Random(seed)
+    for i in range(n):
+        sector = rng.choice(SECTORES)
+        yield {
+            "Nombre de la startup": f"Startup {i}",
+            "Web": f"https://startup{i}.example.com",
+            "Sector": sector,
+            "País": rng.choice(PAISES),
+            "Etapa": rng.choice(ETAPAS),
+            "Descripción": (
+                f"Plataforma de {sector} para {rng.choice(CLIENTES)} que automatiza "
+                f"{rng.choice(['cobranzas', 'inventarios', 'reclutamiento', 'logística', 'ventas'])}."
+            ),
+            "Ingresos mensuales (USD)": rng.randint(0, 200_000),
+            "Tamaño del equipo": rng.randint(1, 40),
+        }
+
+
+def synthetic_csv(n: int, seed: int = 0) -> bytes:
+    import pandas as pd
+
+    return pd.DataFrame(list(synthetic_rows(n, seed))).to_csv(index=False).encode("utf-8")
+
+
+# --- MÉTRICAS ---
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB, macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def instrument_row_latency(latencies: List[float]) -> None:
+    """Mide cuánto tarda cada fila (o lote) dentro del pool: cuota, LLM, reintentos y parseo."""
+    import services.scoring as scoring
+
+    original = scoring._score_rows
+
+    async def timed_score_rows(rows, *args, **kwargs):
+        started = time.perf_counter()
+        result = await original(rows, *args, **kwargs)
+        latencies.extend([time.perf_counter() - started] * len(rows))
+        return result
+
+    scoring._score_rows = timed_score_rows
+
+
+# --- CLIENTE ASGI MÍNIMO (para medir el primer evento SSE sin buffering) ---
+
+def multipart_body(field: str, filename: str, content: bytes, boundary: str) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+
+async def post_upload(app, path: str, filename: str, content: bytes, on_chunk) -> int:
+    boundary = "benchmarkboundary"
+    body = multipart_body("new_deals_file", filename, content, boundary)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"accept", b"text/event-stream"),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    body_sent = False
+    never = asyncio.Event()
+    status = {}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await never.wait()  # El cliente nunca se desconecta
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            on_chunk(message["body"].decode("utf-8"))
+
+    await app(scope, receive, send)
+    return status.get("code", 0)
+
+
+# --- ESCENARIOS (se ejecutan en el subproceso) ---
+
+async def bench_stream(n: int, args) -> dict:
+    import pandas as pd
+    from services.context_artifact import load_or_build_context
+    from services.llm_backend import get_llm_backend
+    from services.scoring import MODEL_PRIORITY_CONFIG, run_scoring_loop_stream
+
+    bundle = load_or_build_context()
+    await get_llm_backend().register_context(bundle, [name for name, _, _ in MODEL_PRIORITY_CONFIG])
+    df = pd.DataFrame(list(synthetic_rows(n, args.seed)))
+
+    latencies: List[float] = []
+    instrument_row_latency(latencies)
+    started = time.perf_counter()
+    first_event = None
+    rows = 0
+    async for event in run_scoring_loop_stream(df, bundle, batch_size=args.batch_size):
+        if first_event is None:
+            first_event = time.perf_counter() - started
+        if event.startswith("id:"):
+            rows += 1
+    return {
+        "rows": rows,
+        "elapsed": time.perf_counter() - started,
+        "first_event": first_event,
+        "first_row": first_event,  # En este escenario cada evento es una fila
+        "latencies": latencies,
+    }
+
+
+async def bench_single(n: int, args) -> dict:
+    from services.context_artifact import load_or_build_context
+    from services.llm_backend import get_llm_backend
+    from services.scoring import MODEL_PRIORITY_CONFIG, SCORING_CONCURRENCY, run_single_scoring
+
+    bundle = load_or_build_context()
+    await get_llm_backend().register_context(bundle, [name for name, _, _ in MODEL_PRIORITY_CONFIG])
+    semaphore = asyncio.Semaphore(SCORING_CONCURRENCY)
+    latencies: List[float] = []
+
+    async def rerun(startup: dict) -> None:
+        async with semaphore:
+            call_started = time.perf_counter()
+            await run_single_scoring(startup, bundle)
+            latencies.append(time.perf_counter() - call_started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(rerun(startup) for startup in synthetic_rows(n, args.seed)))
+    return {"rows": len(latencies), "elapsed": time.perf_counter() - started, "first_event": None, "latencies": latencies}
+
+
+async def bench_analyze(n: int, args) -> dict:
+    import main
+
+    await main.startup_event()
+    content = synthetic_csv(n, args.seed)
+    latencies: List[float] = []
+    instrument_row_latency(latencies)
+
+    buffer = ""
+    counts = {"rows": 0}
+    marks: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    def on_chunk(chunk: str) -> None:
+        nonlocal buffer
+        marks.setdefault("first_event", time.perf_counter() - started)
+        buffer += chunk
+        *events, buffer = buffer.split("\n\n")
+        for event in events:
+            if event.startswith("id:"):
+                marks.setdefault("first_row", time.perf_counter() - started)
+                counts["rows"] += 1
+
+    status = await post_upload(main.app, "/api/analyze", "benchmark.csv", content, on_chunk)
+    if status != 200:
+        raise RuntimeError(f"/api/analyze respondió {status}")
+    return {
+        "rows": counts["rows"],
+        "elapsed": time.perf_counter() - started,
+        "first_event": marks.get("first_event"),
+        "first_row": marks.get("first_row"),
+        "latencies": latencies,
+    }
+
+
+def run_child(args) -> None:
+    """Ejecuta un escenario y escribe el resultado como JSON en la última línea de stdout."""
+    import services.scoring as scoring
+    from services.llm_backend import get_llm_backend
+    from services.rate_limiter import ModelRateLimiter
+
+    if not args.real_quotas:
+        scoring.rate_limiter = ModelRateLimiter([(name, 10**9, 10**12) for name, _, _ in scoring.MODEL_PRIORITY_CONFIG])
+        scoring.model_router.rate_limiter = scoring.rate_limiter
+    scoring.QUOTA_BACKOFF_SECONDS = args.quota_backoff
+
+    scenario = {"stream": bench_stream, "single": bench_single, "analyze": bench_analyze}[args.child]
+    # Los prints del pipeline (uno o dos por fila) se descartan; siguen ejecutándose como en producción
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        measured = asyncio.run(scenario(args.n, args))
+
+    backend = get_llm_backend()
+    rows = measured["rows"] or 1
+    latencies = measured.pop("latencies")
+    result = {
+        "scenario": args.child,
+        "input_rows": args.n,
+        **measured,
+        "rows_per_minute": measured["rows"] / measured["elapsed"] * 60 if measured["elapsed"] else None,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "llm_calls": backend.calls,
+        "prompt_bytes_per_row": backend.prompt_bytes / rows,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    sys.__stdout__.write(json.dumps(result) + "\n")
+
+
+# --- ORQUESTACIÓN ---
+
+def run_in_subprocess(scenario: str, n: int, args, workdir: str) -> Optional[dict]:
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake",
+        FAKE_LLM_LATENCY_SECONDS=str(args.latency),
+        FAKE_LLM_429_RATE=str(args.rate_429),
+        FAKE_LLM_MALFORMED_RATE=str(args.malformed),
+        RESULT_CACHE_PATH=os.path.join(workdir, f"results-{scenario}-{n}.sqlite3"),
+        JOBS_DB_PATH=os.path.join(workdir, f"jobs-{scenario}-{n}.sqlite3"),
+        SCORING_CONCURRENCY=str(args.concurrency),
+        PYTHONWARNINGS="ignore",
+    )
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", scenario, "--n", str(n),
+        "--seed", str(args.seed), "--batch-size", str(args.batch_size), "--quota-backoff", str(args.quota_backoff),
+    ]
+    if args.real_quotas:
+        command.append("--real-quotas")
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        print(f"❌ {scenario} con {n} filas falló:\n{completed.stderr[-2000:]}")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def format_ms(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+def print_table(results: List[dict]) -> None:
+    header = f"{'escenario':<9} {'filas':>6} {'filas/min':>10} {'p50 ms':>7} {'p95 ms':>7} {'1er evento ms':>13} " \
+             f"{'1ª fila ms':>10} {'bytes prompt/fila':>17} {'llamadas':>8} {'RSS pico MB':>11} {'total s':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<9} {r['input_rows']:>6} {r['rows_per_minute']:>10.0f} {format_ms(r['p50_latency']):>7} "
+            f"{format_ms(r['p95_latency']):>7} {format_ms(r['first_event']):>13} {format_ms(r.get('first_row')):>10} "
+            f"{r['prompt_bytes_per_row']:>17.0f} {r['llm_calls']:>8} {r['peak_rss_mb']:>11.1f} {r['elapsed']:>8.1f}"
+        )
+
+
+def compare_with_baseline(results: List[dict], baseline_path: str, tolerance: float) -> bool:
+    """Avisa si bajan las filas/min o suben los bytes de prompt por fila más que `tolerance`."""
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["input_rows"]): r for r in json.load(f)["results"]}
+    ok = True
+    for r in results:
+        previous = baseline.get((r["scenario"], r["input_rows"]))
+        if previous is None:
+            continue
+        label = f"{r['scenario']} / {r['input_rows']} filas"
+        if r["rows_per_minute"] < previous["rows_per_minute"] * (1 - tolerance):
+            print(f"⚠️ Regresión de throughput en {label}: {previous['rows_per_minute']:.0f} -> {r['rows_per_minute']:.0f} filas/min")
+            ok = False
+        if r["prompt_bytes_per_row"] > previous["prompt_bytes_per_row"] * (1 + tolerance):
+            print(
+                f"⚠️ Regresión de tamaño de prompt en {label}: "
+                f"{previous['prompt_bytes_per_row']:.0f} -> {r['prompt_bytes_per_row']:.0f} bytes/fila"
+            )
+            ok = False
+    return ok
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline de scoring (backend fake).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Escenarios separados por coma.")
+    parser.add_argument("--rows", default=",".join(map(str, DEFAULT_ROWS)), help="Tamaños de upload separados por coma.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada por llamada al LLM (s).")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fracción de llamadas que responden 429.")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fracción de respuestas con JSON cortado.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SCORING_CONCURRENCY", "4")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("SCORING_BATCH_SIZE", "1")))
+    parser.add_argument("--quota-backoff", type=float, default=1.0, help="Bloqueo tras un 429 simulado (s).")
+    parser.add_argument("--real-quotas", action="store_true", help="Usar las cuotas RPM/TPM reales del limitador.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo.")
+    parser.add_argument("--baseline", help="Resultados previos (--json) con los que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Margen antes de marcar una regresión.")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--n", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.child:
+        run_child(args)
+        return 0
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+    print(
+        f"--- Benchmark: latencia {args.latency}s, 429 {args.rate_429:.0%}, JSON roto {args.malformed:.0%}, "
+        f"concurrencia {args.concurrency}, lote {args.batch_size} ---"
+    )
+    results = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+        for scenario in scenarios:
+            for n in sizes:
+                print(f"  -> {scenario} con {n} filas...", flush=True)
+                result = run_in_subprocess(scenario, n, args, workdir)
+                if result is not None:
+                    results.append(result)
+    print()
+    print_table(results)
+
+    if args.json:
+        settings = {k: v for k, v in vars(args).items() if k not in ("child", "n", "json", "baseline")}
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"\nResultados guardados en '{args.json}'.")
+    if args.baseline and not compare_with_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
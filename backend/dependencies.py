@@ -1,26 +1,23 @@
-import pandas as pd
 from fastapi import HTTPException
 
+from services.context import ContextBundle
+
 # ¡CAMBIO! Creamos espacios separados para cada tipo de contexto.
 app_state = {
-    "df_qualitative_context": None, # Para el Reporte Final (análisis cualitativo)
-    "df_quantitative_context": None, # Para los 13G Puntos (datos cuantitativos)
-    "thesis_context_text": ""
+    "thesis_context_text": "",
+    "context_bundle": None, # Contexto compacto y versionado que se envía al LLM (históricos + tesis)
+    "context_registration": None, # Tarea que registra el bundle como contenido cacheado en el proveedor
+    "ready": False # El worker terminó su startup y puede atender análisis
 }
 
 # --- DEPENDENCIAS ---
 # Las modificamos para que devuelvan el contexto correcto.
-def get_qualitative_context() -> pd.DataFrame:
-    if app_state["df_qualitative_context"] is None:
-        raise HTTPException(status_code=503, detail="El contexto cualitativo histórico no está cargado.")
-    return app_state["df_qualitative_context"]
-
-def get_quantitative_context() -> pd.DataFrame:
-    if app_state["df_quantitative_context"] is None:
-        raise HTTPException(status_code=503, detail="El contexto cuantitativo histórico no está cargado.")
-    return app_state["df_quantitative_context"]
-
 def get_thesis_context() -> str:
     if not app_state.get("thesis_context_text"):
         raise HTTPException(status_code=503, detail="El contexto de la tesis no está cargado.")
-    return app_state["thesis_context_text"]
\ No newline at end of file
+    return app_state["thesis_context_text"]
+
+def get_context_bundle() -> ContextBundle:
+    if app_state.get("context_bundle") is None:
+        raise HTTPException(status_code=503, detail="El contexto de scoring no está cargado.")
+    return app_state["context_bundle"]
\ No newline at end of file
@@ -1,9 +1,12 @@
+import asyncio
 import os
-import pandas as pd
-import fitz
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
-from fastapi import FastAPI
+
+# Antes de importar la app: los servicios leen su configuración (os.getenv) al importarse
+load_dotenv()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -11,12 +14,19 @@ from fastapi.responses import FileResponse
 # Importamos los routers de la API
 from api.analysis import router as analysis_router
 from api.config import router as config_router
+from api.metrics import router as metrics_router
+from api.health import router as health_router
 
 # Importamos nuestro contenedor de estado
 from dependencies import app_state
+from services.context_artifact import CONTEXT_ARTIFACT_PATH, load_or_build_context
+from services.jobs import JOB_RETENTION_DAYS, get_job_manager
+from services.llm_backend import get_llm_backend
+from services.metrics import HTTP_REQUEST_SECONDS, trace_scope
+from services.scoring import MODEL_PRIORITY_CONFIG
+from services.shared_state import MULTI_WORKER, get_worker_registry
 
 # --- CONFIGURACIÓN INICIAL DE LA APP ---
-load_dotenv()
 app = FastAPI(
     title="Deal Flow AI API v2",
     description="API para puntuar postulaciones de startups y analizar datos históricos."
@@ -26,10 +36,31 @@ app.add_middleware(
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
 )
 
-# --- ¡NUEVAS RUTAS A ARCHIVOS DE CONTEXTO! ---
-PUNTOS_CSV_PATH = "13G_puntos.csv"
-HISTORICOS_CSV_PATH = "Reporte_Final_con_Historicos.csv" # ¡Corregido!
-CONTEXT_PDF_PATH = "contexto_uv.pdf"
+# --- MÉTRICAS POR PETICIÓN ---
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Mide cada petición (hasta los headers en el caso de los streams). Con `X-Trace: 1`
+    la petición imprime su traza por etapas y la devuelve en el header `Server-Timing`.
+    """
+    started = time.perf_counter()
+    wants_trace = request.headers.get("x-trace", "").lower() in ("1", "true")
+    with trace_scope(f"{request.method} {request.url.path}", enabled=wants_trace or None) as trace:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        route=getattr(route, "path", None) or "static",
+        method=request.method,
+        status=response.status_code,
+    )
+    if trace is not None and trace.spans:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+# Las rutas a los archivos de contexto (CSV + PDF) viven en services/context_artifact.py.
+# El arranque lee el artefacto precompilado y solo vuelve a los archivos fuente si cambiaron.
 
 
 # --- EVENTO DE INICIO (STARTUP) ---
@@ -37,35 +68,49 @@ CONTEXT_PDF_PATH = "contexto_uv.pdf"
 async def startup_event():
     print("--- 🚀 Iniciando la aplicación y cargando datos de contexto... ---")
     
+    started = time.perf_counter()
+    if MULTI_WORKER:
+        get_worker_registry().mark_starting(os.getpid())
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         print("❗️ ERROR CRÍTICO: GOOGLE_API_KEY no encontrada.")
     else:
-        genai.configure(api_key=api_key)
+        # google.generativeai se importa y configura en la primera llamada (ver services/llm_backend.py)
         print(f"✅ API Key de Google cargada: {api_key[:4]}...")
 
     try:
-        # --- LÓGICA DE CARGA SEPARADA ---
-        print("1. Cargando archivos de datos de contexto...")
-        df_historicos = pd.read_csv(HISTORICOS_CSV_PATH)
-        df_puntos = pd.read_csv(PUNTOS_CSV_PATH)
-        
-        # Guardamos cada DataFrame en su lugar correspondiente en el estado.
-        app_state["df_qualitative_context"] = df_historicos
-        app_state["df_quantitative_context"] = df_puntos
-        
-        print(f"  -> Contexto Cualitativo ('{HISTORICOS_CSV_PATH}') cargado ({len(df_historicos)} filas).")
-        print(f"  -> Contexto Cuantitativo ('{PUNTOS_CSV_PATH}') cargado ({len(df_puntos)} filas).")
-        
-        # Cargamos el PDF de contexto.
-        print("3. Cargando PDF de contexto...")
-        with open(CONTEXT_PDF_PATH, "rb") as pdf_file:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-            thesis_text = "".join(page.get_text() for page in doc)
-            app_state["thesis_context_text"] = thesis_text
-        print(f"✅ PDF de contexto cargado. {len(thesis_text)} caracteres.")
+        # El bundle (tesis + históricos + índice) sale del artefacto si los archivos no cambiaron;
+        # pandas y PyMuPDF solo se importan si hay que reconstruirlo.
+        if app_state["context_bundle"] is not None:
+            # serve.py lo cargó antes del fork: todos los workers comparten esas páginas de memoria
+            print("1. Contexto precargado por el proceso principal (compartido entre workers).")
+            bundle = app_state["context_bundle"]
+        else:
+            print(f"1. Cargando contexto (artefacto '{CONTEXT_ARTIFACT_PATH}')...")
+            bundle = load_or_build_context()
+            app_state["context_bundle"] = bundle
+            app_state["thesis_context_text"] = bundle.thesis_text
+        mode = "retrieval (top-k por fila)" if bundle.retriever is not None else "completo"
+        print(f"✅ Bundle de contexto v{bundle.version} en modo {mode}: {len(bundle.context_text)} caracteres.")
+
+        # Si el proveedor lo permite, lo registramos como contenido cacheado. Va en segundo plano:
+        # mientras tanto las peticiones llevan el contexto dentro del prompt.
+        app_state["context_registration"] = asyncio.create_task(
+            get_llm_backend().register_context(bundle, [model_name for model_name, _, _ in MODEL_PRIORITY_CONFIG])
+        )
+
+        # Retomamos los jobs que quedaron a medias si un worker anterior se reinició.
+        print("2. Revisando jobs de análisis pendientes...")
+        job_manager = get_job_manager()
+        if job_manager is not None:
+            purged = job_manager.store.purge_older_than(JOB_RETENTION_DAYS)
+            resumed = job_manager.resume_orphaned(bundle)
+            print(f"✅ Jobs retomados: {len(resumed)}. Jobs antiguos eliminados: {purged}.")
         
-        print("\n--- ✅ Carga de contexto finalizada. La API está lista. ---")
+        app_state["ready"] = True
+        if MULTI_WORKER:
+            get_worker_registry().mark_ready(os.getpid(), bundle.version)
+        print(f"\n--- ✅ Worker {os.getpid()}: carga de contexto finalizada en {(time.perf_counter() - started) * 1000:.0f} ms. La API está lista. ---")
     except FileNotFoundError as e:
         print(f"❗️ ERROR CRÍTICO: No se encontró un archivo de contexto: {e}.")
     except Exception as e:
@@ -75,6 +120,8 @@ async def startup_event():
 # --- INCLUSIÓN DE RUTAS Y ARCHIVOS ESTÁTICOS ---
 app.include_router(analysis_router)
 app.include_router(config_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.join(BASE_DIR, "..", "frontend")
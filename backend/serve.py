@@ -0,0 +1,118 @@
+"""
+Arranque multi-worker: el proceso principal carga el contexto UNA vez y después hace fork
+de N workers de uvicorn que comparten el socket, la memoria del contexto (copy-on-write)
+y la cuota de los modelos (limitador en SQLite, ver services/shared_state.py).
+
+Uso (desde backend/):
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+Cada worker avisa cuando termina su startup (GET /api/health lista el estado de todos).
+Si un worker muere, se lanza otro. Con un solo worker basta `uvicorn main:app` como
+hasta ahora. Requiere fork (Linux / macOS).
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Set
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor multi-worker con contexto y cuota compartidos.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="Segundos para que arranquen los workers.")
+    return parser.parse_args()
+
+
+def spawn_worker(app, sock: socket.socket, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # En el hijo, uvicorn instala sus propios manejadores de señales
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        import uvicorn
+
+        config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+        os._exit(0)
+    return pid
+
+
+def wait_until_ready(registry, pids: Set[int], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ready = {worker["pid"] for worker in registry.workers() if worker["ready"]}
+        if pids <= ready:
+            print(f"--- ✅ {len(pids)} workers listos ({', '.join(map(str, sorted(pids)))}). ---")
+            return
+        time.sleep(0.2)
+    print(f"⚠️ No todos los workers terminaron su startup en {timeout:.0f}s. Ver GET /api/health.")
+
+
+def serve() -> None:
+    args = parse_args()
+    # Antes de importar la app: el limitador y el registro de workers se crean en modo compartido
+    os.environ["MULTI_WORKER"] = "1"
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from main import app
+    from dependencies import app_state
+    from services.context_artifact import CONTEXT_ARTIFACT_PATH, load_or_build_context
+    from services.shared_state import get_worker_registry
+
+    print(f"--- 🚀 Cargando contexto (artefacto '{CONTEXT_ARTIFACT_PATH}') antes de lanzar {args.workers} workers... ---")
+    bundle = load_or_build_context()
+    app_state["context_bundle"] = bundle
+    app_state["thesis_context_text"] = bundle.thesis_text
+    # El contexto vive mientras viva el servidor: fuera del GC, los workers no tocan (ni copian) sus páginas
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    registry = get_worker_registry()
+    registry.clear()
+    workers: Set[int] = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    workers.update(spawn_worker(app, sock, args) for _ in range(max(1, args.workers)))
+    wait_until_ready(registry, set(workers), args.ready_timeout)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        registry.remove(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} terminó (código {os.waitstatus_to_exitcode(status)}). Lanzando otro...")
+            time.sleep(1)
+            workers.add(spawn_worker(app, sock, args))
+    print("--- Servidor detenido. ---")
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from services.retrieval import ContextRetriever
+
+if TYPE_CHECKING:
+    # Solo hace falta para construir el bundle desde los CSV (ver services/context_artifact.py)
+    import pandas as pd
+
+# Se incluye en el hash de versión: si cambia el formato del contexto o del
+# prompt compartido, la versión cambia aunque los archivos fuente sean iguales.
+CONTEXT_FORMAT_VERSION = "2"
+
+# "retrieval": cada prompt lleva solo el contexto más parecido a la startup (tamaño acotado).
+# "full": cada prompt lleva todo el histórico y la tesis completa (cacheados en el proveedor).
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "retrieval").lower()
+RETRIEVAL_TOP_K_STARTUPS = int(os.getenv("RETRIEVAL_TOP_K_STARTUPS", "3"))
+RETRIEVAL_TOP_K_PASSAGES = int(os.getenv("RETRIEVAL_TOP_K_PASSAGES", "4"))
+RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "30000"))
+
+
+# --- SERIALIZACIÓN COMPACTA ---
+
+def compact_records(df: "pd.DataFrame") -> List[dict]:
+    """Registros del DataFrame sin las columnas vacías `Unnamed: N` ni los campos nulos."""
+    useful = df.loc[:, ~df.columns.astype(str).str.startswith("Unnamed:")].dropna(axis=1, how="all")
+    return [
+        {k: v for k, v in record.items() if v is not None and v != ""}
+        for record in json.loads(useful.to_json(orient="records"))
+    ]
+
+
+def compact_records_json(df: "pd.DataFrame") -> str:
+    """Serializa un DataFrame como lista de registros JSON compacta (sin indentación)."""
+    return json.dumps(compact_records(df), ensure_ascii=False, separators=(",", ":"))
+
+
+def compute_source_version(source_paths: Iterable[str]) -> str:
+    """Hash corto del contenido de los archivos de contexto (y del formato del bundle)."""
+    digest = hashlib.sha256(CONTEXT_FORMAT_VERSION.encode())
+    for path in source_paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def compute_context_version(source_version: str, mode: str = CONTEXT_MODE) -> str:
+    """
+    Versión del bundle: la de las fuentes más el modo y los parámetros de retrieval, que
+    cambian los prompts (y por lo tanto la caché de resultados y la del proveedor).
+    """
+    settings = f"{mode}:{RETRIEVAL_TOP_K_STARTUPS}:{RETRIEVAL_TOP_K_PASSAGES}:{RETRIEVAL_MAX_CHARS}"
+    return hashlib.sha256(f"{source_version}:{settings}".encode()).hexdigest()[:16]
+
+
+# --- BUNDLE DE CONTEXTO ---
+
+@dataclass
+class ContextBundle:
+    """
+    Contexto compartido por todas las filas (tesis + históricos), construido una sola
+    vez en el arranque. `context_text` es lo que se registra como contenido cacheado
+    en el proveedor; si no hay caché, se antepone a cada prompt.
+    En modo "retrieval", `context_text` solo lleva las instrucciones generales y
+    `row_context` añade a cada fila los fragmentos más parecidos del histórico.
+    """
+    version: str
+    thesis_text: str
+    qualitative_json: str
+    quantitative_json: str
+    context_text: str
+    retriever: Optional[ContextRetriever] = None
+
+    @property
+    def estimated_tokens(self) -> int:
+        return len(self.context_text) // 4 + 1
+
+    def row_context(self, startup_data: str) -> str:
+        """Contexto específico de una fila (vacío en modo "full")."""
+        if self.retriever is None:
+            return ""
+        selected = self.retriever.retrieve(startup_data)
+        thesis_passages = "\n...\n".join(selected["thesis"])
+        return f"""
+        **CONTEXTO RELEVANTE PARA ESTA STARTUP:**
+
+        1.  **Extractos de la Tesis de Inversión (Nuestra Filosofía):**
+            ```
+            {thesis_passages}
+            ```
+
+        2.  **Startups históricas similares (Contexto CUALITATIVO):**
+            ```json
+            [{",".join(selected["qualitative"])}]
+            ```
+
+        3.  **Puntajes y decisiones de startups similares (Contexto CUANTITATIVO):**
+            ```json
+            [{",".join(selected["quantitative"])}]
+            ```
+        """
+
+
+def build_context_prompt(thesis_text: str, qualitative_json: str, quantitative_json: str) -> str:
+    return f"""
+        Eres un analista de Venture Capital de clase mundial en UTEC Ventures. Tu tarea es analizar startups candidatas usando dos tipos de contexto histórico.
+
+        **CONTEXTO ESTRATÉGICO Y DATOS HISTÓRICOS:**
+
+        1.  **Tesis de Inversión (Nuestra Filosofía):**
+            ```
+            {thesis_text}
+            ```
+
+        2.  **Contexto Histórico CUALITATIVO:**
+            Esta es una lista de informes cualitativos de startups que hemos analizado. Úsala para entender nuestro estilo de evaluación.
+            ```json
+            {qualitative_json}
+            ```
+
+        3.  **Contexto Histórico CUANTITATIVO:**
+            Esta es una tabla con los puntajes numéricos y decisiones finales pasadas. Úsala para calibrar tus puntajes.
+            ```json
+            {quantitative_json}
+            ```
+        """
+
+
+def build_retrieval_preamble() -> str:
+    return """
+        Eres un analista de Venture Capital de clase mundial en UTEC Ventures. Tu tarea es analizar startups candidatas usando dos tipos de contexto histórico.
+
+        Con cada startup candidata recibirás extractos de nuestra Tesis de Inversión y las startups históricas más parecidas:
+        - El contexto CUALITATIVO son informes de startups que hemos analizado. Úsalo para entender nuestro estilo de evaluación.
+        - El contexto CUANTITATIVO son puntajes numéricos y decisiones finales pasadas. Úsalo para calibrar tus puntajes.
+        """
+
+
+def build_context_bundle(
+    df_qual_context: "pd.DataFrame",
+    df_quant_context: "pd.DataFrame",
+    thesis_text: str,
+    version: Optional[str] = None,
+    mode: str = CONTEXT_MODE
+) -> ContextBundle:
+    return bundle_from_records(
+        compact_records(df_qual_context), compact_records(df_quant_context), thesis_text, version, mode
+    )
+
+
+def bundle_from_records(
+    qualitative_records: List[dict],
+    quantitative_records: List[dict],
+    thesis_text: str,
+    version: Optional[str] = None,
+    mode: str = CONTEXT_MODE
+) -> ContextBundle:
+    """Bundle a partir de los registros ya compactados (lo que guarda el artefacto de contexto)."""
+    qualitative_json = json.dumps(qualitative_records, ensure_ascii=False, separators=(",", ":"))
+    quantitative_json = json.dumps(quantitative_records, ensure_ascii=False, separators=(",", ":"))
+
+    retriever = None
+    if mode == "retrieval":
+        retriever = ContextRetriever(
+            qualitative_records,
+            quantitative_records,
+            thesis_text,
+            top_k_startups=RETRIEVAL_TOP_K_STARTUPS,
+            top_k_passages=RETRIEVAL_TOP_K_PASSAGES,
+            max_chars=RETRIEVAL_MAX_CHARS,
+        )
+        context_text = build_retrieval_preamble()
+    else:
+        context_text = build_context_prompt(thesis_text, qualitative_json, quantitative_json)
+
+    return ContextBundle(
+        version=version or hashlib.sha256(
+            (CONTEXT_FORMAT_VERSION + mode + thesis_text + qualitative_json + quantitative_json).encode()
+        ).hexdigest()[:16],
+        thesis_text=thesis_text,
+        qualitative_json=qualitative_json,
+        quantitative_json=quantitative_json,
+        context_text=context_text,
+        retriever=retriever,
+    )
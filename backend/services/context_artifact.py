@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from typing import Optional, Sequence
+
+from services.context import (
+    ContextBundle, bundle_from_records, compact_records, compute_context_version, compute_source_version
+)
+
+# Archivos fuente del contexto (relativos a backend/)
+PUNTOS_CSV_PATH = "13G_puntos.csv"
+HISTORICOS_CSV_PATH = "Reporte_Final_con_Historicos.csv"
+CONTEXT_PDF_PATH = "contexto_uv.pdf"
+CONTEXT_SOURCE_PATHS = (HISTORICOS_CSV_PATH, PUNTOS_CSV_PATH, CONTEXT_PDF_PATH)
+
+# Lo caro de extraer de los archivos fuente (texto de la tesis y registros compactos), solo datos
+# en JSON. El prompt y el índice de retrieval dependen de CONTEXT_MODE/RETRIEVAL_* y se arman al
+# cargarlo (milisegundos), así que el mismo artefacto sirve con cualquier configuración.
+# Se regenera con `python -m services.context_artifact` cuando cambian los archivos fuente.
+CONTEXT_ARTIFACT_PATH = os.getenv("CONTEXT_ARTIFACT_PATH", "context_artifact.json")
+ARTIFACT_FORMAT_VERSION = "2"
+
+
+def extract_pdf_text(path: str) -> str:
+    # PyMuPDF solo se importa cuando hay que reconstruir el artefacto
+    import fitz
+
+    with open(path, "rb") as pdf_file:
+        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+        return "".join(page.get_text() for page in doc)
+
+
+def load_context_artifact(
+    source_version: str,
+    path: str = CONTEXT_ARTIFACT_PATH
+) -> Optional[dict]:
+    """
+    Devuelve los datos del artefacto si existe y fue generado a partir de los mismos
+    archivos fuente (`source_version` es el hash de su contenido).
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except FileNotFoundError:
+        print(f"  -> No hay artefacto de contexto en '{path}'.")
+        return None
+    except Exception as e:
+        print(f"  ⚠️ Artefacto de contexto ilegible ('{path}'): {e}")
+        return None
+
+    if artifact.get("format") != ARTIFACT_FORMAT_VERSION or artifact.get("source_version") != source_version:
+        print(f"  ⚠️ Artefacto de contexto desactualizado (v{artifact.get('source_version')}, fuentes v{source_version}).")
+        return None
+    return artifact
+
+
+def build_context_artifact(
+    source_version: str,
+    source_paths: Sequence[str] = CONTEXT_SOURCE_PATHS,
+    path: str = CONTEXT_ARTIFACT_PATH
+) -> dict:
+    """
+    Extrae los datos de los CSV y el PDF y los guarda en `path`. Si el sistema de archivos
+    es de solo lectura (p. ej. en Vercel), los datos se usan igual sin guardarlos.
+    """
+    import pandas as pd
+
+    historicos_path, puntos_path, pdf_path = source_paths
+    df_historicos = pd.read_csv(historicos_path)
+    df_puntos = pd.read_csv(puntos_path)
+    print(f"  -> Contexto Cualitativo ('{historicos_path}') cargado ({len(df_historicos)} filas).")
+    print(f"  -> Contexto Cuantitativo ('{puntos_path}') cargado ({len(df_puntos)} filas).")
+
+    thesis_text = extract_pdf_text(pdf_path)
+    print(f"  -> PDF de contexto ('{pdf_path}') cargado. {len(thesis_text)} caracteres.")
+
+    artifact = {
+        "format": ARTIFACT_FORMAT_VERSION,
+        "source_version": source_version,
+        "thesis_text": thesis_text,
+        "qualitative_records": compact_records(df_historicos),
+        "quantitative_records": compact_records(df_puntos),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+        # Reemplazo atómico: otro worker nunca ve un artefacto a medio escribir
+        os.replace(tmp_path, path)
+        print(f"  -> Artefacto de contexto guardado en '{path}'.")
+    except OSError as e:
+        print(f"  ⚠️ No se pudo guardar el artefacto de contexto: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return artifact
+
+
+def load_or_build_context(
+    source_paths: Sequence[str] = CONTEXT_SOURCE_PATHS,
+    path: str = CONTEXT_ARTIFACT_PATH
+) -> ContextBundle:
+    """Bundle de contexto para el arranque: el artefacto si está al día; si no, se reconstruye."""
+    source_version = compute_source_version(source_paths)
+    artifact = load_context_artifact(source_version, path)
+    if artifact is None:
+        print("  -> Reconstruyendo el contexto desde los archivos fuente...")
+        artifact = build_context_artifact(source_version, source_paths, path)
+    return bundle_from_records(
+        artifact["qualitative_records"], artifact["quantitative_records"], artifact["thesis_text"],
+        version=compute_context_version(source_version),
+    )
+
+
+if __name__ == "__main__":
+    # Paso de build: `cd backend && python -m services.context_artifact`
+    started = time.perf_counter()
+    version = compute_source_version(CONTEXT_SOURCE_PATHS)
+    build_context_artifact(version)
+    print(f"✅ Artefacto de contexto v{version} generado en {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.context import ContextBundle
+
+# Similitud mínima (0-1) entre nombres normalizados para considerarlos la misma startup.
+DEDUP_NAME_SIMILARITY = float(os.getenv("DEDUP_NAME_SIMILARITY", "0.92"))
+# Con la misma web, similitud mínima de los nombres (si ambas filas lo tienen) para no contradecirla.
+DEDUP_DOMAIN_NAME_FLOOR = float(os.getenv("DEDUP_DOMAIN_NAME_FLOOR", "0.6"))
+# Con DEDUP_ENABLED=0 todas las filas van al LLM, como antes.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Sufijos societarios que no distinguen a una startup ("Acme S.A.C." == "Acme").
+LEGAL_SUFFIXES = {"sac", "saa", "sa", "srl", "eirl", "spa", "sas", "inc", "llc", "ltd", "corp", "gmbh", "ltda"}
+# Hosts compartidos que no identifican a una startup: correo, redes, mensajería, repositorios de
+# código, acortadores y documentos. También se ignoran sus subdominios (p. ej. m.facebook.com).
+GENERIC_DOMAINS = {
+    "gmail.com", "hotmail.com", "outlook.com", "yahoo.com", "icloud.com", "live.com", "proton.me",
+    "linkedin.com", "x.com", "twitter.com", "instagram.com", "facebook.com", "youtube.com", "tiktok.com",
+    "wa.me", "whatsapp.com", "t.me", "telegram.me",
+    "github.com", "github.io", "gitlab.com", "bitbucket.org", "huggingface.co",
+    "bit.ly", "tinyurl.com", "goo.gl", "forms.gle", "linktr.ee", "lnkd.in", "cutt.ly", "rebrand.ly",
+    "google.com", "notion.so", "notion.site", "canva.com", "dropbox.com", "calendly.com", "medium.com",
+}
+# Universidades e instituciones públicas (".edu", ".edu.pe", ".ac.uk", ".gob.pe"...): muchas startups distintas.
+_INSTITUTIONAL_DOMAIN_RE = re.compile(r"(^|\.)(edu|ac|gob|gov|mil)(\.[a-z]{2})?$")
+
+NAME_COLUMNS = ("Nombre de la startup", "Nombre", "Startup", "Nombres")
+# Solo columnas de web: los dominios de correo (universidades, incubadoras) se comparten entre startups
+_WEBSITE_COLUMN_RE = re.compile(r"(web|sitio|url|p[aá]gina|dominio)", re.IGNORECASE)
+_DOMAIN_RE = re.compile(r"(?:[a-z0-9-]+\.)+[a-z]{2,}")
+
+
+def normalize_name(name) -> str:
+    """Minúsculas, sin tildes ni puntuación ni sufijos societarios: "Acme S.A.C." -> "acme"."""
+    if not isinstance(name, str):
+        return ""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    # "S.A.C." -> "sac" antes de separar por puntuación
+    text = re.sub(r"\b((?:[a-z]\.){2,})", lambda m: m.group(1).replace(".", ""), text)
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def normalize_website(value) -> Optional[str]:
+    """Dominio de una URL o correo ("https://www.Acme.pe/about" -> "acme.pe"); None si es genérico."""
+    if not isinstance(value, str):
+        return None
+    text = value.strip().lower()
+    if "@" in text:
+        text = text.rsplit("@", 1)[1]
+    text = re.sub(r"^[a-z]+://", "", text)
+    text = re.sub(r"^www\d?\.", "", text)
+    match = _DOMAIN_RE.match(text)
+    if match is None:
+        return None
+    domain = match.group(0)
+    return None if is_generic_domain(domain) else domain
+
+
+def is_generic_domain(domain: str) -> bool:
+    if _INSTITUTIONAL_DOMAIN_RE.search(domain):
+        return True
+    return any(domain == generic or domain.endswith("." + generic) for generic in GENERIC_DOMAINS)
+
+
+def row_identity(row: dict) -> Tuple[str, Set[str]]:
+    """(nombre normalizado, dominios) de una fila, buscando el nombre y las webs por columna."""
+    name = next((normalize_name(row[column]) for column in NAME_COLUMNS if row.get(column)), "")
+    domains = {
+        domain for column, value in row.items()
+        if _WEBSITE_COLUMN_RE.search(str(column)) and (domain := normalize_website(value))
+    }
+    return name, domains
+
+
+def domain_match_allowed(name: str, other: str) -> bool:
+    """La misma web vale como coincidencia salvo que los dos nombres digan otra cosa."""
+    return not name or not other or name_similarity(name, other) >= DEDUP_DOMAIN_NAME_FLOOR
+
+
+def name_similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    if a.replace(" ", "") == b.replace(" ", ""):
+        return 1.0
+    # "Lab 1" y "Lab 11" son parecidos pero distintos: los números tienen que coincidir
+    if re.findall(r"\d+", a) != re.findall(r"\d+", b):
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+# --- STARTUPS YA EVALUADAS (HISTÓRICOS) ---
+
+def _first_number(record: dict, keys: Tuple[str, ...]) -> Optional[float]:
+    for key in keys:
+        try:
+            return round(float(record[key]), 2)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class KnownStartupIndex:
+    """
+    Startups de los históricos (`Nombres` en Reporte_Final_con_Historicos.csv, `Startup` en
+    13G_puntos.csv) con su decisión y puntaje, para reconocerlas por nombre o web.
+    """
+
+    def __init__(self, qualitative_records: List[dict], quantitative_records: List[dict]):
+        self.entries: Dict[str, dict] = {}
+        self.domains: Dict[str, str] = {}
+        for record in qualitative_records:
+            entry = self._entry(record.get("Nombres"))
+            if entry is None:
+                continue
+            entry["sources"].append("Reporte_Final_con_Historicos.csv")
+            entry["decision"] = record.get("Status")
+            entry["tags"] = record.get("Tags")
+            entry["historical_score"] = _first_number(
+                record, ("Promedio - Total (comite)", "Puntaje Prom.Comité", "Value Comite")
+            )
+            for domain in row_identity(record)[1]:
+                self.domains.setdefault(domain, entry["key"])
+        for record in quantitative_records:
+            entry = self._entry(record.get("Startup"))
+            if entry is None:
+                continue
+            entry["sources"].append("13G_puntos.csv")
+            scores = {
+                key[len("Puntaje_"):]: value for key, value in record.items()
+                if key.startswith("Puntaje_") and value is not None
+            }
+            if scores:
+                entry["scores"] = scores
+            if record.get("Ronda"):
+                entry["round"] = record["Ronda"]
+
+    def _entry(self, name) -> Optional[dict]:
+        key = normalize_name(name)
+        if not key:
+            return None
+        return self.entries.setdefault(key, {"key": key, "name": name.strip(), "sources": []})
+
+    @classmethod
+    def from_bundle(cls, bundle: ContextBundle) -> "KnownStartupIndex":
+        return cls(json.loads(bundle.qualitative_json), json.loads(bundle.quantitative_json))
+
+    def match(self, name: str, domains: Set[str]) -> Optional[dict]:
+        """La startup histórica que coincide (por web, nombre exacto o parecido), con cómo coincidió."""
+        for domain in domains:
+            key = self.domains.get(domain)
+            if key is not None and domain_match_allowed(name, key):
+                return {
+                    **self._public(self.entries[key]), "match": "website",
+                    "similarity": round(name_similarity(name, key), 3) if name else None,
+                }
+        if not name:
+            return None
+        if name in self.entries:
+            return {**self._public(self.entries[name]), "match": "name", "similarity": 1.0}
+        best_key, best_similarity = None, 0.0
+        for key in self.entries:
+            similarity = name_similarity(name, key)
+            if similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        if best_key is not None and best_similarity >= DEDUP_NAME_SIMILARITY:
+            return {**self._public(self.entries[best_key]), "match": "fuzzy", "similarity": round(best_similarity, 3)}
+        return None
+
+    @staticmethod
+    def _public(entry: dict) -> dict:
+        return {key: value for key, value in entry.items() if key != "key"}
+
+
+_known_indexes: Dict[str, KnownStartupIndex] = {}
+
+
+def get_known_startups(bundle: ContextBundle) -> KnownStartupIndex:
+    """Índice de históricos del bundle (se construye una vez por versión de contexto)."""
+    if bundle.version not in _known_indexes:
+        _known_indexes.clear()
+        _known_indexes[bundle.version] = KnownStartupIndex.from_bundle(bundle)
+    return _known_indexes[bundle.version]
+
+
+# --- DUPLICADOS DENTRO DEL UPLOAD ---
+
+NEW, DUPLICATE, KNOWN = "new", "duplicate", "known"
+
+
+class UploadDeduplicator:
+    """
+    Clasifica las filas de un upload en el orden en que se toman para puntuar:
+    - `known`: startup ya evaluada en los históricos (no se envía al LLM salvo `force_rescore`).
+    - `duplicate`: misma startup que una fila anterior del upload; reutiliza su resultado.
+    - `new`: se puntúa normalmente.
+    Los nombres parecidos solo se comparan dentro de un mismo prefijo, así el costo no
+    crece con el cuadrado del tamaño del archivo.
+    """
+
+    def __init__(self, known: KnownStartupIndex, force_rescore: bool = False):
+        self.known = known
+        self.force_rescore = force_rescore
+        self._by_name: Dict[str, int] = {}
+        self._by_domain: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._by_prefix: Dict[str, List[Tuple[str, int]]] = {}
+
+    def _find_duplicate(self, name: str, domains: Set[str]) -> Optional[int]:
+        for domain in domains:
+            index = self._by_domain.get(domain)
+            if index is not None and domain_match_allowed(name, self._names[index]):
+                return index
+        if not name:
+            return None
+        if name in self._by_name:
+            return self._by_name[name]
+        for other, index in self._by_prefix.get(name.replace(" ", "")[:3], ()):
+            if name_similarity(name, other) >= DEDUP_NAME_SIMILARITY:
+                return index
+        return None
+
+    def _register(self, index: int, name: str, domains: Set[str]) -> None:
+        self._names[index] = name
+        for domain in domains:
+            self._by_domain.setdefault(domain, index)
+        if name:
+            self._by_name.setdefault(name, index)
+            self._by_prefix.setdefault(name.replace(" ", "")[:3], []).append((name, index))
+
+    def classify(self, index: int, row: dict) -> Tuple[str, Optional[int], Optional[dict]]:
+        """(veredicto, fila canónica si es duplicado, coincidencia histórica si la hay)."""
+        name, domains = row_identity(row)
+        historical = self.known.match(name, domains)
+        if historical is not None and not self.force_rescore:
+            return KNOWN, None, historical
+        canonical = None if self.force_rescore else self._find_duplicate(name, domains)
+        if canonical is not None:
+            return DUPLICATE, canonical, historical
+        self._register(index, name, domains)
+        return NEW, None, historical
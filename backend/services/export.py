@@ -0,0 +1,194 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from itertools import chain
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+from services.structured_output import expected_fields
+
+if TYPE_CHECKING:
+    from services.jobs import JobStore
+
+# Filas que se leen de la base (y se escriben) por bloque: la memoria no depende del tamaño del job.
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", "500"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+NESTED_SECTIONS = ("dimensional_scores", "qualitative_analysis", "score_justification")
+RESULT_COLUMNS = ("row_index", "final_weighted_score")
+# Filas que no pasaron por el LLM (ver services/dedup.py): startups ya evaluadas traen su decisión
+# y puntaje anteriores; las repetidas, el índice de la fila de la que copian el resultado.
+HISTORICAL_KEYS = ("name", "decision", "tags", "historical_score", "match", "similarity", "sources")
+DEDUP_COLUMNS = ("scoring_source", *(f"historical_match.{key}" for key in HISTORICAL_KEYS), "duplicate_of")
+
+
+class ExportUnavailableError(Exception):
+    """El formato pedido necesita una dependencia opcional que no está instalada."""
+
+
+def iter_job_results(store: "JobStore", job_id: str) -> Iterator[dict]:
+    """Filas terminadas del job en el orden del archivo, leídas de a EXPORT_PAGE_ROWS."""
+    after_index = -1
+    while True:
+        page = store.results_page(job_id, after_index, EXPORT_PAGE_ROWS)
+        if not page:
+            return
+        for row_index, result_json in page:
+            after_index = row_index
+            yield json.loads(result_json)
+
+
+def export_columns(results: Iterable[dict]) -> List[str]:
+    """
+    Columnas del archivo: índice, datos originales de las filas, puntaje final y una columna
+    `sección.clave` por cada campo de los análisis anidados. Se toma la unión de las claves de
+    todas las filas (en orden de aparición): no todas traen los mismos campos.
+    """
+    excluded = {*NESTED_SECTIONS, *RESULT_COLUMNS, "historical_match", "duplicate_of"}
+    fields = expected_fields()
+    # dict como conjunto ordenado
+    original: dict = {}
+    extra = {section: {} for section in NESTED_SECTIONS}
+    for result in results:
+        original.update(dict.fromkeys(key for key in result if key not in excluded))
+        for section in NESTED_SECTIONS:
+            # Claves de una configuración anterior que ya no están en scoring_config.json
+            extra[section].update(dict.fromkeys(
+                key for key in result.get(section) or {} if key not in fields[section]
+            ))
+    nested = [f"{section}.{key}" for section in NESTED_SECTIONS for key in [*fields[section], *extra[section]]]
+    return ["row_index", *original, "final_weighted_score", *DEDUP_COLUMNS, *nested]
+
+
+def scoring_source(result: dict) -> str:
+    """De dónde salió el resultado: `llm`, `historical` (ya evaluada, sin puntaje nuevo) o `duplicate`."""
+    if "duplicate_of" in result:
+        return "duplicate"
+    if result.get("historical_match") and not result.get("dimensional_scores"):
+        return "historical"
+    return "llm"
+
+
+def flatten_result(result: dict, columns: List[str]) -> list:
+    values = []
+    for column in columns:
+        section, _, key = column.partition(".")
+        if column == "scoring_source":
+            value = scoring_source(result)
+        elif key and (section in NESTED_SECTIONS or section == "historical_match"):
+            value = (result.get(section) or {}).get(key)
+        else:
+            value = result.get(column)
+        values.append(json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value)
+    return values
+
+
+def _with_columns(store: "JobStore", job_id: str):
+    """Columnas (una primera pasada por las filas, solo claves) y las filas para escribir."""
+    return export_columns(iter_job_results(store, job_id)), iter_job_results(store, job_id)
+
+
+# --- FORMATOS ---
+
+def iter_csv(store: "JobStore", job_id: str) -> Iterator[bytes]:
+    """CSV generado por bloques mientras se envía (con BOM para que Excel lea bien los acentos)."""
+    columns, rows = _with_columns(store, job_id)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for count, result in enumerate(rows, 1):
+        writer.writerow(flatten_result(result, columns))
+        if count % EXPORT_PAGE_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(store: "JobStore", job_id: str, path: str) -> None:
+    """XLSX en modo write-only de openpyxl: las filas van a disco a medida que se agregan."""
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    columns, rows = _with_columns(store, job_id)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Resultados Scoring")
+    sheet.append(columns)
+    for result in rows:
+        sheet.append([
+            ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value
+            for value in flatten_result(result, columns)
+        ])
+    workbook.save(path)
+
+
+def _load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailableError("La exportación a Parquet requiere pyarrow (pip install pyarrow).")
+    return pyarrow, pyarrow.parquet
+
+
+def write_parquet(store: "JobStore", job_id: str, path: str) -> None:
+    """Parquet con un row group por bloque. Los puntajes son numéricos; el resto, texto."""
+    pa, pq = _load_pyarrow()
+
+    columns, rows = _with_columns(store, job_id)
+    numeric = {"final_weighted_score", "historical_match.historical_score", "historical_match.similarity"}
+    numeric |= {column for column in columns if column.startswith("dimensional_scores.")}
+    schema = pa.schema([
+        (column, pa.int64() if column in ("row_index", "duplicate_of") else pa.float64() if column in numeric else pa.string())
+        for column in columns
+    ])
+
+    def convert(column: str, value):
+        if value is None or value == "":
+            return None
+        if column in ("row_index", "duplicate_of"):
+            return int(value)
+        if column in numeric:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return str(value)
+
+    with pq.ParquetWriter(path, schema) as writer:
+        block: List[list] = []
+        for result in chain(rows, [None]):
+            if result is not None:
+                block.append(flatten_result(result, columns))
+            if block and (result is None or len(block) == EXPORT_PAGE_ROWS):
+                data = {column: [convert(column, row[i]) for row in block] for i, column in enumerate(columns)}
+                writer.write_table(pa.Table.from_pydict(data, schema=schema))
+                block = []
+
+
+def check_export_format(export_format: str) -> None:
+    """Falla antes de empezar si el formato no existe o le falta su dependencia."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato '{export_format}' no soportado. Usa uno de: {', '.join(EXPORT_FORMATS)}.")
+    if export_format == "parquet":
+        _load_pyarrow()
+
+
+def write_export_file(store: "JobStore", job_id: str, export_format: str) -> str:
+    """Escribe el XLSX o Parquet del job en un archivo temporal y devuelve su ruta."""
+    writers = {"xlsx": write_xlsx, "parquet": write_parquet}
+    fd, path = tempfile.mkstemp(suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        writers[export_format](store, job_id, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
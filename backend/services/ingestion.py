@@ -0,0 +1,133 @@
+import base64
+import datetime
+import json
+import os
+import tempfile
+import zipfile
+from typing import Iterator, List
+
+from fastapi import UploadFile
+
+# Tamaño máximo aceptado para un archivo subido (después de decodificar un data URL).
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+# Bytes que se leen del upload en cada paso y filas que se entregan por bloque.
+READ_CHUNK_BYTES = 256 * 1024
+ROWS_PER_CHUNK = 200
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+# --- LECTURA DEL UPLOAD A DISCO (SIN CARGARLO ENTERO EN MEMORIA) ---
+
+async def spool_upload(upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """
+    Copia el upload a un archivo temporal por bloques y devuelve su ruta.
+    Si el contenido es un data URL (`data:...;base64,...`, lo que pasa cuando el frontend
+    envía el archivo como texto), se decodifica en streaming mientras se copia.
+    Lanza UploadTooLargeError si se supera `max_bytes`.
+    """
+    # Conservamos la extensión: openpyxl decide el formato por ella
+    suffix = os.path.splitext(upload.filename or "")[1].lower()
+    output = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, delete=False)
+    written = 0
+    try:
+        first = await upload.read(READ_CHUNK_BYTES)
+        is_data_url = first.startswith(b"data:")
+        pending = b""
+        if is_data_url:
+            # Saltamos la cabecera (data:<mime>;base64,) aunque llegue partida entre bloques
+            while b"," not in first:
+                more = await upload.read(READ_CHUNK_BYTES)
+                if not more or len(first) > 4096:
+                    raise ValueError("Data URL sin separador ','.")
+                first += more
+            first = first.split(b",", 1)[1]
+            print("⚠️ Data URL detectado. Decodificando base64 en streaming...")
+
+        chunk = first
+        while chunk:
+            if is_data_url:
+                # Solo decodificamos múltiplos de 4 caracteres; el resto espera al siguiente bloque
+                data = pending + b"".join(chunk.split())
+                usable = len(data) - len(data) % 4
+                pending = data[usable:]
+                chunk = base64.b64decode(data[:usable])
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLargeError(
+                    f"El archivo supera el tamaño máximo permitido ({max_bytes // (1024 * 1024)} MB)."
+                )
+            output.write(chunk)
+            chunk = await upload.read(READ_CHUNK_BYTES)
+        if pending:
+            output.write(base64.b64decode(pending + b"=" * (-len(pending) % 4)))
+        output.close()
+        print(f"  -> Upload copiado a disco: {written} bytes.")
+        return output.name
+    except Exception:
+        output.close()
+        os.remove(output.name)
+        raise
+
+
+# --- PARSEO INCREMENTAL ---
+
+def _json_safe(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value
+
+
+def _iter_xlsx_chunks(path: str, rows_per_chunk: int) -> Iterator[List[dict]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Mismo criterio que pandas para las columnas sin nombre
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        chunk = []
+        for values in rows:
+            if all(value is None or value == "" for value in values):
+                continue
+            chunk.append({column: _json_safe(value) for column, value in zip(columns, values)})
+            if len(chunk) >= rows_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def _iter_csv_chunks(path: str, rows_per_chunk: int) -> Iterator[List[dict]]:
+    import pandas as pd
+
+    with pd.read_csv(path, chunksize=rows_per_chunk) as reader:
+        for df_chunk in reader:
+            yield json.loads(df_chunk.to_json(orient="records"))
+
+
+def iter_record_chunks(path: str, filename: str, rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[List[dict]]:
+    """
+    Lee el archivo en bloques de filas (listas de dicts serializables a JSON).
+    `.xlsx` se lee con openpyxl en modo read-only; el resto se trata como CSV por bloques.
+    """
+    if filename.lower().endswith(".xlsx"):
+        try:
+            zipfile.ZipFile(path).close()
+        except zipfile.BadZipFile:
+            print("⚠️ BadZipFile detected. The file might be a CSV renamed to .xlsx. Attempting to read as CSV.")
+        else:
+            yield from _iter_xlsx_chunks(path, rows_per_chunk)
+            return
+    yield from _iter_csv_chunks(path, rows_per_chunk)
@@ -0,0 +1,590 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.context import ContextBundle
+from services.llm_scheduler import BULK, get_llm_scheduler, llm_request_class
+from services.scoring import DISCONNECT_POLL_SECONDS, score_rows_into_queue
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Por defecto en el directorio temporal: en Vercel el resto del sistema de archivos es de solo lectura.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "jobs.sqlite3"))
+
+# Un worker "posee" un job mientras renueve su lease. Si muere, otro puede retomarlo.
+JOB_LEASE_SECONDS = 30
+
+# Segundos que un job sigue corriendo sin ningún cliente conectado antes de pausarse.
+JOB_DISCONNECT_GRACE_SECONDS = float(os.getenv("JOB_DISCONNECT_GRACE_SECONDS", "120"))
+# Cada cuánto un stream abierto (en cualquier worker) marca en la base que el job tiene clientes.
+SUBSCRIBER_TOUCH_SECONDS = 5.0
+
+# Días que se conservan los jobs terminados.
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Puntajes parciales (modo estructurado) que se guardan en memoria por job para los clientes conectados.
+PARTIAL_EVENTS_PER_JOB = 500
+
+# Estados de un job
+RUNNING, PAUSED, COMPLETED, FAILED = "running", "paused", "completed", "failed"
+# Estados finales: un job así no se retoma
+FINISHED = (COMPLETED, FAILED)
+
+
+# --- PERSISTENCIA (SQLITE) ---
+
+class JobStore:
+    """
+    Guarda cada job y sus filas. Cada fila puntuada recibe un `seq` creciente (orden de
+    finalización) que se usa como id del evento SSE y permite reanudar con Last-Event-ID.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                status TEXT NOT NULL,
+                total_rows INTEGER NOT NULL,
+                batch_size INTEGER NOT NULL,
+                context_version TEXT,
+                cache_hits INTEGER NOT NULL DEFAULT 0,
+                cache_misses INTEGER NOT NULL DEFAULT 0,
+                ingest_complete INTEGER NOT NULL DEFAULT 1,
+                ingest_error TEXT,
+                lease_owner TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_rows (
+                job_id TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                input_json TEXT NOT NULL,
+                result_json TEXT,
+                seq INTEGER,
+                PRIMARY KEY (job_id, row_index)
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_rows_seq ON job_rows(job_id, seq);
+            """
+        )
+        # Bases creadas antes de la lectura incremental no tienen estas columnas
+        existing = {column[1] for column in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "ingest_complete" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN ingest_complete INTEGER NOT NULL DEFAULT 1")
+        if "ingest_error" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN ingest_error TEXT")
+        if "force_rescore" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN force_rescore INTEGER NOT NULL DEFAULT 0")
+        if "max_concurrency" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN max_concurrency INTEGER")
+        if "error" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN error TEXT")
+        if "last_subscriber_at" not in existing:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN last_subscriber_at REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    def create_job(
+        self,
+        filename: str,
+        rows: List[dict],
+        batch_size: int,
+        context_version: str,
+        ingest_complete: bool = True,
+        force_rescore: bool = False,
+        max_concurrency: Optional[int] = None
+    ) -> str:
+        """
+        Crea un job con sus primeras filas. Con `ingest_complete=False` el archivo se sigue
+        leyendo: las demás filas llegan con `add_rows` y se cierra con `finish_ingestion`.
+        Con `force_rescore` no se omiten las startups ya evaluadas ni las repetidas.
+        `max_concurrency` limita sus llamadas al LLM en vuelo (por debajo de LLM_JOB_MAX_CONCURRENCY).
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, filename, status, total_rows, batch_size, context_version, ingest_complete, "
+                "force_rescore, max_concurrency, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, RUNNING, 0, batch_size, context_version, int(ingest_complete),
+                 int(force_rescore), max_concurrency, now, now),
+            )
+        self.add_rows(job_id, 0, rows)
+        return job_id
+
+    def add_rows(self, job_id: str, start_index: int, rows: List[dict]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO job_rows (job_id, row_index, input_json) VALUES (?, ?, ?)",
+                (
+                    (job_id, start_index + offset, json.dumps(row, ensure_ascii=False))
+                    for offset, row in enumerate(rows)
+                ),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET total_rows = total_rows + ?, updated_at = ? WHERE id = ?",
+                (len(rows), time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def finish_ingestion(self, job_id: str, error: Optional[str] = None) -> None:
+        self.update_job(job_id, ingest_complete=1, ingest_error=error)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([c[0] for c in cursor.description], row))
+            job["completed_rows"] = self._conn.execute(
+                "SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND seq IS NOT NULL", (job_id,)
+            ).fetchone()[0]
+        return job
+
+    def pending_rows(self, job_id: str, after_index: int = -1) -> List[Tuple[int, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_index, input_json FROM job_rows "
+                "WHERE job_id = ? AND seq IS NULL AND row_index > ? ORDER BY row_index",
+                (job_id, after_index),
+            ).fetchall()
+        return [(index, json.loads(input_json)) for index, input_json in rows]
+
+    def save_result(self, job_id: str, row_index: int, result: dict, stats: Optional[dict] = None) -> Optional[int]:
+        """
+        Guarda el resultado de una fila y devuelve su seq (None si ya estaba guardada).
+        Con `stats`, los contadores de caché del job se guardan en la misma transacción:
+        así el evento `stats` (que se emite al ver la última fila) nunca los lee atrasados.
+        """
+        with self._lock:
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_rows WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            cursor = self._conn.execute(
+                "UPDATE job_rows SET result_json = ?, seq = ? WHERE job_id = ? AND row_index = ? AND seq IS NULL",
+                (json.dumps(result, ensure_ascii=False), seq, job_id, row_index),
+            )
+            if stats is None:
+                self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET cache_hits = ?, cache_misses = ?, updated_at = ? WHERE id = ?",
+                    (stats["cache_hits"], stats["cache_misses"], time.time(), job_id),
+                )
+            self._conn.commit()
+        return seq if cursor.rowcount == 1 else None
+
+    def update_results(self, job_id: str, results: Dict[int, dict]) -> None:
+        """Reemplaza el resultado de filas ya terminadas (p. ej. tras un re-análisis parcial) sin cambiar su seq."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE job_rows SET result_json = ? WHERE job_id = ? AND row_index = ? AND seq IS NOT NULL",
+                [(json.dumps(result, ensure_ascii=False), job_id, row_index) for row_index, result in results.items()],
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def results_for(self, job_id: str, row_indexes: List[int]) -> Dict[int, dict]:
+        """Resultados de las filas pedidas que ya terminaron, por row_index."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row_index, result_json FROM job_rows WHERE job_id = ? AND result_json IS NOT NULL "
+                f"AND row_index IN ({', '.join('?' * len(row_indexes))})",
+                (job_id, *row_indexes),
+            ).fetchall()
+        return {row_index: json.loads(result_json) for row_index, result_json in rows}
+
+    def results_after(self, job_id: str, last_seq: int) -> List[Tuple[int, str]]:
+        """Filas terminadas con seq > last_seq, como (seq, JSON del resultado)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, result_json FROM job_rows WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, last_seq),
+            ).fetchall()
+
+    def results_page(self, job_id: str, after_index: int, limit: int) -> List[Tuple[int, str]]:
+        """Hasta `limit` filas terminadas con row_index > after_index, en el orden del archivo."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row_index, result_json FROM job_rows "
+                "WHERE job_id = ? AND row_index > ? AND result_json IS NOT NULL ORDER BY row_index LIMIT ?",
+                (job_id, after_index, limit),
+            ).fetchall()
+
+    def update_job(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def touch_subscriber(self, job_id: str) -> None:
+        """Un cliente sigue conectado al job (en este o en otro worker)."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET last_subscriber_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def try_claim(self, job_id: str, owner: str) -> bool:
+        """Toma el lease del job si está libre, vencido o ya era nuestro."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_owner = ?, lease_expires = ?, status = ?, updated_at = ? "
+                "WHERE id = ? AND status NOT IN (?, ?) AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)",
+                (owner, now + JOB_LEASE_SECONDS, RUNNING, now, job_id, *FINISHED, owner, now),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def renew_lease(self, job_id: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                (time.time() + JOB_LEASE_SECONDS, job_id, owner),
+            )
+            self._conn.commit()
+
+    def release(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, lease_expires = 0, status = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (status, error, time.time(), job_id, owner),
+            )
+            self._conn.commit()
+
+    def orphaned_jobs(self) -> List[str]:
+        """Jobs que seguían corriendo cuando su worker murió (lease vencido)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND lease_expires < ?", (RUNNING, time.time())
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def purge_older_than(self, days: float) -> int:
+        cutoff = time.time() - days * 86400
+        with self._lock:
+            old = [job_id for (job_id,) in self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED, cutoff)
+            )]
+            self._conn.executemany("DELETE FROM job_rows WHERE job_id = ?", [(job_id,) for job_id in old])
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in old])
+            self._conn.commit()
+        return len(old)
+
+
+# --- EJECUCIÓN Y SUSCRIPCIÓN ---
+
+class JobManager:
+    """
+    Corre los jobs en segundo plano (independientes de la conexión SSE) y permite que
+    cualquier cliente se (re)conecte para recibir las filas ya puntuadas y las nuevas.
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._runners: Dict[str, asyncio.Task] = {}
+        self._ingestors: Dict[str, asyncio.Task] = {}
+        self._updates: Dict[str, asyncio.Event] = {}
+        self._rows_ready: Dict[str, asyncio.Event] = {}
+        self._subscribers: Counter = Counter()
+        # job_id -> últimos (n, evento, JSON) de puntajes parciales; no se persisten ni llevan id SSE
+        self._partials: Dict[str, deque] = {}
+        self._partial_counter: Counter = Counter()
+
+    def is_running_here(self, job_id: str) -> bool:
+        task = self._runners.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, job_id: str, context: ContextBundle) -> bool:
+        """Arranca (o retoma) el job en este worker si nadie más lo está corriendo."""
+        if self.is_running_here(job_id):
+            return True
+        if not self.store.try_claim(job_id, self.owner):
+            return False
+        self._runners[job_id] = asyncio.create_task(self._run(job_id, context))
+        return True
+
+    def _notify(self, job_id: str) -> None:
+        event = self._updates.get(job_id)
+        if event is not None:
+            event.set()
+
+    def _publish_partial(self, job_id: str, row_index: int, category: Optional[str], score) -> None:
+        """
+        Puntaje de una fila todavía en curso, para los clientes conectados en este worker.
+        Sin categoría es un `partial_reset`: el intento que los generó se abandonó.
+        """
+        self._partial_counter[job_id] += 1
+        if category is None:
+            event, payload = "partial_reset", json.dumps({"row_index": row_index})
+        else:
+            event, payload = "partial", json.dumps({"row_index": row_index, "category": category, "score": score})
+        self._partials.setdefault(job_id, deque(maxlen=PARTIAL_EVENTS_PER_JOB)).append(
+            (self._partial_counter[job_id], event, payload)
+        )
+        self._notify(job_id)
+
+    # --- Lectura del archivo en segundo plano ---
+
+    def ingest(self, job_id: str, record_chunks: Iterator[List[dict]], start_index: int, upload_path: str) -> None:
+        """Sigue leyendo el archivo en segundo plano; cada bloque de filas queda disponible para puntuar."""
+        self._ingestors[job_id] = asyncio.create_task(
+            self._ingest(job_id, record_chunks, start_index, upload_path)
+        )
+
+    async def _ingest(self, job_id: str, record_chunks: Iterator[List[dict]], start_index: int, upload_path: str) -> None:
+        next_index = start_index
+        error = None
+        try:
+            while True:
+                # El parseo (openpyxl / pandas) es síncrono: lo hacemos en un hilo
+                chunk = await asyncio.to_thread(next, record_chunks, None)
+                if chunk is None:
+                    break
+                self.store.add_rows(job_id, next_index, chunk)
+                next_index += len(chunk)
+                self._rows_ready.setdefault(job_id, asyncio.Event()).set()
+            print(f"  -> JOB {job_id}: archivo leído por completo ({next_index} filas).")
+        except Exception as e:
+            error = f"Error al leer el archivo en la fila {next_index + 1}: {e}"
+            print(f"❌ JOB {job_id}: {error}")
+        finally:
+            self.store.finish_ingestion(job_id, error)
+            self._rows_ready.setdefault(job_id, asyncio.Event()).set()
+            self._ingestors.pop(job_id, None)
+            try:
+                os.remove(upload_path)
+            except OSError:
+                pass
+
+    async def _job_rows(self, job_id: str) -> AsyncIterator[Tuple[int, "pd.Series"]]:
+        """Filas pendientes del job, incluidas las que se vayan leyendo del archivo."""
+        import pandas as pd
+
+        rows_ready = self._rows_ready.setdefault(job_id, asyncio.Event())
+        last_index = -1
+        while True:
+            rows_ready.clear()
+            # Leemos el estado ANTES de buscar filas: si ya estaba completo y no hay más, terminamos
+            ingest_complete = self.store.get_job(job_id)["ingest_complete"]
+            new_rows = self.store.pending_rows(job_id, after_index=last_index)
+            for index, data in new_rows:
+                last_index = index
+                yield index, pd.Series(data, dtype=object)
+            if new_rows:
+                continue
+            if ingest_complete:
+                return
+            try:
+                await asyncio.wait_for(rows_ready.wait(), timeout=DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Ejecución ---
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            self.store.renew_lease(job_id, self.owner)
+            if self._is_abandoned(job_id):
+                # Nadie lo mira en ningún worker: lo pausamos para no gastar cuota
+                print(f" ⛔ Sin clientes conectados al JOB {job_id} durante {JOB_DISCONNECT_GRACE_SECONDS:.0f}s.")
+                self._runners[job_id].cancel()
+                return
+
+    def _is_abandoned(self, job_id: str) -> bool:
+        """
+        Sin clientes aquí y sin que ningún stream (de cualquier worker) lo haya marcado en el
+        periodo de gracia: el cliente puede haberse reconectado a otro worker del mismo socket.
+        """
+        if self._subscribers[job_id] > 0:
+            return False
+        last_subscriber_at = self.store.get_job(job_id)["last_subscriber_at"]
+        return time.time() - last_subscriber_at > JOB_DISCONNECT_GRACE_SECONDS
+
+    async def _run(self, job_id: str, context: ContextBundle) -> None:
+        job = self.store.get_job(job_id)
+        if not job["ingest_complete"] and job_id not in self._ingestors:
+            # El worker que leía el archivo murió: solo podemos puntuar las filas que alcanzó a guardar
+            self.store.finish_ingestion(job_id, "La lectura del archivo se interrumpió por un reinicio del servidor.")
+            job = self.store.get_job(job_id)
+        # El periodo de gracia cuenta desde que arranca (p. ej. un job retomado sin clientes)
+        self.store.touch_subscriber(job_id)
+        pending_count = job["total_rows"] - job["completed_rows"]
+        print(f"\n--- JOB {job_id}: {pending_count} de {job['total_rows']} filas pendientes ---")
+
+        stats: Counter = Counter({"cache_hits": job["cache_hits"], "cache_misses": job["cache_misses"]})
+        results: asyncio.Queue = asyncio.Queue()
+        total = job["total_rows"] if job["ingest_complete"] else None
+
+        async def produce():
+            try:
+                # Las llamadas de las filas cuentan como masivas de este job (turno y límite propios)
+                with llm_request_class(BULK, job_id, job["max_concurrency"]):
+                    await score_rows_into_queue(
+                        self._job_rows(job_id), total, context, stats, results, job["batch_size"],
+                        on_partial=lambda row_index, category, score: self._publish_partial(job_id, row_index, category, score),
+                        force_rescore=bool(job["force_rescore"])
+                    )
+            finally:
+                # Fin de las filas, también si la puntuación falló: el error queda en `producer`
+                results.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        status, error = PAUSED, None
+        try:
+            while True:
+                result_row = await results.get()
+                if result_row is None:
+                    break
+                # Checkpoint: cada fila pagada queda guardada antes de enviarse
+                self.store.save_result(job_id, result_row["row_index"], result_row, stats)
+                self._notify(job_id)
+            try:
+                await producer
+            except Exception as e:
+                status, error = FAILED, f"Error al puntuar las filas: {e}"
+                print(f"❌ JOB {job_id}: {error}")
+            else:
+                status = COMPLETED
+                print(f" -> JOB {job_id} completado. Caché: {stats['cache_hits']} aciertos, {stats['cache_misses']} fallos.")
+        except asyncio.CancelledError:
+            print(f" ⏸️ JOB {job_id} pausado.")
+        finally:
+            producer.cancel()
+            heartbeat.cancel()
+            self.store.update_job(job_id, cache_hits=stats["cache_hits"], cache_misses=stats["cache_misses"])
+            self.store.release(job_id, self.owner, status, error)
+            self._runners.pop(job_id, None)
+            self._partials.pop(job_id, None)
+            self._notify(job_id)
+
+    async def stream(
+        self,
+        job_id: str,
+        context: ContextBundle,
+        last_event_id: int = 0,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ):
+        """
+        Stream SSE de un job: primero un evento `job`, luego las filas con seq > last_event_id
+        (repetición) y después las nuevas a medida que terminan. Cierra con `stats`.
+        En modo estructurado, mientras una fila se puntúa llegan eventos `partial` con cada
+        puntaje dimensional ({row_index, category, score}); no llevan id y no se repiten.
+        Un `partial_reset` ({row_index}) indica que los parciales anteriores de esa fila eran
+        de un intento abandonado (failover, timeout o reparación) y hay que descartarlos.
+        Mientras el job corre en este worker, un evento `queue` informa (cuando cambia) cuántas
+        de sus llamadas esperan lugar en el scheduler y la espera estimada.
+        Si el job estaba pausado o huérfano, se retoma desde su último checkpoint; mientras el
+        stream siga abierto se vuelve a intentar en cada vuelta (el worker que lo corría pudo
+        pausarlo o morir, y el lease vencido lo libera). Si falló,
+        después de sus filas llega un evento `failed` con el error y el stream se cierra.
+        """
+        job = self.store.get_job(job_id)
+        if job["status"] not in FINISHED:
+            self.start(job_id, context)
+
+        update = self._updates.setdefault(job_id, asyncio.Event())
+        self._subscribers[job_id] += 1
+        self.store.touch_subscriber(job_id)
+        last_touch = time.monotonic()
+        last_seq = last_event_id
+        last_partial = self._partial_counter[job_id]
+        last_queue = None
+        try:
+            job_info = {
+                "job_id": job_id,
+                "total_rows": job["total_rows"],
+                "completed_rows": job["completed_rows"],
+                "ingest_complete": bool(job["ingest_complete"]),
+            }
+            yield f"event: job\ndata: {json.dumps(job_info)}\n\n"
+            while True:
+                update.clear()
+                if time.monotonic() - last_touch >= SUBSCRIBER_TOUCH_SECONDS:
+                    self.store.touch_subscriber(job_id)
+                    last_touch = time.monotonic()
+                for number, event, payload in list(self._partials.get(job_id, ())):
+                    if number > last_partial:
+                        last_partial = number
+                        yield f"event: {event}\ndata: {payload}\n\n"
+                for seq, result_json in self.store.results_after(job_id, last_seq):
+                    last_seq = seq
+                    yield f"id: {seq}\ndata: {result_json}\n\n"
+                if self.is_running_here(job_id):
+                    queue = get_llm_scheduler().status(job_id)
+                    if (queue["job_queued"], queue["estimated_wait_seconds"]) != last_queue:
+                        last_queue = (queue["job_queued"], queue["estimated_wait_seconds"])
+                        yield f"event: queue\ndata: {json.dumps(queue)}\n\n"
+
+                job = self.store.get_job(job_id)
+                if job["status"] not in FINISHED and not self.is_running_here(job_id):
+                    # Nadie lo está corriendo (pausado o su worker murió): lo tomamos si el lease lo permite
+                    self.start(job_id, context)
+                if job["status"] == FAILED and last_seq >= job["completed_rows"]:
+                    failure = {"error": job["error"], "completed_rows": job["completed_rows"], "total_rows": job["total_rows"]}
+                    yield f"event: failed\ndata: {json.dumps(failure)}\n\n"
+                    return
+                if (
+                    job["ingest_complete"]
+                    and job["completed_rows"] >= job["total_rows"]
+                    and last_seq >= job["completed_rows"]
+                ):
+                    stats = {"cache_hits": job["cache_hits"], "cache_misses": job["cache_misses"]}
+                    if job["ingest_error"]:
+                        stats["ingest_error"] = job["ingest_error"]
+                    yield f"event: stats\ndata: {json.dumps(stats)}\n\n"
+                    return
+
+                try:
+                    # Sin notificación local (p. ej. el job corre en otro worker) volvemos a consultar la base
+                    await asyncio.wait_for(update.wait(), timeout=DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        print(f" -> Cliente desconectado del JOB {job_id} (último evento {last_seq}).")
+                        return
+        finally:
+            self._subscribers[job_id] -= 1
+            # El periodo de gracia para pausarlo cuenta desde que se fue el último cliente
+            self.store.touch_subscriber(job_id)
+
+    def resume_orphaned(self, context: ContextBundle) -> List[str]:
+        """Retoma los jobs que quedaron a medias tras reiniciar un worker."""
+        resumed = [job_id for job_id in self.store.orphaned_jobs() if self.start(job_id, context)]
+        return resumed
+
+
+_job_manager: Optional[JobManager] = None
+_job_store_failed = False
+
+
+def get_job_manager() -> Optional[JobManager]:
+    """
+    El JobManager del worker, o None si la base de jobs no se puede abrir (p. ej. sistema de
+    archivos de solo lectura): el análisis sigue funcionando como stream directo, sin job.
+    """
+    global _job_manager, _job_store_failed
+    if _job_manager is None and not _job_store_failed:
+        try:
+            _job_manager = JobManager(JobStore(JOBS_DB_PATH))
+        except (sqlite3.Error, OSError) as e:
+            _job_store_failed = True
+            print(f"⚠️ No se pudo abrir la base de jobs ('{JOBS_DB_PATH}'): {e}. Los análisis no serán reanudables.")
+    return _job_manager
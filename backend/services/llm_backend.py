@@ -0,0 +1,263 @@
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from services.context import ContextBundle
+
+# Horas que vive el contenido cacheado en el proveedor.
+CONTEXT_CACHE_TTL_HOURS = float(os.getenv("CONTEXT_CACHE_TTL_HOURS", "6"))
+
+_genai = None
+
+
+def load_genai():
+    """
+    Importa y configura google.generativeai en el primer uso. Su import tarda cerca de
+    un segundo, así que no se paga en el arranque (ni nunca con el backend fake).
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _genai = genai
+    return _genai
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+# --- BACKEND GEMINI ---
+
+class GeminiBackend:
+    """
+    Llama a Gemini. Si el bundle de contexto se registró como contenido cacheado para
+    un modelo, cada petición solo envía la parte propia de la fila.
+    """
+
+    def __init__(self):
+        # (modelo, versión del bundle) -> CachedContent
+        self._cached_contents: Dict[tuple, object] = {}
+
+    def _cache_display_name(self, bundle: ContextBundle) -> str:
+        return f"uv-context-{bundle.version}"
+
+    def _find_existing_cache(self, model_name: str, bundle: ContextBundle):
+        """Reutiliza una caché viva con la misma versión (p. ej. creada por otro arranque)."""
+        caching = load_genai().caching
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for cached in caching.CachedContent.list():
+            if (
+                cached.display_name == self._cache_display_name(bundle)
+                and cached.model.endswith(model_name)
+                and cached.expire_time > now + datetime.timedelta(minutes=5)
+            ):
+                return cached
+        return None
+
+    def _register_sync(self, bundle: ContextBundle, model_names: List[str]) -> None:
+        caching = load_genai().caching
+
+        for model_name in model_names:
+            try:
+                cached = self._find_existing_cache(model_name, bundle)
+                if cached is None:
+                    cached = caching.CachedContent.create(
+                        model=f"models/{model_name}",
+                        display_name=self._cache_display_name(bundle),
+                        contents=[bundle.context_text],
+                        ttl=datetime.timedelta(hours=CONTEXT_CACHE_TTL_HOURS),
+                    )
+                self._cached_contents[(model_name, bundle.version)] = cached
+                print(f"  -> Contexto cacheado para {model_name} ({cached.name}).")
+            except Exception as e:
+                # Sin caché el contexto simplemente viaja dentro de cada prompt.
+                print(f"  ⚠️ No se pudo cachear el contexto para {model_name}: {e}")
+
+    async def register_context(self, bundle: ContextBundle, model_names: List[str]) -> None:
+        await asyncio.to_thread(self._register_sync, bundle, model_names)
+
+    def has_cached_context(self, model_name: str, bundle: ContextBundle) -> bool:
+        return (model_name, bundle.version) in self._cached_contents
+
+    async def generate(
+        self,
+        model_name: str,
+        row_prompt: str,
+        bundle: ContextBundle,
+        timeout: float,
+        response_schema: Optional[dict] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> LLMResponse:
+        """
+        Con `response_schema` se pide JSON restringido a ese esquema. Con `on_text` la
+        respuesta se recibe en streaming y cada fragmento se entrega en cuanto llega.
+        """
+        genai = load_genai()
+        cached = self._cached_contents.get((model_name, bundle.version))
+        if cached is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+            prompt = row_prompt
+        else:
+            model = genai.GenerativeModel(model_name)
+            prompt = bundle.context_text + row_prompt
+        generation_config = (
+            {"response_mime_type": "application/json", "response_schema": response_schema}
+            if response_schema is not None else None
+        )
+
+        try:
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=on_text is not None,
+                request_options={"timeout": timeout},
+            )
+            if on_text is None:
+                text = response.text
+            else:
+                fragments = []
+                async for chunk in response:
+                    try:
+                        fragment = chunk.text
+                    except ValueError:
+                        # Fragmento sin partes de texto (p. ej. solo el motivo de fin)
+                        continue
+                    fragments.append(fragment)
+                    on_text(fragment)
+                text = "".join(fragments)
+        except Exception as e:
+            if cached is not None and "cache" in str(e).lower():
+                # La caché expiró o se borró: la olvidamos y repetimos con el contexto en línea.
+                print(f" ⚠️ Caché de contexto inválida para {model_name}. Usando prompt completo.")
+                self._cached_contents.pop((model_name, bundle.version), None)
+                return await self.generate(model_name, row_prompt, bundle, timeout, response_schema, on_text)
+            raise
+
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text=text,
+            input_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+
+# --- BACKEND LOCAL (FAKE) ---
+
+class FakeBackend:
+    """
+    Backend local que no llama a ninguna API. Registra los prompts recibidos y responde
+    con un JSON válido y determinista (un array si el prompt es un lote con `row_id=N`;
+    solo las secciones y claves del esquema si se pasa `response_schema`).
+    Se activa con LLM_BACKEND=fake.
+    Para benchmarks puede simular fallos: `error_429_rate` (fracción de llamadas que
+    responden "429 quota exceeded") y `malformed_rate` (fracción con JSON cortado).
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        error_429_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_seconds = latency_seconds
+        self.error_429_rate = error_429_rate
+        self.malformed_rate = malformed_rate
+        self.registered_versions: set = set()
+        # Solo los últimos prompts: en un benchmark de miles de filas no queremos acumularlos todos
+        self.prompts: deque = deque(maxlen=100)
+        self.calls = 0
+        self.prompt_bytes = 0
+        self._random = random.Random(seed)
+
+    async def register_context(self, bundle: ContextBundle, model_names: List[str]) -> None:
+        self.registered_versions.add(bundle.version)
+
+    def has_cached_context(self, model_name: str, bundle: ContextBundle) -> bool:
+        return bundle.version in self.registered_versions
+
+    def build_response(self, prompt: str, response_schema: Optional[dict] = None) -> dict:
+        from services.structured_output import build_response_schema
+
+        score = 40 + len(prompt) % 50
+        schema = response_schema or build_response_schema()
+        return {
+            section: {
+                key: score if section == "dimensional_scores" else "Respuesta simulada"
+                for key in section_schema["properties"]
+            }
+            for section, section_schema in schema["properties"].items()
+        }
+
+    async def generate(
+        self,
+        model_name: str,
+        row_prompt: str,
+        bundle: ContextBundle,
+        timeout: float,
+        response_schema: Optional[dict] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> LLMResponse:
+        prompt = row_prompt if self.has_cached_context(model_name, bundle) else bundle.context_text + row_prompt
+        self.prompts.append(prompt)
+        self.calls += 1
+        self.prompt_bytes += len(prompt.encode("utf-8"))
+        if self._random.random() < self.error_429_rate:
+            if self.latency_seconds:
+                await asyncio.sleep(self.latency_seconds)
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        row_ids = re.findall(r"row_id=(\d+)", row_prompt)
+        if row_ids:
+            payload = [{"row_id": int(row_id), **self.build_response(row_id)} for row_id in row_ids]
+        else:
+            payload = self.build_response(row_prompt, response_schema)
+        text = json.dumps(payload, ensure_ascii=False)
+        if self._random.random() < self.malformed_rate:
+            text = text[: len(text) // 2]
+        if on_text is None:
+            if self.latency_seconds:
+                await asyncio.sleep(self.latency_seconds)
+        else:
+            # Streaming simulado: la latencia se reparte entre 4 fragmentos
+            step = -(-len(text) // 4)
+            for start in range(0, len(text), step):
+                if self.latency_seconds:
+                    await asyncio.sleep(self.latency_seconds / 4)
+                on_text(text[start:start + step])
+        return LLMResponse(text=text, input_tokens=len(prompt) // 4 + 1, output_tokens=len(text) // 4 + 1)
+
+
+_backend = None
+
+
+def get_llm_backend():
+    """Backend activo del proceso, elegido con la variable LLM_BACKEND (gemini | fake)."""
+    global _backend
+    if _backend is None:
+        if os.getenv("LLM_BACKEND", "gemini").lower() == "fake":
+            _backend = FakeBackend(
+                latency_seconds=float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0")),
+                error_429_rate=float(os.getenv("FAKE_LLM_429_RATE", "0")),
+                malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            )
+        else:
+            _backend = GeminiBackend()
+    return _backend
+
+
+def set_llm_backend(backend) -> None:
+    """Permite inyectar otro backend (p. ej. un FakeBackend configurado a mano)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Iterator, Optional, Tuple
+
+from services.metrics import SCHEDULER_QUEUED, record_stage
+
+# Llamadas al LLM en vuelo a la vez en este worker (todas las clases).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Lugares que los jobs masivos nunca ocupan: un re-análisis interactivo siempre tiene dónde entrar.
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "2"))
+# Llamadas en vuelo por job masivo (un job puede pedir menos con ?max_concurrency=).
+LLM_JOB_MAX_CONCURRENCY = int(os.getenv("LLM_JOB_MAX_CONCURRENCY", "4"))
+# Duración supuesta de una llamada mientras no haya muestras (para estimar la espera).
+DEFAULT_CALL_SECONDS = 5.0
+# Peso de cada llamada nueva en el promedio móvil de duración.
+CALL_SECONDS_SMOOTHING = 0.2
+
+# Clases de prioridad: las interactivas pasan antes que cualquier fila masiva en cola.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+# Orden en la fila de cuota de cada modelo (ModelRateLimiter.acquire): menor pasa primero
+PRIORITY_RANK = {INTERACTIVE: 0, BULK: 1}
+
+# (clase, job, límite de concurrencia del job) de las llamadas al LLM hechas desde este contexto
+RequestClass = Tuple[str, Optional[str], Optional[int]]
+_request_class: ContextVar[RequestClass] = ContextVar("llm_request_class", default=(BULK, None, None))
+
+
+@contextmanager
+def llm_request_class(priority: str, job_key: Optional[str] = None, job_limit: Optional[int] = None) -> Iterator[None]:
+    """Las llamadas al LLM dentro del bloque (y de las tareas que se creen en él) usan esta clase."""
+    token = _request_class.set((priority, job_key, job_limit))
+    try:
+        yield
+    finally:
+        _request_class.reset(token)
+
+
+def current_request_class() -> RequestClass:
+    return _request_class.get()
+
+
+def current_priority_rank() -> int:
+    """Prioridad de las llamadas de este contexto en la fila de cuota de los modelos."""
+    return PRIORITY_RANK[_request_class.get()[0]]
+
+
+class _Waiter:
+    __slots__ = ("priority", "job_key", "job_limit", "future", "enqueued_at")
+
+    def __init__(self, priority: str, job_key: Optional[str], job_limit: int, enqueued_at: float):
+        self.priority = priority
+        self.job_key = job_key
+        self.job_limit = job_limit
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = enqueued_at
+
+
+class LLMScheduler:
+    """
+    Cola central de las llamadas al LLM de este worker:
+    - Las interactivas (re-análisis) se atienden antes que cualquier fila masiva en cola y
+      tienen LLM_INTERACTIVE_RESERVED lugares que los jobs no pueden ocupar.
+    - Entre jobs masivos se reparte por turnos (round-robin), así un upload grande no deja
+      esperando a uno que llegó después.
+    - Cada job tiene un máximo de llamadas en vuelo.
+    Las llamadas ya en vuelo no se interrumpen: la prioridad se aplica al asignar lugares y,
+    dentro de cada lugar, al esperar cuota del modelo (ver ModelRateLimiter.acquire).
+    Todo corre en el event loop del worker, así que no necesita locks.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        interactive_reserved: int = LLM_INTERACTIVE_RESERVED,
+        job_concurrency: int = LLM_JOB_MAX_CONCURRENCY,
+        clock=time.monotonic
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.bulk_capacity = max(1, self.max_concurrency - max(0, interactive_reserved))
+        self.job_concurrency = max(1, job_concurrency)
+        self._clock = clock
+        self._interactive: Deque[_Waiter] = deque()
+        # job -> filas en cola; el orden es el turno (el job atendido pasa al final)
+        self._bulk: "OrderedDict[Optional[str], Deque[_Waiter]]" = OrderedDict()
+        self._running: Counter = Counter()
+        self._running_by_job: Counter = Counter()
+        self._call_seconds: Optional[float] = None
+
+    # --- Asignación de lugares ---
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: Optional[str] = None,
+        job_key: Optional[str] = None,
+        job_limit: Optional[int] = None
+    ) -> AsyncIterator[None]:
+        """Espera un lugar para una llamada al LLM (por defecto, con la clase del contexto actual)."""
+        if priority is None:
+            priority, job_key, job_limit = current_request_class()
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Clase de prioridad desconocida: {priority}")
+        limit = min(self.job_concurrency, job_limit) if job_limit else self.job_concurrency
+        waiter = _Waiter(priority, job_key, max(1, limit), self._clock())
+        if priority == INTERACTIVE:
+            self._interactive.append(waiter)
+        else:
+            self._bulk.setdefault(job_key, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(waiter)  # Se asignó justo al cancelar
+            else:
+                self._discard(waiter)
+            raise
+        record_stage("scheduler_wait", self._clock() - waiter.enqueued_at)
+
+        started = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - started
+            self._call_seconds = elapsed if self._call_seconds is None else (
+                (1 - CALL_SECONDS_SMOOTHING) * self._call_seconds + CALL_SECONDS_SMOOTHING * elapsed
+            )
+            self._release(waiter)
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self._running[waiter.priority] += 1
+        if waiter.priority == BULK:
+            self._running_by_job[waiter.job_key] += 1
+        waiter.future.set_result(None)
+
+    def _release(self, waiter: _Waiter) -> None:
+        self._running[waiter.priority] -= 1
+        if waiter.priority == BULK:
+            self._running_by_job[waiter.job_key] -= 1
+            if self._running_by_job[waiter.job_key] <= 0:
+                del self._running_by_job[waiter.job_key]
+        self._dispatch()
+
+    def _discard(self, waiter: _Waiter) -> None:
+        if waiter.priority == INTERACTIVE:
+            self._interactive.remove(waiter)
+        else:
+            queue = self._bulk.get(waiter.job_key)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._bulk[waiter.job_key]
+        self._update_gauges()
+
+    def _next_bulk(self) -> Optional[_Waiter]:
+        """Primera fila en cola del siguiente job (por turno) que no esté en su límite."""
+        for job_key in list(self._bulk):
+            queue = self._bulk[job_key]
+            if self._running_by_job[job_key] >= queue[0].job_limit:
+                continue
+            waiter = queue.popleft()
+            if queue:
+                self._bulk.move_to_end(job_key)
+            else:
+                del self._bulk[job_key]
+            return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.max_concurrency:
+            if self._interactive:
+                self._grant(self._interactive.popleft())
+                continue
+            if self._running[BULK] >= self.bulk_capacity:
+                break
+            waiter = self._next_bulk()
+            if waiter is None:
+                break
+            self._grant(waiter)
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        SCHEDULER_QUEUED.set(len(self._interactive), priority=INTERACTIVE)
+        SCHEDULER_QUEUED.set(sum(len(queue) for queue in self._bulk.values()), priority=BULK)
+
+    # --- Estado para los clientes ---
+
+    def status(self, job_key: Optional[str] = None) -> dict:
+        """
+        Profundidad de la cola y espera estimada. Con `job_key`, la espera es la de la
+        última fila en cola de ese job: con turnos, delante van hasta tantas filas de
+        cada otro job como las que tiene él, más todas las interactivas.
+        """
+        call_seconds = self._call_seconds if self._call_seconds is not None else DEFAULT_CALL_SECONDS
+        queued_bulk = {key: len(queue) for key, queue in self._bulk.items()}
+        status = {
+            "queued": {INTERACTIVE: len(self._interactive), BULK: sum(queued_bulk.values())},
+            "running": {priority: self._running[priority] for priority in PRIORITY_CLASSES},
+            "capacity": self.max_concurrency,
+            "avg_call_seconds": round(call_seconds, 2),
+        }
+        if job_key is None:
+            ahead, capacity = len(self._interactive), self.max_concurrency
+        else:
+            own = queued_bulk.get(job_key, 0)
+            ahead = len(self._interactive) + sum(min(count, own) for count in queued_bulk.values())
+            limit = self._bulk[job_key][0].job_limit if own else self.job_concurrency
+            capacity = min(self.bulk_capacity, limit)
+            status.update(job_queued=own, job_running=self._running_by_job.get(job_key, 0))
+        status["estimated_wait_seconds"] = round(ahead * call_seconds / capacity, 1)
+        return status
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Con METRICS_TRACE=1 cada fila (y cada petición HTTP) imprime su traza por etapas.
+# Una petición puntual se puede trazar con el header `X-Trace: 1`.
+METRICS_TRACE = os.getenv("METRICS_TRACE", "").lower() in ("1", "true", "yes")
+
+# Cubren desde operaciones locales (ms) hasta llamadas al LLM lentas o esperas de cuota.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+# --- MÉTRICAS (COMPATIBLES CON EL FORMATO DE TEXTO DE PROMETHEUS) ---
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class GaugeMetric:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class HistogramMetric:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteos por bucket..., suma, total]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            position = bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                state[position] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {state[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+
+STAGE_SECONDS = HistogramMetric(
+    "scoring_stage_seconds",
+    "Tiempo por etapa del scoring (prompt_build, cache_lookup, scheduler_wait, rate_limit_wait, circuit_wait, llm_call, "
+    "json_parse, row_total).",
+)
+LLM_REQUESTS = CounterMetric(
+    "llm_requests_total",
+    "Llamadas al LLM por modelo y resultado (success, quota_429, not_found, timeout, error, parse_failure).",
+)
+LLM_TOKENS = CounterMetric("llm_tokens_total", "Tokens enviados (input) y generados (output) por modelo.")
+DEFAULT_RESPONSES = CounterMetric(
+    "scoring_default_responses_total",
+    "Filas que terminaron con la respuesta por defecto, por motivo (all_models_failed, parse_failure, "
+    "missing_fields).",
+)
+FIELD_REPAIRS = CounterMetric(
+    "scoring_field_repairs_total",
+    "Peticiones para completar campos faltantes (modo estructurado), por resultado (complete, incomplete).",
+)
+CIRCUIT_STATE = GaugeMetric("llm_circuit_state", "Circuito de cada modelo: 0 cerrado, 1 semiabierto, 2 abierto.")
+CIRCUIT_OPENED = CounterMetric("llm_circuit_opened_total", "Veces que se abrió el circuito de cada modelo.")
+ROWS_SCORED = CounterMetric(
+    "scoring_rows_total", "Filas puntuadas, por origen del resultado (cache, llm, historical, duplicate)."
+)
+SCHEDULER_QUEUED = GaugeMetric("llm_scheduler_queued", "Llamadas al LLM esperando lugar, por clase de prioridad.")
+HTTP_REQUEST_SECONDS = HistogramMetric(
+    "http_request_duration_seconds",
+    "Tiempo hasta la respuesta (en streams, hasta enviar los headers) por ruta, método y status.",
+)
+
+REGISTRY = [
+    STAGE_SECONDS, LLM_REQUESTS, LLM_TOKENS, DEFAULT_RESPONSES, FIELD_REPAIRS, CIRCUIT_STATE, CIRCUIT_OPENED, ROWS_SCORED,
+    SCHEDULER_QUEUED, HTTP_REQUEST_SECONDS,
+]
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- TRAZAS POR FILA / PETICIÓN ---
+
+class Trace:
+    """Etapas cronometradas (y atributos como modelo o tokens) de una fila o una petición."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.attributes: Dict[str, object] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.spans.append((stage, seconds))
+
+    def totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        """Valor para el header estándar `Server-Timing` (visible en las devtools del navegador)."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.totals().items())
+
+    def to_dict(self) -> dict:
+        return {
+            "trace": self.name,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.totals().items()},
+            **self.attributes,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace_scope(name: str, enabled: Optional[bool] = None) -> Iterator[Optional[Trace]]:
+    """
+    Abre una traza para el bloque (si `enabled`, o si METRICS_TRACE está activo) y la
+    imprime al terminar. Las etapas medidas dentro del bloque, incluidas las de tareas
+    asyncio creadas desde él, se anotan en esta traza.
+    """
+    if not (METRICS_TRACE if enabled is None else enabled):
+        yield None
+        return
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        print(f"🔎 TRACE {json.dumps(trace.to_dict(), ensure_ascii=False)}")
+
+
+def annotate(**attributes) -> None:
+    """Añade atributos (modelo, tokens, caché...) a la traza activa, si la hay."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def record_stage(stage: str, seconds: float, count: int = 1) -> None:
+    """Registra la duración de una etapa; `count` > 1 cuando la etapa cubrió varias filas (lotes)."""
+    for _ in range(count):
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
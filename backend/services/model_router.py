@@ -0,0 +1,239 @@
+import os
+import re
+import statistics
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+
+from services.metrics import CIRCUIT_OPENED, CIRCUIT_STATE
+from services.rate_limiter import ModelRateLimiter
+
+# Ventana deslizante para latencia y tasa de error de cada modelo.
+ROUTER_WINDOW_SECONDS = float(os.getenv("ROUTER_WINDOW_SECONDS", "300"))
+# Errores de cuota seguidos que abren el circuito de un modelo.
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+# Tasa de error (timeouts, errores, JSON inválido) que abre el circuito, con un mínimo de muestras.
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+# Tiempo en abierto antes de probar de nuevo (se duplica en cada reapertura, hasta el máximo).
+ROUTER_BASE_COOLDOWN_SECONDS = float(os.getenv("ROUTER_BASE_COOLDOWN_SECONDS", "30"))
+ROUTER_MAX_COOLDOWN_SECONDS = float(os.getenv("ROUTER_MAX_COOLDOWN_SECONDS", "600"))
+# Un modelo "not found" no va a aparecer en segundos.
+NOT_FOUND_COOLDOWN_SECONDS = 3600
+# Latencia supuesta cuando ningún modelo tiene muestras (un modelo sin muestras toma la
+# mediana de los demás, así el desempate es el orden de prioridad).
+DEFAULT_LATENCY_SECONDS = 5.0
+# Si todos los modelos esperan el resultado de su petición de prueba, se vuelve a mirar cada:
+PROBE_POLL_SECONDS = 1.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+SUCCESS = "success"
+QUOTA = "quota_429"
+NOT_FOUND = "not_found"
+TIMEOUT = "timeout"
+ERROR = "error"
+PARSE_FAILURE = "parse_failure"
+
+_RETRY_HINT_PATTERNS = [
+    re.compile(r"retry[- ]after:?\s*([\d.]+)", re.IGNORECASE),
+    re.compile(r"retry in\s*([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+]
+
+
+def parse_retry_after(error: Exception) -> Optional[float]:
+    """
+    Segundos que la API pide esperar tras un 429: header `Retry-After` si la excepción trae
+    la respuesta HTTP, o las pistas del mensaje de Gemini ("Please retry in 23.4s",
+    `retry_delay { seconds: 23 }`).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            return max(0.0, float(headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            pass
+    message = str(error)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return max(0.0, float(match.group(1)))
+    return None
+
+
+class ModelHealth:
+    """Estado del circuito y muestras recientes (momento, resultado, latencia) de un modelo."""
+
+    def __init__(self, name: str, priority: int):
+        self.name = name
+        self.priority = priority
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = ROUTER_BASE_COOLDOWN_SECONDS
+        self.consecutive_quota_errors = 0
+        self.probe_in_flight = False
+        self.samples: Deque[Tuple[float, str, float]] = deque()
+
+    def _trim(self, now: float) -> None:
+        while self.samples and self.samples[0][0] < now - ROUTER_WINDOW_SECONDS:
+            self.samples.popleft()
+
+    def add_sample(self, outcome: str, latency: float) -> None:
+        now = time.monotonic()
+        self.samples.append((now, outcome, latency))
+        self._trim(now)
+
+    def error_rate(self) -> Tuple[float, int]:
+        """
+        Fracción de llamadas recientes con timeout, error o JSON inválido. Los 429 no cuentan:
+        la cuota se gestiona con el limitador, el Retry-After y los 429 seguidos.
+        """
+        self._trim(time.monotonic())
+        total = len(self.samples)
+        if not total:
+            return 0.0, 0
+        errors = sum(1 for _, outcome, _ in self.samples if outcome in (TIMEOUT, ERROR, PARSE_FAILURE))
+        return errors / total, total
+
+    def median_latency(self) -> Optional[float]:
+        latencies = [latency for _, outcome, latency in self.samples if outcome == SUCCESS]
+        return statistics.median(latencies) if latencies else None
+
+    def snapshot(self) -> dict:
+        error_rate, samples = self.error_rate()
+        return {
+            "state": self.state,
+            "open_for_seconds": round(max(0.0, self.open_until - time.monotonic()), 1),
+            "error_rate": round(error_rate, 3),
+            "samples": samples,
+            "median_latency_seconds": None if self.median_latency() is None else round(self.median_latency(), 3),
+        }
+
+
+class ModelRouter:
+    """
+    Elige el modelo para cada llamada en lugar de probar siempre el primero de la lista:
+    - Cada modelo tiene un circuito (cerrado / abierto / semiabierto). Se abre tras varios
+      429 seguidos, una tasa de error alta en la ventana o un "not found", y respeta el
+      Retry-After que indique la API.
+    - Pasado el enfriamiento, una sola petición de prueba (semiabierto) decide si se cierra.
+    - Entre los modelos disponibles gana el que antes daría una respuesta válida: espera de
+      cuota en el limitador + latencia mediana / tasa de éxito en la ventana.
+    """
+
+    def __init__(self, models: Iterable[Tuple[str, int, int]], rate_limiter: ModelRateLimiter):
+        self.rate_limiter = rate_limiter
+        self.models: Dict[str, ModelHealth] = {
+            model_name: ModelHealth(model_name, priority) for priority, (model_name, _, _) in enumerate(models)
+        }
+        for model_name in self.models:
+            CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], model=model_name)
+
+    def _set_state(self, health: ModelHealth, state: str) -> None:
+        health.state = state
+        health.probe_in_flight = False
+        CIRCUIT_STATE.set(_STATE_VALUES[state], model=health.name)
+
+    def _refresh_state(self, health: ModelHealth) -> None:
+        if health.state == OPEN and time.monotonic() >= health.open_until:
+            self._set_state(health, HALF_OPEN)
+            print(f" -> Circuito de {health.name} semiabierto: se enviará una petición de prueba.")
+
+    def _expected_seconds(self, health: ModelHealth, tokens: int, fallback_latency: float) -> float:
+        error_rate, _ = health.error_rate()
+        success_rate = max(1.0 - error_rate, 0.05)
+        latency = health.median_latency()
+        latency = fallback_latency if latency is None else latency
+        return self.rate_limiter.estimate_wait(health.name, tokens) + latency / success_rate
+
+    def choose(self, tokens: int, exclude: Set[str] = frozenset()) -> Optional[str]:
+        """Mejor modelo disponible para una petición de `tokens` tokens (None si no hay ninguno)."""
+        known = [latency for latency in (h.median_latency() for h in self.models.values()) if latency is not None]
+        fallback_latency = statistics.median(known) if known else DEFAULT_LATENCY_SECONDS
+        candidates = []
+        for health in self.models.values():
+            if health.name in exclude:
+                continue
+            self._refresh_state(health)
+            if health.state == OPEN or (health.state == HALF_OPEN and health.probe_in_flight):
+                continue
+            candidates.append((self._expected_seconds(health, tokens, fallback_latency), health.priority, health))
+        if not candidates:
+            return None
+        _, _, best = min(candidates, key=lambda candidate: candidate[:2])
+        if best.state == HALF_OPEN:
+            best.probe_in_flight = True
+        return best.name
+
+    def seconds_until_available(self, exclude: Set[str] = frozenset()) -> float:
+        """Cuánto falta para que algún modelo (no excluido) vuelva a aceptar peticiones."""
+        now = time.monotonic()
+        waits = [
+            max(0.0, health.open_until - now)
+            for health in self.models.values()
+            if health.name not in exclude and not (health.state == HALF_OPEN and health.probe_in_flight)
+        ]
+        return min(waits) if waits else PROBE_POLL_SECONDS
+
+    def _open(self, health: ModelHealth, seconds: float, reason: str) -> None:
+        self._set_state(health, OPEN)
+        health.open_until = time.monotonic() + seconds
+        CIRCUIT_OPENED.inc(model=health.name)
+        print(f" ⚠️ Circuito de {health.name} abierto {seconds:.0f}s ({reason}).")
+
+    def record_success(self, model_name: str, latency: float) -> None:
+        health = self.models.get(model_name)
+        if health is None:
+            return
+        health.add_sample(SUCCESS, latency)
+        health.consecutive_quota_errors = 0
+        if health.state != CLOSED:
+            print(f" -> Circuito de {model_name} cerrado: el modelo respondió.")
+            self._set_state(health, CLOSED)
+        health.cooldown = ROUTER_BASE_COOLDOWN_SECONDS
+
+    def record_failure(self, model_name: str, outcome: str, latency: float = 0.0, retry_after: Optional[float] = None) -> None:
+        health = self.models.get(model_name)
+        if health is None:
+            return
+        health.add_sample(outcome, latency)
+
+        if outcome == QUOTA:
+            health.consecutive_quota_errors += 1
+            if retry_after:
+                # Mientras no haya cuota, el limitador hace que el router prefiera otro modelo
+                self.rate_limiter.block(model_name, retry_after)
+        if outcome == NOT_FOUND:
+            self._open(health, NOT_FOUND_COOLDOWN_SECONDS, "modelo no encontrado")
+            return
+        if health.state == OPEN:
+            # Respuestas tardías de peticiones lanzadas antes de abrir: no alargan el enfriamiento
+            return
+
+        error_rate, samples = health.error_rate()
+        if health.state == HALF_OPEN:
+            reason = "falló la petición de prueba"
+        elif outcome == QUOTA and health.consecutive_quota_errors >= ROUTER_FAILURE_THRESHOLD:
+            reason = f"{health.consecutive_quota_errors} errores de cuota seguidos"
+        elif samples >= ROUTER_MIN_SAMPLES and error_rate >= ROUTER_MAX_ERROR_RATE:
+            reason = f"tasa de error {error_rate:.0%} en {samples} llamadas"
+        else:
+            return
+        self._open(health, max(health.cooldown, retry_after or 0.0), reason)
+        health.cooldown = min(health.cooldown * 2, ROUTER_MAX_COOLDOWN_SECONDS)
+
+    def release_probe(self, model_name: str) -> None:
+        """La petición de prueba no llegó a hacerse (p. ej. se canceló): otro puede intentarlo."""
+        health = self.models.get(model_name)
+        if health is not None and health.state == HALF_OPEN:
+            health.probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, dict]:
+        for health in self.models.values():
+            self._refresh_state(health)
+        return {name: health.snapshot() for name, health in self.models.items()}
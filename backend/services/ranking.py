@@ -0,0 +1,47 @@
+import time
+from typing import Dict, List, Optional
+
+from services.scoring_config import get_scoring_weights
+
+
+def reweight_results(results: List[dict], weights: Optional[Dict[str, float]] = None) -> dict:
+    """
+    Recalcula `final_weighted_score` y el ranking de un lote ya puntuado con otros pesos,
+    sin llamar al LLM: los puntajes dimensionales se pasan a una matriz (filas x categorías)
+    y el puntaje final es un único producto matriz-vector.
+
+    `weights` sustituye (total o parcialmente) a los pesos de scoring_config.json.
+    Las categorías que falten en una fila cuentan como 0, igual que en calculate_final_score.
+    Las filas sin puntajes dimensionales (p. ej. las ya conocidas en los históricos, que no
+    pasaron por el LLM) quedan fuera de la matriz: salen con puntaje y `rank` en None, al final.
+    """
+    import numpy as np
+    import pandas as pd
+
+    started = time.perf_counter()
+    effective_weights = {**get_scoring_weights(), **(weights or {})}
+    categories = list(effective_weights)
+
+    scored = np.array([bool(result.get("dimensional_scores")) for result in results], dtype=bool)
+    scores = pd.DataFrame.from_records(
+        [result["dimensional_scores"] for result, has_scores in zip(results, scored) if has_scores],
+        columns=categories,
+    )
+    matrix = scores.apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=float)
+    final_scores = np.full(len(results), np.nan)
+    final_scores[scored] = np.round(matrix @ np.array([effective_weights[c] for c in categories], dtype=float), 2)
+
+    ranking = pd.DataFrame({
+        "row_index": [result.get("row_index", position) for position, result in enumerate(results)],
+        "name": [result.get("Nombre de la startup") or result.get("Nombre") for result in results],
+        "final_weighted_score": final_scores,
+        "previous_score": [result.get("final_weighted_score") for result in results],
+    })
+    ranking["rank"] = ranking["final_weighted_score"].rank(method="min", ascending=False).astype("Int64")
+    ranking = ranking.sort_values(["rank", "row_index"], kind="stable")
+
+    return {
+        "weights": effective_weights,
+        "rows": ranking.astype(object).where(ranking.notna(), None).to_dict(orient="records"),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
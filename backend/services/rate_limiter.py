@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.shared_state import MULTI_WORKER, SharedStateDB, get_shared_state
+
+# --- TOKEN BUCKET ---
+# Cada bucket se rellena de forma continua. Con capacidad = límite por minuto
+# y recarga = límite / 60 reproduce la cuota "por minuto" de la API.
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until_available(self, amount: float) -> float:
+        """Segundos que faltan para poder consumir `amount` (0 si ya se puede)."""
+        self._refill()
+        # Una petición más grande que el bucket nunca cabría: la limitamos a la capacidad.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        """Vacía el bucket (p. ej. tras un 429, para que nadie más lo intente de inmediato)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+# --- LIMITADOR POR MODELO ---
+
+@dataclass(order=True)
+class _QuotaWaiter:
+    """Petición esperando cuota de un modelo: se ordena por prioridad y, a igual prioridad, por llegada."""
+    priority: int
+    arrival: int
+    turn: asyncio.Event = field(default_factory=asyncio.Event, compare=False)
+
+
+class ModelRateLimiter:
+    """
+    Limitador de cuota por modelo: un bucket de peticiones (RPM) y otro de tokens (TPM).
+    `acquire` espera lo justo hasta que ambos tengan capacidad, en lugar de pausas fijas.
+    """
+
+    def __init__(self, quotas: Iterable[Tuple[str, int, int]], clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        # Fila (heap) de las peticiones que esperan cuota de cada modelo
+        self._waiters: Dict[str, List[_QuotaWaiter]] = {}
+        self._arrivals = itertools.count()
+        for model_name, rpm, tpm in quotas:
+            self._buckets[model_name] = (
+                TokenBucket(rpm, rpm / 60.0, clock),
+                TokenBucket(tpm, tpm / 60.0, clock),
+            )
+
+    def _wait_time(self, model_name: str, tokens: int) -> float:
+        requests_bucket, tokens_bucket = self._buckets[model_name]
+        blocked_wait = self._blocked_until.get(model_name, 0.0) - self._clock()
+        return max(
+            blocked_wait,
+            requests_bucket.time_until_available(1),
+            tokens_bucket.time_until_available(tokens),
+        )
+
+    def estimate_wait(self, model_name: str, tokens: int) -> float:
+        """Segundos que tardaría `acquire` ahora mismo (sin reservar cuota)."""
+        if model_name not in self._buckets:
+            return 0.0
+        return max(0.0, self._wait_time(model_name, tokens))
+
+    def _try_acquire(self, model_name: str, tokens: int) -> float:
+        """Consume la cuota si la hay (devuelve 0); si no, devuelve los segundos que faltan."""
+        wait = self._wait_time(model_name, tokens)
+        if wait <= 0:
+            requests_bucket, tokens_bucket = self._buckets[model_name]
+            requests_bucket.consume(1)
+            tokens_bucket.consume(tokens)
+        return wait
+
+    async def acquire(self, model_name: str, tokens: int, priority: int = 0) -> float:
+        """
+        Espera hasta tener cuota para una petición de `tokens` tokens. Devuelve los segundos esperados.
+        Las peticiones que esperan el mismo modelo se atienden por `priority` (menor primero) y,
+        a igual prioridad, por orden de llegada: solo la primera de la fila intenta consumir, así
+        una petición interactiva se lleva la próxima cuota aunque haya masivas esperando antes.
+        """
+        if model_name not in self._buckets:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waited = False
+        queue = self._waiters.setdefault(model_name, [])
+        waiter = _QuotaWaiter(priority, next(self._arrivals))
+        heapq.heappush(queue, waiter)
+        try:
+            while True:
+                while queue[0] is not waiter:
+                    waited = True
+                    waiter.turn.clear()
+                    await waiter.turn.wait()
+                async with self._lock:
+                    wait = self._try_acquire(model_name, tokens)
+                if wait <= 0:
+                    return loop.time() - started if waited else 0.0
+                # Si mientras tanto llega alguien con más prioridad, al despertar le cedemos el turno
+                waited = True
+                await asyncio.sleep(wait)
+        finally:
+            queue.remove(waiter)
+            heapq.heapify(queue)
+            if queue:
+                queue[0].turn.set()
+
+    def block(self, model_name: str, seconds: float) -> None:
+        """Marca un modelo como sin cuota durante `seconds` (tras un 429) y vacía sus buckets."""
+        if model_name not in self._buckets:
+            return
+        until = self._clock() + seconds
+        self._blocked_until[model_name] = max(self._blocked_until.get(model_name, 0.0), until)
+        for bucket in self._buckets[model_name]:
+            bucket.drain()
+
+
+# --- LIMITADOR COMPARTIDO ENTRE WORKERS ---
+
+class SharedModelRateLimiter(ModelRateLimiter):
+    """
+    Mismos buckets que ModelRateLimiter, pero su estado vive en SQLite y se lee y
+    actualiza dentro de una transacción exclusiva: todos los workers de la máquina
+    reparten la misma cuota en lugar de multiplicarla. Usa el reloj de pared porque
+    el estado se compara entre procesos y sobrevive a los reinicios.
+    """
+
+    def __init__(self, quotas: Iterable[Tuple[str, int, int]], db: Optional[SharedStateDB] = None):
+        super().__init__(quotas, clock=time.time)
+        self._db = db or get_shared_state()
+        self._initialized = False
+
+    def _load(self, conn, model_name: str) -> None:
+        requests_bucket, tokens_bucket = self._buckets[model_name]
+        if not self._initialized:
+            # Un modelo nuevo empieza con los buckets llenos; los existentes conservan su estado
+            conn.executemany(
+                "INSERT OR IGNORE INTO rate_limits (model_name, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                [(name, requests.capacity, tokens.capacity, self._clock())
+                 for name, (requests, tokens) in self._buckets.items()],
+            )
+            self._initialized = True
+        requests_left, tokens_left, updated_at, blocked_until = conn.execute(
+            "SELECT requests, tokens, updated_at, blocked_until FROM rate_limits WHERE model_name = ?", (model_name,)
+        ).fetchone()
+        requests_bucket.tokens, tokens_bucket.tokens = requests_left, tokens_left
+        requests_bucket.updated_at = tokens_bucket.updated_at = updated_at
+        self._blocked_until[model_name] = blocked_until
+
+    def _save(self, conn, model_name: str) -> None:
+        requests_bucket, tokens_bucket = self._buckets[model_name]
+        conn.execute(
+            "UPDATE rate_limits SET requests = ?, tokens = ?, updated_at = ?, blocked_until = ? WHERE model_name = ?",
+            (requests_bucket.tokens, tokens_bucket.tokens, max(requests_bucket.updated_at, tokens_bucket.updated_at),
+             self._blocked_until.get(model_name, 0.0), model_name),
+        )
+
+    def estimate_wait(self, model_name: str, tokens: int) -> float:
+        if model_name not in self._buckets:
+            return 0.0
+        with self._db.transaction() as conn:
+            self._load(conn, model_name)
+            return super().estimate_wait(model_name, tokens)
+
+    def _try_acquire(self, model_name: str, tokens: int) -> float:
+        with self._db.transaction() as conn:
+            self._load(conn, model_name)
+            wait = super()._try_acquire(model_name, tokens)
+            self._save(conn, model_name)
+        return wait
+
+    def block(self, model_name: str, seconds: float) -> None:
+        if model_name not in self._buckets:
+            return
+        with self._db.transaction() as conn:
+            self._load(conn, model_name)
+            super().block(model_name, seconds)
+            self._save(conn, model_name)
+
+
+def create_rate_limiter(quotas: Iterable[Tuple[str, int, int]]) -> ModelRateLimiter:
+    """Limitador del proceso: compartido en SQLite en modo multi-worker, en memoria si no."""
+    return SharedModelRateLimiter(quotas) if MULTI_WORKER else ModelRateLimiter(quotas)
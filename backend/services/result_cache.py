@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+# Claves del resultado que NO forman parte de los datos de la startup (análisis, puntaje, índice y
+# marcas de la deduplicación). Se quitan antes de calcular la clave y de armar los prompts de
+# re-análisis, así una fila ya puntuada o exportada apunta a la misma entrada que la original.
+RESULT_KEYS = frozenset({
+    "dimensional_scores", "qualitative_analysis", "score_justification", "final_weighted_score", "row_index",
+    "historical_match", "duplicate_of",
+})
+
+# Por defecto en el directorio temporal: en Vercel el resto del sistema de archivos es de solo lectura.
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "result_cache.sqlite3"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "200"))
+
+
+def normalize_startup_json(startup_data: str) -> str:
+    """JSON canónico de la fila: claves ordenadas, sin nulos/vacíos ni campos de resultado."""
+    try:
+        parsed = json.loads(startup_data)
+    except json.JSONDecodeError:
+        return startup_data.strip()
+    if not isinstance(parsed, dict):
+        return json.dumps(parsed, sort_keys=True, ensure_ascii=False)
+    cleaned = {
+        str(k).strip(): (v.strip() if isinstance(v, str) else v)
+        for k, v in parsed.items()
+        if k not in RESULT_KEYS and v is not None and v != ""
+    }
+    return json.dumps(cleaned, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def make_cache_key(startup_data: str, context_version: str, model_name: str) -> str:
+    raw = "\x1f".join([normalize_startup_json(startup_data), context_version, model_name])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# --- CACHÉ EN DISCO (SQLITE) ---
+
+class ResultCache:
+    """
+    Caché persistente de resultados del LLM con expulsión LRU por tamaño.
+    La clave combina la fila normalizada, la versión del contexto y el modelo.
+    Es opcional: si la base no se puede abrir o una operación falla, se avisa y el scoring
+    sigue sin caché (una búsqueda fallida cuenta como fallo; un guardado fallido se omite).
+    """
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_bytes: int = int(RESULT_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            self._conn = self._open(path)
+        except sqlite3.Error as e:
+            print(f"⚠️ No se pudo abrir la caché de resultados ('{path}'): {e}. Se sigue sin caché.")
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                model_name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)")
+        conn.commit()
+        return conn
+
+    def lookup(self, startup_data: str, context_version: str, model_names: Iterable[str]) -> Optional[Tuple[dict, str]]:
+        """Busca un resultado para la fila con cualquiera de los modelos (en orden de prioridad)."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    for model_name in model_names:
+                        key = make_cache_key(startup_data, context_version, model_name)
+                        row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                        if row is not None:
+                            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+                            self._conn.commit()
+                            self.hits += 1
+                            return json.loads(row[0]), model_name
+                except sqlite3.Error as e:
+                    print(f"⚠️ Error al leer la caché de resultados: {e}. La fila se puntúa sin caché.")
+            self.misses += 1
+            return None
+
+    def store(self, startup_data: str, context_version: str, model_name: str, result: dict) -> None:
+        if self._conn is None:
+            return
+        value = json.dumps(result, ensure_ascii=False)
+        key = make_cache_key(startup_data, context_version, model_name)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, model_name, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, model_name, value, len(value.encode("utf-8")), time.time()),
+                )
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                print(f"⚠️ Error al guardar en la caché de resultados: {e}. El resultado no se guarda.")
+
+    def _evict(self) -> None:
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_access ASC"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        entries = size = None
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    entries, size = self._conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Error al leer la caché de resultados: {e}.")
+        return {
+            "enabled": self._conn is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(RESULT_CACHE_PATH)
+    return _result_cache
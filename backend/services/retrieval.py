@@ -0,0 +1,178 @@
+import json
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Palabras vacías (español/inglés) que no aportan a la similitud.
+STOPWORDS = {
+    "de", "la", "el", "en", "y", "a", "los", "las", "del", "se", "que", "por", "un", "una",
+    "con", "para", "es", "al", "lo", "como", "mas", "su", "sus", "o", "u", "no", "si", "ya",
+    "le", "les", "este", "esta", "estos", "estas", "son", "ser", "hay", "pero", "muy", "sin",
+    "sobre", "entre", "tambien", "the", "and", "of", "to", "in", "for", "is", "on", "with",
+    "null", "none", "nan", "true", "false",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes y sin palabras vacías."""
+    normalized = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return [token for token in _TOKEN_RE.findall(normalized) if token not in STOPWORDS]
+
+
+# --- ÍNDICE TF-IDF ---
+
+class TfidfIndex:
+    """
+    Índice TF-IDF en memoria guardado como listas invertidas en arrays de NumPy
+    (una por término). La memoria crece con el número de términos de cada documento,
+    no con documentos x vocabulario, así que escala a miles de filas históricas.
+    """
+
+    def __init__(self, documents: List[str]):
+        self.size = len(documents)
+        doc_terms = [Counter(tokenize(doc)) for doc in documents]
+
+        document_frequency = Counter()
+        for terms in doc_terms:
+            document_frequency.update(terms.keys())
+        self.vocabulary: Dict[str, int] = {term: i for i, term in enumerate(sorted(document_frequency))}
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, df in document_frequency.items():
+            self.idf[self.vocabulary[term]] = np.log((1 + self.size) / (1 + df)) + 1
+
+        # Pesos (tf sublineal * idf) normalizados L2 por documento, como tripletas (término, doc, peso)
+        term_ids, doc_ids, weights = [], [], []
+        for doc_id, terms in enumerate(doc_terms):
+            if not terms:
+                continue
+            ids = np.fromiter((self.vocabulary[t] for t in terms), dtype=np.int32, count=len(terms))
+            w = (1 + np.log(np.fromiter(terms.values(), dtype=np.float32, count=len(terms)))) * self.idf[ids]
+            term_ids.append(ids)
+            doc_ids.append(np.full(len(ids), doc_id, dtype=np.int32))
+            weights.append(w / np.linalg.norm(w))
+
+        # Formato tipo CSC: term_indptr[t]:term_indptr[t+1] delimita la lista del término t
+        term_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.doc_ids = np.concatenate(doc_ids)[order] if doc_ids else np.zeros(0, dtype=np.int32)
+        self.weights = np.concatenate(weights)[order] if weights else np.zeros(0, dtype=np.float32)
+        self.term_indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)), out=self.term_indptr[1:])
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Devuelve hasta `top_k` pares (documento, similitud coseno) con similitud > 0."""
+        if self.size == 0 or top_k <= 0:
+            return []
+        query_terms = Counter(t for t in tokenize(query) if t in self.vocabulary)
+        if not query_terms:
+            return []
+        term_ids = np.array([self.vocabulary[t] for t in query_terms], dtype=np.int32)
+        query_weights = (1 + np.log(np.array(list(query_terms.values()), dtype=np.float32))) * self.idf[term_ids]
+        query_weights /= np.linalg.norm(query_weights)
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term_id, query_weight in zip(term_ids, query_weights):
+            start, end = self.term_indptr[term_id], self.term_indptr[term_id + 1]
+            np.add.at(scores, self.doc_ids[start:end], query_weight * self.weights[start:end])
+
+        top_k = min(top_k, self.size)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in ranked if scores[i] > 0]
+
+
+# --- RECUPERACIÓN DE CONTEXTO POR FILA ---
+
+def record_text(record: dict) -> str:
+    """Texto indexable de un registro: solo los valores (las claves se repiten en todos)."""
+    return " ".join(str(value) for value in record.values() if value is not None)
+
+
+def split_passages(text: str, max_chars: int = 800) -> List[str]:
+    """Parte el texto de la tesis en pasajes de hasta `max_chars`, respetando párrafos."""
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n|(?<=\.)\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {paragraph}".strip()
+        while len(current) > max_chars:
+            passages.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        passages.append(current)
+    return passages
+
+
+class ContextRetriever:
+    """
+    Selecciona, para cada startup candidata, las startups históricas y los pasajes de la
+    tesis más parecidos, sin pasarse de `max_chars` en total.
+    """
+
+    def __init__(
+        self,
+        qualitative_records: List[dict],
+        quantitative_records: List[dict],
+        thesis_text: str,
+        top_k_startups: int = 3,
+        top_k_passages: int = 4,
+        max_chars: int = 30000
+    ):
+        self.top_k_startups = top_k_startups
+        self.top_k_passages = top_k_passages
+        self.max_chars = max_chars
+
+        passages = split_passages(thesis_text)
+        self.sources: Dict[str, List[str]] = {
+            "qualitative": [json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in qualitative_records],
+            "quantitative": [json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in quantitative_records],
+            "thesis": passages,
+        }
+        self.indexes = {
+            "qualitative": TfidfIndex([record_text(r) for r in qualitative_records]),
+            "quantitative": TfidfIndex([record_text(r) for r in quantitative_records]),
+            "thesis": TfidfIndex(passages),
+        }
+
+    def retrieve(self, query: str) -> Dict[str, List[str]]:
+        """
+        Devuelve los fragmentos elegidos por fuente, en orden de relevancia.
+        `query` puede ser el JSON de la startup o texto libre.
+        """
+        try:
+            parsed = json.loads(query)
+            if isinstance(parsed, dict):
+                query = record_text(parsed)
+        except json.JSONDecodeError:
+            pass
+
+        candidates = []
+        for name, index in self.indexes.items():
+            top_k = self.top_k_passages if name == "thesis" else self.top_k_startups
+            matches = index.search(query, top_k)
+            if name == "thesis" and len(matches) < top_k:
+                # La tesis siempre aplica: si hay pocas coincidencias, completamos con los primeros pasajes
+                found = {doc_id for doc_id, _ in matches}
+                matches += [(i, 0.0) for i in range(len(self.sources[name])) if i not in found][:top_k - len(matches)]
+            for rank, (doc_id, score) in enumerate(matches):
+                candidates.append((rank, -score, name, self.sources[name][doc_id]))
+
+        # Primero el mejor de cada fuente, luego el segundo de cada una, etc.
+        selected: Dict[str, List[str]] = {name: [] for name in self.sources}
+        used_chars = 0
+        for _, _, name, text in sorted(candidates, key=lambda c: (c[0], c[1])):
+            if used_chars + len(text) > self.max_chars:
+                continue
+            selected[name].append(text)
+            used_chars += len(text)
+        return selected
+
@@ -1,20 +1,38 @@
-import pandas as pd
 import json
 import asyncio
+import os
 import re
 import time
-from typing import List, Dict, Tuple
-import google.generativeai as genai
+from collections import Counter
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+)
+
+from services.context import ContextBundle
+from services.dedup import DEDUP_ENABLED, DUPLICATE, KNOWN, NEW, UploadDeduplicator, get_known_startups
+from services.llm_backend import get_llm_backend
+from services.llm_scheduler import BULK, current_priority_rank, get_llm_scheduler, llm_request_class
+from services.metrics import (
+    DEFAULT_RESPONSES, FIELD_REPAIRS, LLM_REQUESTS, LLM_TOKENS, ROWS_SCORED, annotate, record_stage, stage_timer, trace_scope
+)
+from services.model_router import ERROR, NOT_FOUND, PARSE_FAILURE, QUOTA, TIMEOUT, ModelRouter, parse_retry_after
+from services.rate_limiter import create_rate_limiter
+from services.result_cache import RESULT_KEYS, get_result_cache
+from services.scoring_config import get_scoring_config, get_scoring_weights
+from services.structured_output import (
+    QUALITATIVE_KEYS, IncrementalJSONParser, build_repair_prompt, build_response_schema, expected_fields, merge_fields,
+    missing_fields
+)
+
+if TYPE_CHECKING:
+    # pandas solo se usa a través de las filas que llegan; no se importa en el arranque
+    import pandas as pd
 
 # --- CONFIGURACIÓN Y CONSTANTES ---
 
-# Carga de configuración de puntajes
-try:
-    with open("scoring_config.json", "r") as f:
-        config_data = json.load(f)
-    SCORING_CONFIG = config_data.get("SCORING_CATEGORIES", {})
-except (FileNotFoundError, json.JSONDecodeError):
-    SCORING_CONFIG = {}
+# La configuración de puntajes (scoring_config.json) se lee con get_scoring_config(),
+# que la recarga en caliente si el archivo cambia.
 
 # Jerarquía de estados para contexto
 STATUS_HIERARCHY = {
@@ -28,54 +46,82 @@ STATUS_HIERARCHY = {
     "Rechazo con feed": {"score": 1, "description": "Rechazada. No cumple los criterios, aunque se dio feedback."},
 }
 
-# --- CONFIGURACIÓN DE MODELOS Y TIEMPOS DE ESPERA ---
-# Estructura: (Nombre del Modelo, Segundos de Espera si tiene éxito)
+# --- CONFIGURACIÓN DE MODELOS Y CUOTAS ---
+# Estructura: (Nombre del Modelo, Peticiones por minuto, Tokens por minuto)
 MODEL_PRIORITY_CONFIG = [
-    ("gemini-2.5-flash-lite", 6),   # Prioridad 1: Muy rápido. Espera 6s.
-    ("gemini-2.5-flash", 12)        # Prioridad 2: Respaldo potente. Espera 12s.
+    ("gemini-2.5-flash-lite", 10, 250_000),   # Prioridad 1: Muy rápido.
+    ("gemini-2.5-flash", 5, 250_000)          # Prioridad 2: Respaldo potente.
 ]
 
-# --- LÓGICA DE SCORING CON IA (CON FALLBACK Y TIEMPOS DINÁMICOS) ---
+# Ventana de contexto y límite de salida (tokens) de cada modelo, para dimensionar los lotes.
+MODEL_LIMITS = {
+    "gemini-2.5-flash-lite": {"input_tokens": 1_048_576, "output_tokens": 65_536},
+    "gemini-2.5-flash": {"input_tokens": 1_048_576, "output_tokens": 65_536},
+}
+
+# Tokens de salida que reservamos por startup dentro de un lote.
+OUTPUT_TOKENS_PER_ROW = 2_000
 
-def get_llm_dimensional_scoring(
-    startup_data: str, 
-    qualitative_context_json: str, 
-    quantitative_context_json: str, 
-    thesis_context: str
-) -> Tuple[dict, int]: # Retorna: (JSON Resultado, Segundos a esperar)
-    
-    # Respuesta por defecto en caso de error total
-    default_response = {
-        "dimensional_scores": {category: 0 for category in SCORING_CONFIG.keys()},
-        "qualitative_analysis": {k: "Error" for k in ["project_thesis", "problem", "solution", "key_metrics", "founding_team", "market_and_competition"]},
-        "score_justification": {k: "Error" for k in ["equipo", "producto", "tesis_utec", "oportunidad", "validacion"]}
+# Filas por llamada en modo lote (1 = una startup por llamada). Se limita según MODEL_LIMITS.
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "1"))
+
+# Filas que se puntúan en paralelo. El ritmo real lo marca el limitador de cuota.
+SCORING_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "4"))
+
+# Segundos que se bloquea un modelo tras un 429 que no dice cuándo reintentar (Retry-After).
+# Si los 429 se repiten, el circuito del modelo se abre (ver services/model_router.py).
+QUOTA_BACKOFF_SECONDS = float(os.getenv("QUOTA_BACKOFF_SECONDS", "20"))
+
+# Tiempo máximo de una llamada al LLM antes de pasar al siguiente modelo.
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "90"))
+
+# Máximo que una fila espera a que se cierre algún circuito (con todos abiertos) antes de darse por fallida.
+CIRCUIT_WAIT_MAX_SECONDS = float(os.getenv("CIRCUIT_WAIT_MAX_SECONDS", str(LLM_CALL_TIMEOUT_SECONDS)))
+
+# Cada cuántos segundos el stream comprueba si el cliente sigue conectado.
+DISCONNECT_POLL_SECONDS = 1.0
+
+# Modo estructurado: JSON restringido a un esquema, respuesta en streaming (cada puntaje se
+# publica en cuanto llega) y reparación solo de los campos que falten.
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "").lower() in ("1", "true", "yes")
+
+# Limitador y router compartidos por todas las peticiones del proceso. En modo multi-worker
+# el estado del limitador (cuota) se comparte además entre procesos (ver services/shared_state.py).
+rate_limiter = create_rate_limiter(MODEL_PRIORITY_CONFIG)
+model_router = ModelRouter(MODEL_PRIORITY_CONFIG, rate_limiter)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token) para el bucket de TPM."""
+    return len(text) // 4 + 1
+
+
+def calculate_final_score(dimensional_scores: dict) -> float:
+    """Puntaje ponderado según los pesos vigentes de scoring_config.json."""
+    final_score = sum(
+        (dimensional_scores.get(category, 0) or 0) * weight
+        for category, weight in get_scoring_weights().items()
+    )
+    return round(final_score, 2)
+
+def build_default_response() -> dict:
+    """Resultado vacío que se devuelve cuando el LLM no produce un análisis válido."""
+    return {
+        "dimensional_scores": {category: 0 for category in get_scoring_config()},
+        "qualitative_analysis": {k: "Error" for k in QUALITATIVE_KEYS},
+        "score_justification": {k: "Error" for k in get_scoring_config()}
     }
 
-    status_hierarchy_prompt = "\n".join(f'- {s} (Nivel {d["score"]}/10): {d["description"]}' for s, d in STATUS_HIERARCHY.items())
-    
-    # Construcción del Prompt con Doble Contexto
-    prompt = f"""
-        Eres un analista de Venture Capital de clase mundial en UTEC Ventures. Tu tarea es analizar una startup candidata usando dos tipos de contexto histórico.
-
-        **CONTEXTO ESTRATÉGICO Y DATOS HISTÓRICOS:**
-
-        1.  **Tesis de Inversión (Nuestra Filosofía):**
-            ```
-            {thesis_context}
-            ```
-
-        2.  **Contexto Histórico CUALITATIVO:**
-            Esta es una lista de informes cualitativos de startups que hemos analizado. Úsala para entender nuestro estilo de evaluación.
-            ```json
-            {qualitative_context_json}
-            ```
-
-        3.  **Contexto Histórico CUANTITATIVO:**
-            Esta es una tabla con los puntajes numéricos y decisiones finales pasadas. Úsala para calibrar tus puntajes.
-            ```json
-            {quantitative_context_json}
-            ```
-        
+
+# Quién recibe los puntajes parciales de la fila en curso (modo estructurado): (categoría, puntaje).
+# (None, None) significa que los parciales enviados hasta ahora para la fila ya no valen.
+_partial_listener: ContextVar[Optional[Callable[[Optional[str], object], None]]] = ContextVar("partial_listener", default=None)
+
+# --- LÓGICA DE SCORING CON IA (CON FALLBACK Y LIMITADOR DE CUOTA) ---
+
+def build_row_prompt(startup_data: str, row_context: str = "") -> str:
+    """Parte del prompt propia de cada fila. El contexto compartido va en el ContextBundle."""
+    return f"""{row_context}
         **TAREA:**
         Analiza la siguiente startup candidata basándote en TODO el contexto:
         
@@ -113,128 +159,833 @@ def get_llm_dimensional_scoring(
         ```
         """
 
-    # Bucle de intentos por modelo (Lite -> Flash)
-    for model_name, wait_seconds in MODEL_PRIORITY_CONFIG:
+
+def extract_json(text_response: str, opening: str = '{', closing: str = '}'):
+    """Extrae y parsea el bloque JSON de la respuesta del LLM. Devuelve None si no es válido."""
+    text_response = text_response.strip()
+    json_start = text_response.find(opening)
+    json_end = text_response.rfind(closing) + 1
+    if json_start == -1 or json_end == 0:
+        return None
+    json_text = text_response[json_start:json_end]
+    # Limpieza básica de errores comunes de JSON en LLMs
+    json_text = re.sub(r',\s*([}\]])', r'\1', json_text)
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
+        return None
+
+
+class _AllModelsPaused(Exception):
+    """Ningún modelo admite peticiones ahora (todos los circuitos abiertos); `wait` es lo que falta."""
+
+    def __init__(self, wait: float):
+        super().__init__(f"Todos los modelos en pausa ({wait:.1f}s)")
+        self.wait = wait
+
+
+async def call_llm_with_fallback(
+    row_prompt: str,
+    context: ContextBundle,
+    response_schema: Optional[dict] = None,
+    stream_parser: Optional[IncrementalJSONParser] = None
+) -> Tuple[Optional[str], Optional[str], Optional[float]]: # Retorna: (texto, modelo que respondió, latencia)
+    """
+    Toda llamada al LLM pasa primero por el scheduler central (services/llm_scheduler.py):
+    espera su lugar según la clase del contexto (interactiva o del job masivo que la hizo).
+    Si todos los circuitos están abiertos, se espera FUERA del lugar (así no se lo quita a
+    nadie) y como mucho CIRCUIT_WAIT_MAX_SECONDS en total; pasado eso la fila falla.
+    Si hubo respuesta, quien la parsea registra el resultado con `record_parse_outcome`.
+    """
+    circuit_waited = 0.0
+    while True:
+        try:
+            async with get_llm_scheduler().slot():
+                return await _call_llm_with_fallback(row_prompt, context, response_schema, stream_parser)
+        except _AllModelsPaused as paused:
+            if circuit_waited + paused.wait > CIRCUIT_WAIT_MAX_SECONDS:
+                print(
+                    f" ❌ Todos los modelos en pausa por {paused.wait:.0f}s más "
+                    f"(máximo de espera: {CIRCUIT_WAIT_MAX_SECONDS:.0f}s). Se omite la fila."
+                )
+                return None, None, None
+            print(f" -> Todos los modelos en pausa. Reintentando en {paused.wait:.1f}s...")
+            with stage_timer("circuit_wait"):
+                await asyncio.sleep(paused.wait)
+            circuit_waited += paused.wait
+
+
+async def _call_llm_with_fallback(
+    row_prompt: str,
+    context: ContextBundle,
+    response_schema: Optional[dict] = None,
+    stream_parser: Optional[IncrementalJSONParser] = None
+) -> Tuple[Optional[str], Optional[str], Optional[float]]:
+    """
+    Envía el prompt al modelo que el router considere mejor ahora mismo (cuota disponible,
+    latencia y errores recientes, circuitos abiertos) y, si falla, al siguiente.
+    Cada modelo se intenta como mucho una vez por prompt. Devuelve (None, None, None) si todos
+    fallaron y lanza _AllModelsPaused si ninguno admitía peticiones (no se intentó nada).
+    Los errores de la llamada se registran aquí; una respuesta recibida todavía no cuenta como
+    éxito hasta que se parsea (ver `record_parse_outcome`).
+    Con `stream_parser` la respuesta llega en streaming y se va parseando (se reinicia en
+    cada intento); `response_schema` restringe la salida a ese esquema JSON.
+    """
+    backend = get_llm_backend()
+
+    # El contenido cacheado también cuenta para la cuota de tokens por minuto
+    prompt_tokens = context.estimated_tokens + estimate_tokens(row_prompt)
+
+    tried = set()
+    while len(tried) < len(MODEL_PRIORITY_CONFIG):
+        model_name = model_router.choose(prompt_tokens, exclude=tried)
+        if model_name is None:
+            if tried:
+                break
+            # Todos los circuitos abiertos: hay que esperar a que el primero admita una prueba
+            raise _AllModelsPaused(model_router.seconds_until_available())
+        tried.add(model_name)
+
+        started = time.perf_counter()
         try:
+            # Esperamos a que el modelo tenga cuota (RPM y TPM) antes de llamarlo
+            # Las interactivas se llevan la próxima cuota antes que las masivas que ya esperaban
+            waited = await rate_limiter.acquire(model_name, prompt_tokens, priority=current_priority_rank())
+            record_stage("rate_limit_wait", waited)
+            if waited:
+                print(f" -> Esperando cuota de {model_name}: {waited:.1f}s.")
             print(f" -> Intentando análisis con modelo: {model_name}...")
-            model = genai.GenerativeModel(model_name)
             
-            # Generar contenido
-            response = model.generate_content(prompt)
-            
-            # Procesar respuesta
-            text_response = response.text.strip()
-            json_start = text_response.find('{')
-            json_end = text_response.rfind('}') + 1
-
-            if json_start != -1 and json_end != -1:
-                json_text = text_response[json_start:json_end]
-                # Limpieza básica de errores comunes de JSON en LLMs
-                json_text = re.sub(r',\s*([}\]])', r'\1', json_text)
-                try:
-                    # ÉXITO: Retornamos el JSON y el tiempo de espera asociado al modelo
-                    return json.loads(json_text), wait_seconds
-                except json.JSONDecodeError:
-                    print(f" -> Error de sintaxis JSON en {model_name}.")
-                    return default_response, 5 # Error de parseo, espera corta
-            else:
-                print(f" -> {model_name} no devolvió un JSON válido.")
-                return default_response, 5
+            # Generar contenido de forma asíncrona: no bloquea el event loop del worker
+            started = time.perf_counter()
+            if stream_parser is not None:
+                stream_parser.reset()
+            with stage_timer("llm_call"):
+                response = await asyncio.wait_for(
+                    backend.generate(
+                        model_name, row_prompt, context, LLM_CALL_TIMEOUT_SECONDS,
+                        response_schema=response_schema,
+                        on_text=stream_parser.feed if stream_parser is not None else None,
+                    ),
+                    timeout=LLM_CALL_TIMEOUT_SECONDS,
+                )
+            latency = time.perf_counter() - started
+            LLM_TOKENS.inc(response.input_tokens, model=model_name, direction="input")
+            LLM_TOKENS.inc(response.output_tokens, model=model_name, direction="output")
+            annotate(model=model_name, input_tokens=response.input_tokens, output_tokens=response.output_tokens)
+            return response.text, model_name, latency
 
+        except asyncio.TimeoutError:
+            LLM_REQUESTS.inc(model=model_name, outcome=TIMEOUT)
+            model_router.record_failure(model_name, TIMEOUT, latency=time.perf_counter() - started)
+            print(f" ⚠️ Timeout ({LLM_CALL_TIMEOUT_SECONDS:.0f}s) en {model_name}. Cambiando al siguiente modelo...")
+            continue
+        except asyncio.CancelledError:
+            # Si esta era la petición de prueba de un circuito semiabierto, la liberamos
+            model_router.release_probe(model_name)
+            raise
         except Exception as e:
             error_msg = str(e).lower()
             # Manejo de errores de Cuota (429)
             if "429" in error_msg or "quota" in error_msg or "resource exhausted" in error_msg:
-                print(f" ⚠️ Cuota excedida en {model_name}. Cambiando al siguiente modelo...")
-                continue # Salta al siguiente modelo en la lista
+                LLM_REQUESTS.inc(model=model_name, outcome=QUOTA)
+                retry_after = parse_retry_after(e)
+                hint = f" (Retry-After {retry_after:.0f}s)" if retry_after is not None else ""
+                print(f" ⚠️ Cuota excedida en {model_name}{hint}. Cambiando al siguiente modelo...")
+                model_router.record_failure(
+                    model_name, QUOTA, retry_after=retry_after if retry_after is not None else QUOTA_BACKOFF_SECONDS
+                )
+                continue # Salta al siguiente modelo disponible
             elif "not found" in error_msg:
+                LLM_REQUESTS.inc(model=model_name, outcome=NOT_FOUND)
+                model_router.record_failure(model_name, NOT_FOUND)
                 print(f" ⚠️ Modelo {model_name} no encontrado. Saltando...")
                 continue
             else:
+                LLM_REQUESTS.inc(model=model_name, outcome=ERROR)
+                model_router.record_failure(model_name, ERROR, latency=time.perf_counter() - started)
                 print(f" !!! ERROR CRÍTICO en {model_name}: {e} !!!")
-                return default_response, 10
+                return None, None, None
 
-    # Si sale del bucle, fallaron todos
+    # Si sale del bucle, fallaron todos. Los modelos con 429 quedan bloqueados en el
+    # limitador (o con el circuito abierto), así que el router los evitará en las siguientes filas.
     print(" ❌ SE AGOTARON TODOS LOS MODELOS DISPONIBLES (Cuota o Error).")
-    return default_response, 60
+    return None, None, None
+
+
+def record_parse_outcome(model_name: str, latency: float, usable: bool) -> None:
+    """
+    Único resultado que el router recibe por respuesta, una vez parseada: una respuesta que
+    llegó pero no sirve cuenta solo como PARSE_FAILURE (nunca además como éxito), así un
+    modelo que devuelve basura abre su circuito y una prueba semiabierta no lo cierra.
+    """
+    if usable:
+        LLM_REQUESTS.inc(model=model_name, outcome="success")
+        model_router.record_success(model_name, latency)
+    else:
+        LLM_REQUESTS.inc(model=model_name, outcome=PARSE_FAILURE)
+        model_router.record_failure(model_name, PARSE_FAILURE, latency=latency)
+
+
+async def get_llm_dimensional_scoring(
+    startup_data: str, 
+    context: ContextBundle
+) -> Tuple[dict, Optional[str]]: # Retorna: (JSON Resultado, modelo que respondió o None si falló)
+    
+    if STRUCTURED_OUTPUT:
+        return await get_llm_structured_scoring(startup_data, context)
+
+    # El contexto (tesis + históricos) ya está construido en el bundle; aquí solo va la fila
+    # (en modo retrieval, más los fragmentos del histórico parecidos a esta startup)
+    with stage_timer("prompt_build"):
+        row_prompt = build_row_prompt(startup_data, context.row_context(startup_data))
+
+    text_response, model_name, latency = await call_llm_with_fallback(row_prompt, context)
+    if text_response is None:
+        DEFAULT_RESPONSES.inc(reason="all_models_failed")
+        return build_default_response(), None
+
+    with stage_timer("json_parse"):
+        parsed = extract_json(text_response)
+    record_parse_outcome(model_name, latency, isinstance(parsed, dict))
+    if not isinstance(parsed, dict):
+        print(f" -> {model_name} no devolvió un JSON válido.")
+        DEFAULT_RESPONSES.inc(reason="parse_failure")
+        return build_default_response(), None
+    return parsed, model_name
+
+
+async def _structured_call(
+    prompt: str,
+    context: ContextBundle,
+    response_schema: dict
+) -> Tuple[dict, Optional[str], Optional[float]]: # Retorna: (campos recibidos, modelo que respondió, latencia)
+    """
+    Llamada en streaming con salida restringida al esquema. Los puntajes se publican
+    en cuanto se cierran; si la respuesta se corta, se conservan los campos completos.
+    Si un intento se abandona a mitad (timeout, 429 o error) después de publicar puntajes,
+    se avisa (None, None) antes de que el siguiente modelo empiece a publicar los suyos.
+    Quien la llama decide si los campos alcanzan y lo registra con `record_parse_outcome`.
+    """
+    listener = _partial_listener.get()
+    published = False
+
+    def on_value(path, value):
+        nonlocal published
+        if listener is not None and len(path) == 2 and path[0] == "dimensional_scores":
+            published = True
+            listener(path[1], value)
+
+    def on_discard():
+        nonlocal published
+        if published:
+            published = False
+            listener(None, None)
+
+    parser = IncrementalJSONParser(on_value=on_value, on_discard=on_discard)
+    text_response, model_name, latency = await call_llm_with_fallback(
+        prompt, context, response_schema=response_schema, stream_parser=parser
+    )
+    if text_response is None:
+        on_discard()
+        return {}, None, None
+    with stage_timer("json_parse"):
+        try:
+            parsed = json.loads(text_response)
+        except json.JSONDecodeError:
+            parsed = parser.result
+    return (parsed if isinstance(parsed, dict) else {}), model_name, latency
+
+
+async def get_llm_structured_scoring(
+    startup_data: str,
+    context: ContextBundle
+) -> Tuple[dict, Optional[str]]: # Retorna: (JSON Resultado, modelo que respondió o None si quedó incompleto)
+    """
+    Modo estructurado de `get_llm_dimensional_scoring`: el esquema sale de scoring_config.json
+    y de las claves cualitativas. Si la respuesta llega incompleta o con campos inválidos,
+    una segunda petición pide solo esos campos en lugar de descartar todo.
+    """
+    with stage_timer("prompt_build"):
+        row_context = context.row_context(startup_data)
+        row_prompt = build_row_prompt(startup_data, row_context)
+
+    result, model_name, latency = await _structured_call(row_prompt, context, build_response_schema())
+    if model_name is None:
+        DEFAULT_RESPONSES.inc(reason="all_models_failed")
+        return build_default_response(), None
+
+    missing = missing_fields(result)
+    record_parse_outcome(model_name, latency, not missing)
+    if missing:
+        missing_count = sum(len(keys) for keys in missing.values())
+        print(f" -> {model_name} dejó {missing_count} campos sin completar. Pidiendo solo esos campos...")
+        with stage_timer("prompt_build"):
+            repair_prompt = build_repair_prompt(startup_data, row_context, result, missing)
+        listener = _partial_listener.get()
+        if listener is not None:
+            # Los parciales inválidos de la primera respuesta se descartan; los válidos se vuelven a enviar
+            listener(None, None)
+            kept = merge_fields({}, result, expected_fields()).get("dimensional_scores", {})
+            for category, score in kept.items():
+                listener(category, score)
+        repaired, repair_model, repair_latency = await _structured_call(
+            repair_prompt, context, build_response_schema(missing)
+        )
+        result = merge_fields(result, repaired, missing)
+        missing = missing_fields(result)
+        if repair_model is not None:
+            record_parse_outcome(repair_model, repair_latency, not missing)
+        FIELD_REPAIRS.inc(outcome="incomplete" if missing else "complete")
+
+    if missing:
+        # Lo que falte se rellena como en la respuesta por defecto; el resultado no se cachea
+        DEFAULT_RESPONSES.inc(reason="missing_fields")
+        return merge_fields(build_default_response(), result, expected_fields()), None
+    return result, model_name
+
+
+# --- SCORING POR LOTES (VARIAS STARTUPS EN UNA LLAMADA) ---
+
+def build_batch_prompt(rows: List[Tuple[int, str, str]]) -> str:
+    """Prompt con varias startups (row_id, datos, contexto de la fila), cada una identificada por su row_id."""
+    startups_section = "\n".join(
+        f"""
+        **Startup row_id={row_id}:**
+        {row_context}
+        ```json
+        {startup_data}
+        ```
+        """
+        for row_id, startup_data, row_context in rows
+    )
+    return f"""
+        **TAREA:**
+        Analiza CADA UNA de las siguientes {len(rows)} startups candidatas de forma independiente, basándote en TODO el contexto:
+        {startups_section}
+
+        **INSTRUCCIONES:**
+        Para cada startup completa la estructura JSON. Tus análisis cualitativos deben reflejar el estilo del contexto CUALITATIVO. Tus puntajes numéricos deben ser consistentes con la escala vista en el contexto CUANTITATIVO.
+        
+        **Formato de Salida (OBLIGATORIO):** un array JSON con un objeto por startup, con el mismo `row_id` que recibiste:
+        ```json
+        [
+            {{
+                "row_id": <row_id>,
+                "dimensional_scores": {{
+                    "equipo": <0-100>, "producto": <0-100>, "tesis_utec": <0-100>, 
+                    "oportunidad": <0-100>, "validacion": <0-100>
+                }},
+                "qualitative_analysis": {{
+                    "project_thesis": "...", "problem": "...", "solution": "...",
+                    "key_metrics": "...", "founding_team": "...", "market_and_competition": "..."
+                }},
+                "score_justification": {{
+                    "equipo": "...", "producto": "...", "tesis_utec": "...",
+                    "oportunidad": "...", "validacion": "..."
+                }}
+            }}
+        ]
+        ```
+        """
+
+
+def max_batch_rows(context: ContextBundle, row_tokens: int) -> int:
+    """
+    Cuántas filas caben en un lote según la ventana de contexto y el límite de salida
+    del modelo más pequeño de MODEL_PRIORITY_CONFIG.
+    """
+    models = [MODEL_LIMITS[model_name] for model_name, _, _ in MODEL_PRIORITY_CONFIG]
+    input_window = min(limits["input_tokens"] for limits in models)
+    output_window = min(limits["output_tokens"] for limits in models)
+    by_input = (input_window - context.estimated_tokens) // max(row_tokens, 1)
+    by_output = output_window // OUTPUT_TOKENS_PER_ROW
+    return max(1, min(by_input, by_output))
+
+
+def is_valid_result(result) -> bool:
+    return isinstance(result, dict) and isinstance(result.get("dimensional_scores"), dict)
 
 
-# --- BUCLE DE STREAMING (CON PAUSAS DINÁMICAS) ---
+async def get_llm_batch_scoring(
+    rows: List[Tuple[int, str, str]],
+    context: ContextBundle
+) -> Tuple[Optional[Dict[int, dict]], Optional[str]]: # Retorna: ({row_id: resultado válido}, modelo)
+    """
+    Puntúa varias filas en una sola llamada. Solo devuelve las entradas que se pudieron
+    parsear; las que falten deben reintentarse de forma individual. Si falló el lote entero
+    (ningún modelo respondió o la respuesta no es un array JSON) devuelve (None, modelo).
+    """
+    with stage_timer("prompt_build"):
+        prompt = build_batch_prompt(rows)
+    text_response, model_name, latency = await call_llm_with_fallback(prompt, context)
+    if text_response is None:
+        DEFAULT_RESPONSES.inc(len(rows), reason="all_models_failed")
+        return None, None
+
+    with stage_timer("json_parse"):
+        parsed = extract_json(text_response, '[', ']')
+    if not isinstance(parsed, list):
+        print(f" -> {model_name} no devolvió un array JSON válido para el lote.")
+        record_parse_outcome(model_name, latency, False)
+        DEFAULT_RESPONSES.inc(len(rows), reason="parse_failure")
+        return None, model_name
+
+    expected_ids = {row_id for row_id, _, _ in rows}
+    results = {}
+    for entry in parsed:
+        if not is_valid_result(entry):
+            continue
+        try:
+            row_id = int(entry.pop("row_id"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if row_id in expected_ids:
+            results[row_id] = entry
+    # Un array sin ninguna entrada utilizable es tan inútil como uno que no se pudo parsear
+    record_parse_outcome(model_name, latency, bool(results))
+    return results, model_name
+
+
+# --- SCORING CON CACHÉ DE RESULTADOS ---
+
+async def score_startup(
+    startup_data: str,
+    context: ContextBundle,
+    stats: Optional[Counter] = None,
+    use_cache: bool = True
+) -> dict:
+    """
+    Devuelve el análisis de una startup. Si la misma fila ya se puntuó con esta versión
+    de contexto, sale de la caché sin consumir cuota; si no, llama al LLM y guarda el
+    resultado (solo los exitosos, nunca la respuesta por defecto).
+    """
+    stats = stats if stats is not None else Counter()
+    cache = get_result_cache()
+    model_names = [model_name for model_name, _, _ in MODEL_PRIORITY_CONFIG]
+
+    if use_cache:
+        with stage_timer("cache_lookup"):
+            cached = cache.lookup(startup_data, context.version, model_names)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            ROWS_SCORED.inc(source="cache")
+            annotate(cache="hit")
+            print(f" -> Resultado recuperado de la caché ({cached[1]}).")
+            return cached[0]
+    stats["cache_misses"] += 1
+    ROWS_SCORED.inc(source="llm")
+
+    llm_result, model_name = await get_llm_dimensional_scoring(startup_data=startup_data, context=context)
+    if model_name is not None:
+        cache.store(startup_data, context.version, model_name, llm_result)
+    return llm_result
+
+
+async def score_startups_batch(
+    rows: List[Tuple[int, str]],
+    context: ContextBundle,
+    stats: Counter,
+    batch_size: int
+) -> Dict[int, dict]:
+    """
+    Versión por lotes de `score_startup`: resuelve primero los aciertos de caché y envía
+    el resto en lotes de hasta `batch_size` filas (acotado por la ventana del modelo).
+    Las entradas que falten (o vengan mal) en una respuesta de lote válida se reintentan una
+    a una. Si el lote entero falló, sus filas quedan con la respuesta por defecto: repetir
+    cada una por separado multiplicaría las llamadas justo cuando los modelos están fallando.
+    """
+    cache = get_result_cache()
+    model_names = [model_name for model_name, _, _ in MODEL_PRIORITY_CONFIG]
+    results: Dict[int, dict] = {}
+    misses: List[Tuple[int, str, str]] = []
+
+    for row_id, startup_data in rows:
+        with stage_timer("cache_lookup"):
+            cached = cache.lookup(startup_data, context.version, model_names)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            ROWS_SCORED.inc(source="cache")
+            results[row_id] = cached[0]
+        else:
+            stats["cache_misses"] += 1
+            ROWS_SCORED.inc(source="llm")
+            with stage_timer("prompt_build"):
+                misses.append((row_id, startup_data, context.row_context(startup_data)))
+    if not misses:
+        return results
+
+    row_tokens = max(estimate_tokens(data) + estimate_tokens(row_context) for _, data, row_context in misses)
+    limit = min(batch_size, max_batch_rows(context, row_tokens))
+    for start in range(0, len(misses), limit):
+        batch = misses[start:start + limit]
+        batch_results, model_name = ({}, None)
+        if len(batch) > 1:
+            print(f" -> Enviando lote de {len(batch)} startups en una sola llamada...")
+            batch_results, model_name = await get_llm_batch_scoring(batch, context)
+        if batch_results is None:
+            print(f" ❌ Falló el lote de {len(batch)} startups. Quedan con la respuesta por defecto (sin caché).")
+            for row_id, _, _ in batch:
+                results[row_id] = build_default_response()
+            continue
+
+        for row_id, startup_data, _ in batch:
+            if row_id in batch_results:
+                results[row_id] = batch_results[row_id]
+                cache.store(startup_data, context.version, model_name, batch_results[row_id])
+                continue
+            # Esta entrada no vino (o vino mal) en el lote: la pedimos sola
+            if len(batch) > 1:
+                print(f" -> Fila {row_id + 1} sin resultado válido en el lote. Reintentando individualmente...")
+            llm_result, single_model = await get_llm_dimensional_scoring(startup_data=startup_data, context=context)
+            if single_model is not None:
+                cache.store(startup_data, context.version, single_model, llm_result)
+            results[row_id] = llm_result
+    return results
+
+
+# --- POOL DE SCORING CONCURRENTE (STREAMING) ---
+
+# Secciones del análisis que una fila repetida copia de su primera aparición
+ANALYSIS_KEYS = ("dimensional_scores", "qualitative_analysis", "score_justification")
+
+
+def _build_result_row(index: int, row: "pd.Series", llm_result: dict) -> dict:
+    """Fila original + análisis + puntaje ponderado + índice original de la fila."""
+    original_data = row.where(row.notna(), None).to_dict()
+    return {
+        **original_data,
+        **llm_result,
+        "final_weighted_score": calculate_final_score(llm_result.get("dimensional_scores", {})),
+        "row_index": index,
+    }
+
+
+async def _score_rows(
+    rows: List[Tuple[int, "pd.Series"]],
+    total: Optional[int],
+    context: ContextBundle,
+    stats: Counter,
+    batch_size: int,
+    on_partial: Optional[Callable[[int, Optional[str], object], None]] = None
+) -> List[dict]:
+    started = time.perf_counter()
+    prepared = []
+    for index, row in rows:
+        startup_name = row.get('Nombre de la startup') or row.get('Nombre', f'Fila {index + 1}')
+        position = f"{index + 1} de {total}" if total else f"{index + 1}"
+        print(f"\n[ Stream / {position} ] Procesando: '{startup_name}'...")
+        prepared.append((index, row.where(row.notna(), None).to_json()))
+
+    # Con METRICS_TRACE=1 cada fila (o lote) imprime cuánto pasó en cada etapa
+    with trace_scope(f"filas {', '.join(str(index + 1) for index, _ in rows)}"):
+        if batch_size > 1:
+            llm_results = await score_startups_batch(prepared, context, stats, batch_size)
+        else:
+            index, startup_json = prepared[0]
+            listener = (lambda category, score: on_partial(index, category, score)) if on_partial else None
+            token = _partial_listener.set(listener)
+            try:
+                llm_results = {index: await score_startup(startup_json, context, stats)}
+            finally:
+                _partial_listener.reset(token)
+        record_stage("row_total", time.perf_counter() - started, count=len(rows))
+
+    result_rows = [_build_result_row(index, row, llm_results[index]) for index, row in rows]
+    print(f" -> Filas {', '.join(str(index + 1) for index, _ in rows)} completadas.")
+    return result_rows
+
+
+async def _as_async_iterator(rows: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(rows, "__aiter__"):
+        async for item in rows:
+            yield item
+    else:
+        for item in rows:
+            yield item
+
+
+async def score_rows_into_queue(
+    rows: Union[Iterable[Tuple[int, "pd.Series"]], AsyncIterable[Tuple[int, "pd.Series"]]],
+    total: Optional[int],
+    context: ContextBundle,
+    stats: Counter,
+    results: asyncio.Queue,
+    batch_size: int = SCORING_BATCH_SIZE,
+    on_partial: Optional[Callable[[int, Optional[str], object], None]] = None,
+    force_rescore: bool = False
+) -> None:
+    """
+    Puntúa hasta SCORING_CONCURRENCY filas (o lotes) a la vez y deja cada fila terminada
+    en `results` en cuanto está lista (no en el orden del archivo). `rows` son pares
+    (índice original, fila) y puede ser un iterador asíncrono que va entregando filas
+    mientras el archivo se sigue leyendo (`total` = None si aún no se conoce).
+    En modo estructurado, `on_partial(índice, categoría, puntaje)` recibe cada puntaje
+    dimensional en cuanto el modelo lo genera, antes de que la fila termine; con
+    categoría None, los parciales anteriores de esa fila venían de un intento abandonado.
+    Antes de puntuar se deduplica (ver services/dedup.py): las startups que ya están en
+    los históricos salen con su decisión y puntaje anteriores (`historical_match`) sin
+    llamar al LLM, y las repetidas dentro del upload reutilizan el resultado de su primera
+    aparición (`duplicate_of`). Con `force_rescore` todas se puntúan (las conocidas
+    conservan `historical_match`).
+    Cancelar esta corrutina cancela todas las filas en vuelo.
+    """
+    # Iterador compartido: cada worker toma las siguientes filas pendientes
+    batch_size = max(1, batch_size)
+    pending_rows = _as_async_iterator(rows)
+    take_lock = asyncio.Lock()
+    deduplicator = UploadDeduplicator(get_known_startups(context), force_rescore) if DEDUP_ENABLED else None
+    # Resultado de cada fila puntuada, para las que la repiten más adelante en el upload
+    canonical_results: Dict[int, asyncio.Future] = {}
+
+    async def take_batch() -> Tuple[List[Tuple[int, "pd.Series"]], List[Tuple[int, "pd.Series", str, Optional[int], Optional[dict]]]]:
+        # Se clasifica al tomar (en orden, bajo el lock): la fila canónica siempre se toma antes que sus duplicados
+        async with take_lock:
+            to_score, deduplicated = [], []
+            while len(to_score) < batch_size:
+                try:
+                    index, row = await pending_rows.__anext__()
+                except StopAsyncIteration:
+                    break
+                verdict, canonical, historical = NEW, None, None
+                if deduplicator is not None:
+                    verdict, canonical, historical = deduplicator.classify(index, row.where(row.notna(), None).to_dict())
+                if verdict == NEW:
+                    canonical_results[index] = asyncio.get_running_loop().create_future()
+                    to_score.append((index, row))
+                deduplicated.append((index, row, verdict, canonical, historical))
+            return to_score, deduplicated
+
+    async def worker():
+        while True:
+            to_score, deduplicated = await take_batch()
+            if not deduplicated:
+                return
+            result_rows = []
+            if to_score:
+                try:
+                    result_rows = await _score_rows(to_score, total, context, stats, batch_size, on_partial)
+                except Exception as e:
+                    print(f" !!! ERROR inesperado en las filas {[index + 1 for index, _ in to_score]}: {e} !!!")
+                    result_rows = [
+                        {**_build_result_row(index, row, build_default_response()), "final_weighted_score": 0}
+                        for index, row in to_score
+                    ]
+            scored = {result_row["row_index"]: result_row for result_row in result_rows}
+            for index, _, _, _, _ in deduplicated:
+                if index in scored:
+                    canonical_results[index].set_result(scored[index])
+
+            for index, row, verdict, canonical, historical in deduplicated:
+                if verdict == KNOWN:
+                    stats["dedup_known"] += 1
+                    ROWS_SCORED.inc(source="historical")
+                    print(f" -> Fila {index + 1}: ya evaluada ('{historical['name']}', {historical.get('decision') or 'sin decisión'}). Se omite el LLM.")
+                    result_row = {
+                        **_build_result_row(index, row, {}),
+                        "final_weighted_score": None,
+                        "historical_match": historical,
+                    }
+                elif verdict == DUPLICATE:
+                    stats["dedup_duplicates"] += 1
+                    ROWS_SCORED.inc(source="duplicate")
+                    print(f" -> Fila {index + 1}: repetida de la fila {canonical + 1}. Se reutiliza su resultado.")
+                    source = await canonical_results[canonical]
+                    analysis = {key: source[key] for key in ANALYSIS_KEYS if key in source}
+                    result_row = {
+                        **_build_result_row(index, row, analysis),
+                        "final_weighted_score": source["final_weighted_score"],
+                        "duplicate_of": canonical,
+                    }
+                else:
+                    result_row = scored[index]
+                if historical is not None and verdict != KNOWN:
+                    result_row["historical_match"] = historical
+                await results.put(result_row)
+
+    worker_count = SCORING_CONCURRENCY if total is None else min(SCORING_CONCURRENCY, -(-total // batch_size))
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, worker_count))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
 
 async def run_scoring_loop_stream(
-    df_to_score: pd.DataFrame, 
-    df_qual_context: pd.DataFrame, 
-    df_quant_context: pd.DataFrame, 
-    thesis_context: str
+    df_to_score: "pd.DataFrame",
+    context: ContextBundle,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    batch_size: int = SCORING_BATCH_SIZE,
+    force_rescore: bool = False,
+    max_concurrency: Optional[int] = None
 ):
-    # Convertir DataFrames a JSON una sola vez
-    qual_context_json = df_qual_context.to_json(orient='records', indent=2)
-    quant_context_json = df_quant_context.to_json(orient='records', indent=2)
+    """
+    Stream SSE directo (sin job persistente; es el camino de /api/analyze cuando la base de
+    jobs no está disponible): emite cada fila en cuanto termina, con su
+    índice original como `id` y como `row_index`. Al final se emite un evento `stats` con
+    los aciertos y fallos de la caché de resultados.
+    Con `batch_size` > 1 cada worker envía varias filas en una sola llamada al LLM;
+    el formato de los eventos es el mismo.
+    Si `is_disconnected` indica que el cliente se fue, se cancelan las filas pendientes.
+    Cuando cambia, un evento `queue` informa cuántas llamadas de este stream esperan lugar
+    en el scheduler y la espera estimada (ver LLMScheduler.status).
+    """
+    total = len(df_to_score)
+    if total == 0:
+        return
 
-    for index, row in df_to_score.iterrows():
-        startup_name = row.get('Nombre de la startup') or row.get('Nombre', f'Fila {index + 1}')
-        print(f"\n[ Stream / {index + 1} de {len(df_to_score)} ] Procesando: '{startup_name}'...")
-        startup_json = row.where(pd.notna(row), None).to_json()
-        
-        # Obtenemos RESULTADO y TIEMPO DE ESPERA dinámico
-        llm_result, dynamic_wait = get_llm_dimensional_scoring(
-            startup_data=startup_json,
-            qualitative_context_json=qual_context_json,
-            quantitative_context_json=quant_context_json,
-            thesis_context=thesis_context
+    results: asyncio.Queue = asyncio.Queue()
+    stats: Counter = Counter()
+    rows = enumerate(row for _, row in df_to_score.iterrows())
+    # Para el scheduler, este stream es un job masivo más (con su turno y su límite)
+    job_key = f"stream-{id(results):x}"
+    with llm_request_class(BULK, job_key, max_concurrency):
+        producer = asyncio.create_task(
+            score_rows_into_queue(rows, total, context, stats, results, batch_size, force_rescore=force_rescore)
         )
-        
-        # Calcular puntaje ponderado
-        dimensional_scores = llm_result.get("dimensional_scores", {})
-        final_score = 0
-        if SCORING_CONFIG:
-            final_score = sum(
-                (dimensional_scores.get(cat, 0) or 0) * details.get("peso", 0)
-                for cat, details in SCORING_CONFIG.items()
-            )
-        
-        # Preparar y enviar respuesta
-        original_data = row.where(pd.notna(row), None).to_dict()
-        result_row = {**original_data, **llm_result, "final_weighted_score": round(final_score, 2)}
-        
-        yield f"data: {json.dumps(result_row)}\n\n"
-        
-        # PAUSA DINÁMICA: 6s si fue Lite, 12s si fue Flash
-        print(f" -> Stream enviado para '{startup_name}'. Esperando {dynamic_wait}s (según modelo usado)...")
-        await asyncio.sleep(dynamic_wait)
+    scheduler = get_llm_scheduler()
+    last_queue = None
+    try:
+        sent = 0
+        while sent < total:
+            try:
+                result_row = await asyncio.wait_for(results.get(), timeout=DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    print(f" ⛔ Cliente desconectado. Se cancelan {total - sent} filas pendientes.")
+                    return
+                queue = scheduler.status(job_key)
+                if (queue["job_queued"], queue["estimated_wait_seconds"]) != last_queue:
+                    last_queue = (queue["job_queued"], queue["estimated_wait_seconds"])
+                    yield f"event: queue\ndata: {json.dumps(queue)}\n\n"
+                continue
+            sent += 1
+            yield f"id: {result_row['row_index']}\ndata: {json.dumps(result_row)}\n\n"
+
+        print(
+            f" -> Análisis terminado. Caché: {stats['cache_hits']} aciertos, {stats['cache_misses']} fallos. "
+            f"Ya evaluadas: {stats['dedup_known']}, repetidas: {stats['dedup_duplicates']}."
+        )
+        summary = {key: stats[key] for key in ('cache_hits', 'cache_misses', 'dedup_known', 'dedup_duplicates')}
+        yield f"event: stats\ndata: {json.dumps(summary)}\n\n"
+    finally:
+        producer.cancel()
+
+
+# --- RE-ANÁLISIS PARCIAL (SOLO ALGUNAS DIMENSIONES) ---
+
+def build_dimensions_prompt(startup_data: str, row_context: str, categories: List[str], current: dict) -> str:
+    """Prompt acotado: pide solo el puntaje y la justificación de `categories`."""
+    config = get_scoring_config()
+    criteria = "\n".join(
+        f"        - {category}: {config[category].get('descripcion_prompt', '')}" for category in categories
+    )
+    example = {
+        "dimensional_scores": {category: "<0-100>" for category in categories},
+        "score_justification": {category: f"Justifica puntaje {category}." for category in categories},
+    }
+    return f"""{row_context}
+        **TAREA:**
+        Vuelve a evaluar SOLO estas dimensiones de la startup, con el mismo criterio del contexto:
+{criteria}
+
+        **Datos de la Startup:**
+        ```json
+        {startup_data}
+        ```
+
+        **Puntajes actuales del resto de dimensiones (como referencia, no los cambies):**
+        ```json
+        {json.dumps(current, ensure_ascii=False)}
+        ```
+
+        **Formato de Salida JSON (OBLIGATORIO, solo estas claves):**
+        ```json
+        {json.dumps(example, ensure_ascii=False, indent=4)}
+        ```
+        """
+
+
+async def rescore_dimensions(
+    result_row: dict,
+    categories: List[str],
+    context: ContextBundle
+) -> Tuple[dict, List[str]]: # Retorna: (fila actualizada, categorías que no se pudieron re-puntuar)
+    """
+    Re-puntúa solo `categories` de una fila ya analizada: el prompt y la respuesta cubren
+    esas dimensiones (puntaje + justificación), los valores nuevos se combinan con el
+    resultado existente y se recalcula `final_weighted_score`. Las categorías que el
+    modelo no devuelva válidas conservan su valor anterior.
+    """
+    startup_dict = {key: value for key, value in result_row.items() if key not in RESULT_KEYS}
+    startup_data = json.dumps(startup_dict, ensure_ascii=False)
+    current_scores = result_row.get("dimensional_scores") or {}
+    fields = {"dimensional_scores": list(categories), "score_justification": list(categories)}
+
+    with stage_timer("prompt_build"):
+        prompt = build_dimensions_prompt(
+            startup_data, context.row_context(startup_data), categories,
+            {category: score for category, score in current_scores.items() if category not in categories}
+        )
+
+    with stage_timer("row_total"):
+        if STRUCTURED_OUTPUT:
+            received, model_name, latency = await _structured_call(prompt, context, build_response_schema(fields))
+        else:
+            text_response, model_name, latency = await call_llm_with_fallback(prompt, context)
+            with stage_timer("json_parse"):
+                received = extract_json(text_response) if text_response is not None else None
+            received = received if isinstance(received, dict) else {}
+
+    valid_scores = merge_fields({}, received, fields).get("dimensional_scores", {})
+    failed = [category for category in categories if category not in valid_scores]
+    if model_name is not None:
+        record_parse_outcome(model_name, latency, not failed)
+    updated = {**result_row, **merge_fields(result_row, received, fields)}
+    updated["final_weighted_score"] = calculate_final_score(updated.get("dimensional_scores") or {})
+    return updated, failed
+
+
+async def run_dimensions_rescoring(
+    result_rows: List[dict],
+    categories: List[str],
+    context: ContextBundle
+) -> List[Tuple[dict, List[str]]]:
+    """`rescore_dimensions` para varias filas, hasta SCORING_CONCURRENCY a la vez (en el orden recibido)."""
+    semaphore = asyncio.Semaphore(SCORING_CONCURRENCY)
+
+    async def rescore(position: int, result_row: dict):
+        async with semaphore:
+            startup_name = result_row.get('Nombre de la startup') or result_row.get('Nombre', f'Fila {position + 1}')
+            print(f"\n[ Re-análisis parcial / {', '.join(categories)} ] Procesando: '{startup_name}'...")
+            return await rescore_dimensions(result_row, categories, context)
+
+    return await asyncio.gather(*(rescore(position, row) for position, row in enumerate(result_rows)))
 
 
 # --- FUNCIÓN DE RE-ANÁLISIS (EJECUCIÓN ÚNICA) ---
 
 async def run_single_scoring(
     startup_dict: dict, 
-    df_qual_context: pd.DataFrame,
-    df_quant_context: pd.DataFrame,
-    thesis_context: str
+    context: ContextBundle,
+    use_cache: bool = True,
+    stats: Optional[Counter] = None
 ) -> Dict:
     startup_name = startup_dict.get('Nombre de la startup') or startup_dict.get('Nombre', 'Startup sin nombre')
     print(f"\n[ Re-análisis ] Procesando: '{startup_name}'...")
 
-    qual_context_json = df_qual_context.to_json(orient='records', indent=2)
-    quant_context_json = df_quant_context.to_json(orient='records', indent=2)
-    
-    # Ignoramos el tiempo de espera (_) porque es una ejecución única
-    llm_result, _ = get_llm_dimensional_scoring(
-        startup_data=json.dumps(startup_dict),
-        qualitative_context_json=qual_context_json,
-        quantitative_context_json=quant_context_json,
-        thesis_context=thesis_context
-    )
-    
-    dimensional_scores = llm_result.get("dimensional_scores", {})
-    final_score = 0
-    if SCORING_CONFIG:
-        final_score = sum(
-            (dimensional_scores.get(cat, 0) or 0) * details.get("peso", 0)
-            for cat, details in SCORING_CONFIG.items()
-        )
-    
-    result_row = {**startup_dict, **llm_result, "final_weighted_score": round(final_score, 2)}
+    # Si llega una fila ya puntuada, al prompt (y a la clave de caché) solo van los datos de la startup
+    startup_fields = {key: value for key, value in startup_dict.items() if key not in RESULT_KEYS}
+    with stage_timer("row_total"):
+        llm_result = await score_startup(json.dumps(startup_fields), context, stats, use_cache=use_cache)
+
+    # La fila ya tiene su propio análisis: deja de ser copia de otra (se conserva `historical_match`)
+    result_row = {
+        **{key: value for key, value in startup_dict.items() if key != "duplicate_of"},
+        **llm_result,
+        "final_weighted_score": calculate_final_score(llm_result.get("dimensional_scores", {})),
+    }
     
     print(f" -> Re-análisis completo para '{startup_name}'. Nuevo Score: {result_row['final_weighted_score']}")
     return result_row
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SCORING_CONFIG_PATH = os.getenv("SCORING_CONFIG_PATH", "scoring_config.json")
+# Cada cuánto se mira si el archivo cambió (un stat); entre medias se sirve la copia en memoria.
+CONFIG_RELOAD_CHECK_SECONDS = float(os.getenv("CONFIG_RELOAD_CHECK_SECONDS", "1"))
+
+
+class ScoringConfigStore:
+    """
+    `scoring_config.json` en memoria, recargado en caliente cuando el archivo cambia
+    (mtime o tamaño). Si la nueva versión no es JSON válido se mantiene la anterior.
+    """
+
+    def __init__(self, path: str = SCORING_CONFIG_PATH):
+        self.path = path
+        self._categories: Dict[str, dict] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._signature is not None:
+                print(f"⚠️ '{self.path}' ya no existe. Se mantienen los pesos cargados.")
+                self._signature = None
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        try:
+            with open(self.path, "r") as f:
+                categories = json.load(f).get("SCORING_CATEGORIES", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ No se pudo recargar '{self.path}': {e}. Se mantienen los pesos anteriores.")
+            # No se reintenta hasta que el archivo vuelva a cambiar
+            if self._signature is not None:
+                self._signature = signature
+            return
+        if self._signature is not None:
+            print(f"🔄 Configuración de scoring recargada ({len(categories)} categorías).")
+        self._categories = categories
+        self._signature = signature
+
+    def categories(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        if now - self._checked_at >= CONFIG_RELOAD_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked_at >= CONFIG_RELOAD_CHECK_SECONDS:
+                    self._reload_if_changed()
+                    self._checked_at = now
+        return self._categories
+
+    def is_loaded(self) -> bool:
+        self.categories()
+        return self._signature is not None
+
+
+_store = ScoringConfigStore()
+
+
+def get_scoring_config() -> Dict[str, dict]:
+    """Categorías de scoring vigentes ({categoría: {"peso", "descripcion_prompt"}})."""
+    return _store.categories()
+
+
+def get_scoring_weights() -> Dict[str, float]:
+    return {category: float(details.get("peso", 0) or 0) for category, details in get_scoring_config().items()}
+
+
+def scoring_config_loaded() -> bool:
+    return _store.is_loaded()
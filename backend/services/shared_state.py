@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# Estado compartido entre los workers de una misma máquina (cuota de los modelos y registro
+# de workers). Solo se usa en modo multi-worker (serve.py pone MULTI_WORKER=1).
+SHARED_STATE_DB_PATH = os.getenv("SHARED_STATE_DB_PATH", "shared_state.sqlite3")
+MULTI_WORKER = os.getenv("MULTI_WORKER", "").lower() in ("1", "true", "yes")
+
+
+class SharedStateDB:
+    """
+    Conexión SQLite al estado compartido. Cada proceso abre la suya en el primer uso:
+    una conexión heredada a través de un fork no se puede usar en el hijo.
+    """
+
+    def __init__(self, path: str = SHARED_STATE_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    model_name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS workers (
+                    pid INTEGER PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    ready_at REAL,
+                    context_version TEXT
+                );
+                """
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transacción exclusiva entre procesos (lectura + escritura atómicas)."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+
+# --- REGISTRO DE WORKERS ---
+
+class WorkerRegistry:
+    """Qué workers arrancaron y cuáles terminaron su startup (contexto cargado, jobs retomados)."""
+
+    def __init__(self, db: SharedStateDB):
+        self.db = db
+
+    def clear(self) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM workers")
+
+    def mark_starting(self, pid: int) -> None:
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (pid, started_at, ready_at, context_version) VALUES (?, ?, NULL, NULL)",
+                (pid, time.time()),
+            )
+
+    def mark_ready(self, pid: int, context_version: Optional[str]) -> None:
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (pid, started_at, ready_at, context_version) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(pid) DO UPDATE SET ready_at = excluded.ready_at, context_version = excluded.context_version",
+                (pid, time.time(), time.time(), context_version),
+            )
+
+    def remove(self, pid: int) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+
+    def workers(self) -> List[dict]:
+        rows = self.db.query("SELECT pid, started_at, ready_at, context_version FROM workers ORDER BY pid")
+        return [
+            {"pid": pid, "started_at": started_at, "ready": ready_at is not None, "context_version": version}
+            for pid, started_at, ready_at, version in rows
+        ]
+
+
+_shared_db: Optional[SharedStateDB] = None
+
+
+def get_shared_state() -> SharedStateDB:
+    global _shared_db
+    if _shared_db is None:
+        _shared_db = SharedStateDB()
+    return _shared_db
+
+
+def get_worker_registry() -> WorkerRegistry:
+    return WorkerRegistry(get_shared_state())
@@ -0,0 +1,225 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.scoring_config import get_scoring_config
+
+# Claves del análisis cualitativo (fijas en el prompt; las de puntajes y justificaciones
+# salen de scoring_config.json).
+QUALITATIVE_KEYS = [
+    "project_thesis", "problem", "solution", "key_metrics", "founding_team", "market_and_competition"
+]
+
+Fields = Dict[str, List[str]]
+JSONPath = Tuple[object, ...]
+
+
+def expected_fields() -> Fields:
+    """Campos que debe traer un análisis completo, por sección."""
+    categories = list(get_scoring_config())
+    return {
+        "dimensional_scores": categories,
+        "qualitative_analysis": list(QUALITATIVE_KEYS),
+        "score_justification": categories,
+    }
+
+
+def build_response_schema(fields: Optional[Fields] = None) -> dict:
+    """
+    Esquema JSON (subconjunto OpenAPI que acepta Gemini en `response_schema`) para los
+    campos pedidos; por defecto, el análisis completo. Gemini genera las propiedades en
+    orden alfabético, así que `dimensional_scores` sale primero y los puntajes llegan
+    antes que los textos largos.
+    """
+    fields = expected_fields() if fields is None else fields
+    properties = {}
+    for section, keys in fields.items():
+        if not keys:
+            continue
+        if section == "dimensional_scores":
+            value_schema = {"type": "integer", "description": "Puntaje de 0 a 100."}
+        else:
+            value_schema = {"type": "string"}
+        properties[section] = {
+            "type": "object",
+            "properties": {key: dict(value_schema) for key in keys},
+            "required": list(keys),
+        }
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def _is_valid_field(section: str, value) -> bool:
+    if section == "dimensional_scores":
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 100
+    return isinstance(value, str) and value.strip() != ""
+
+
+def missing_fields(result: dict) -> Fields:
+    """Campos esperados que faltan (o no tienen un valor válido) en `result`."""
+    missing: Fields = {}
+    for section, keys in expected_fields().items():
+        values = result.get(section) if isinstance(result.get(section), dict) else {}
+        absent = [key for key in keys if not _is_valid_field(section, values.get(key))]
+        if absent:
+            missing[section] = absent
+    return missing
+
+
+def merge_fields(result: dict, repaired: dict, fields: Fields) -> dict:
+    """Copia en `result` los campos de `fields` que vinieron válidos en `repaired`."""
+    merged = {section: dict(values) for section, values in result.items() if isinstance(values, dict)}
+    for section, keys in fields.items():
+        values = repaired.get(section) if isinstance(repaired.get(section), dict) else {}
+        for key in keys:
+            if _is_valid_field(section, values.get(key)):
+                merged.setdefault(section, {})[key] = values[key]
+    return merged
+
+
+def build_repair_prompt(startup_data: str, row_context: str, partial: dict, missing: Fields) -> str:
+    """Prompt que pide solo los campos que faltaron en la respuesta anterior."""
+    requested = "\n".join(f"- {section}: {', '.join(keys)}" for section, keys in missing.items())
+    return f"""{row_context}
+        **TAREA:**
+        Ya analizaste esta startup, pero tu respuesta quedó incompleta. Completa SOLO los campos que faltan,
+        de forma consistente con lo que ya respondiste.
+
+        **Datos de la Startup:**
+        ```json
+        {startup_data}
+        ```
+
+        **Análisis ya recibido:**
+        ```json
+        {json.dumps(partial, ensure_ascii=False)}
+        ```
+
+        **Campos que faltan:**
+        {requested}
+
+        Devuelve un JSON con esas secciones y claves únicamente (puntajes de 0 a 100).
+        """
+
+
+class IncrementalJSONParser:
+    """
+    Parser de JSON por fragmentos: a medida que llega el texto de un stream, reconstruye
+    el objeto con los valores ya completos y avisa (`on_value(path, value)`) de cada valor
+    escalar en cuanto termina, p. ej. (("dimensional_scores", "equipo"), 80).
+    Si el texto se corta, `result` conserva todo lo que alcanzó a cerrarse. Ignora lo que
+    haya antes del primer `{`/`[` (p. ej. un bloque ```json) y tolera comas finales.
+    `reset()` empieza otro texto (p. ej. el reintento con otro modelo); si ya se había avisado
+    de algún valor, llama antes a `on_discard()` porque esos valores dejan de valer.
+    """
+
+    _LITERAL_CHARS = set("0123456789+-.eEtruefalsn")
+
+    def __init__(
+        self,
+        on_value: Optional[Callable[[JSONPath, object], None]] = None,
+        on_discard: Optional[Callable[[], None]] = None
+    ):
+        self.on_value = on_value
+        self.on_discard = on_discard
+        self._emitted = False
+        self.reset()
+
+    def reset(self) -> None:
+        if self._emitted and self.on_discard is not None:
+            self.on_discard()
+        self._emitted = False
+        self.result = None
+        self.done = False
+        # Cada nivel abierto: [contenedor, ruta, clave actual (solo objetos)]
+        self._stack: List[list] = []
+        self._expect_key = False
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._literal: List[str] = []
+
+    def feed(self, text: str) -> None:
+        for char in text:
+            if self.done:
+                return
+            if not self._stack:
+                if char in "{[":
+                    self._open({} if char == "{" else [])
+                continue
+            if self._in_string:
+                self._feed_string(char)
+                continue
+            if self._literal:
+                if char in self._LITERAL_CHARS:
+                    self._literal.append(char)
+                    continue
+                self._close_literal()
+            if char.isspace() or char == ":":
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._open({} if char == "{" else [])
+            elif char in "}]":
+                self._stack.pop()
+                self._expect_key = False
+                if not self._stack:
+                    self.done = True
+            elif char == ",":
+                self._expect_key = isinstance(self._stack[-1][0], dict)
+            elif char in self._LITERAL_CHARS:
+                self._literal.append(char)
+
+    def _feed_string(self, char: str) -> None:
+        if self._escape:
+            self._escape = False
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            raw = "".join(self._string)
+            self._in_string = False
+            self._string = []
+            try:
+                value = json.loads(f'"{raw}"')
+            except json.JSONDecodeError:
+                value = raw
+            if self._expect_key:
+                self._stack[-1][2] = value
+                self._expect_key = False
+            else:
+                self._add_value(value, emit=True)
+            return
+        self._string.append(char)
+
+    def _close_literal(self) -> None:
+        raw = "".join(self._literal)
+        self._literal = []
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        self._add_value(value, emit=True)
+
+    def _open(self, container) -> None:
+        if self._stack:
+            path = self._add_value(container, emit=False)
+        else:
+            self.result = container
+            path = ()
+        self._stack.append([container, path, None])
+        self._expect_key = isinstance(container, dict)
+
+    def _add_value(self, value, emit: bool) -> JSONPath:
+        container, path, key = self._stack[-1]
+        if isinstance(container, dict):
+            if key is None:
+                return path
+            container[key] = value
+            self._stack[-1][2] = None
+            path = path + (key,)
+        else:
+            container.append(value)
+            path = path + (len(container) - 1,)
+        if emit and self.on_value is not None:
+            self._emitted = True
+            self.on_value(path, value)
+        return path
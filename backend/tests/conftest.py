@@ -0,0 +1,49 @@
+"""
+Configuración común de los tests: se corren desde backend/ (`python -m pytest -q`) con el
+backend falso de LLM y bases SQLite temporales, sin API key ni red.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# Antes de importar los servicios: leen su configuración del entorno al importarse
+_tmp = tempfile.mkdtemp(prefix="scoring-tests-")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_SECONDS", "0")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(_tmp, "result_cache.sqlite3"))
+os.environ.setdefault("SHARED_STATE_DB_PATH", os.path.join(_tmp, "shared_state.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def context():
+    """Bundle mínimo en modo "full"; cada test usa su propia versión (y sus propias entradas de caché)."""
+    from services.context import ContextBundle
+
+    return ContextBundle(
+        version=f"test-{uuid.uuid4().hex[:8]}", thesis_text="Tesis de prueba", qualitative_json="[]",
+        quantitative_json="[]", context_text="Contexto de prueba",
+    )
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Backend falso nuevo (cuenta llamadas y guarda prompts), sin límite de cuota y con router y scheduler limpios."""
+    import services.llm_backend as llm_backend
+    import services.llm_scheduler as llm_scheduler
+    import services.scoring as scoring
+    from services.model_router import ModelRouter
+    from services.rate_limiter import ModelRateLimiter
+
+    backend = llm_backend.FakeBackend()
+    limiter = ModelRateLimiter([(model, 10**6, 10**12) for model, _, _ in scoring.MODEL_PRIORITY_CONFIG])
+    monkeypatch.setattr(llm_backend, "_backend", backend)
+    monkeypatch.setattr(scoring, "rate_limiter", limiter)
+    monkeypatch.setattr(scoring, "model_router", ModelRouter(scoring.MODEL_PRIORITY_CONFIG, limiter))
+    monkeypatch.setattr(llm_scheduler, "_scheduler", llm_scheduler.LLMScheduler())
+    return backend
@@ -0,0 +1,37 @@
+import asyncio
+import io
+import json
+
+from starlette.datastructures import UploadFile
+
+import services.jobs as jobs
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_analysis_streams_directly_when_the_job_store_cannot_be_opened(tmp_path, context, fake_llm, monkeypatch):
+    from api import analysis
+
+    # Como en Vercel fuera de /tmp: SQLite no puede crear la base
+    monkeypatch.setattr(jobs, "JOBS_DB_PATH", str(tmp_path / "no-existe" / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_job_manager", None)
+    monkeypatch.setattr(jobs, "_job_store_failed", False)
+    assert jobs.get_job_manager() is None
+
+    async def analyze():
+        upload = UploadFile(file=io.BytesIO("Nombre,Descripción\nAlfa,Pagos\nBeta,Logística\n".encode()), filename="a.csv")
+        response = await analysis.analyze_deals(
+            ConnectedRequest(), upload, context, accept="text/event-stream", batch_size=1,
+            force_rescore=False, max_concurrency=None
+        )
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(analyze())
+
+    rows = [json.loads(chunk.split("data: ", 1)[1]) for chunk in chunks if chunk.startswith("id: ")]
+    assert sorted(row["Nombre"] for row in rows) == ["Alfa", "Beta"]
+    assert chunks[-1].startswith("event: stats")
+    assert fake_llm.calls == 2
@@ -0,0 +1,32 @@
+import json
+
+import services.context_artifact as context_artifact
+from services.context import compute_context_version
+
+
+def write_sources(tmp_path):
+    (tmp_path / "historicos.csv").write_text("Nombres,Status\nArtificio,Investment committee\n", encoding="utf-8")
+    (tmp_path / "puntos.csv").write_text("Startup,Puntaje_equipo\nArtificio,3\n", encoding="utf-8")
+    (tmp_path / "tesis.pdf").write_bytes(b"%PDF de prueba")
+    return [str(tmp_path / name) for name in ("historicos.csv", "puntos.csv", "tesis.pdf")]
+
+
+def test_artifact_is_plain_data_and_is_reused_across_settings(tmp_path, monkeypatch):
+    sources = write_sources(tmp_path)
+    path = str(tmp_path / "artifact.json")
+    monkeypatch.setattr(context_artifact, "extract_pdf_text", lambda pdf_path: "Tesis de inversión")
+
+    built = context_artifact.load_or_build_context(sources, path)
+    with open(path, encoding="utf-8") as f:
+        artifact = json.load(f)
+    assert artifact["qualitative_records"] == [{"Nombres": "Artificio", "Status": "Investment committee"}]
+    assert artifact["thesis_text"] == "Tesis de inversión"
+
+    # La segunda carga no vuelve a leer las fuentes
+    monkeypatch.setattr(context_artifact, "build_context_artifact", None)
+    loaded = context_artifact.load_or_build_context(sources, path)
+    assert (loaded.version, loaded.context_text) == (built.version, built.context_text)
+
+    # El modo cambia la versión del bundle (caché de resultados), no la del artefacto
+    source_version = artifact["source_version"]
+    assert compute_context_version(source_version, "full") != compute_context_version(source_version, "retrieval")
@@ -0,0 +1,71 @@
+from services.dedup import (
+    DUPLICATE, KNOWN, NEW, KnownStartupIndex, UploadDeduplicator, name_similarity, normalize_name, normalize_website
+)
+
+
+def classify_all(rows, known=None, force_rescore=False):
+    deduplicator = UploadDeduplicator(known or KnownStartupIndex([], []), force_rescore)
+    return [deduplicator.classify(index, row)[:2] for index, row in enumerate(rows)]
+
+
+def test_normalize_name_drops_accents_punctuation_and_legal_suffixes():
+    assert normalize_name("Acme S.A.C.") == "acme"
+    assert normalize_name("Árbol Tech, Inc.") == "arbol tech"
+    assert normalize_name(None) == ""
+
+
+def test_normalize_website_ignores_shared_hosts():
+    assert normalize_website("https://www.Acme.pe/about") == "acme.pe"
+    for shared in ("https://github.com/acme", "wa.me/51999888777", "www.pucp.edu.pe", "bit.ly/xyz", "m.facebook.com/acme"):
+        assert normalize_website(shared) is None
+
+
+def test_email_columns_are_not_websites():
+    rows = [
+        {"Nombre de la startup": "AgroTech", "Correo": "ana@pucp.edu.pe"},
+        {"Nombre de la startup": "FinPay", "Correo": "luis@pucp.edu.pe"},
+        {"Nombre de la startup": "Vetly", "Correo": "hola@startupperu.com"},
+        {"Nombre de la startup": "Kuna", "Correo": "info@startupperu.com"},
+    ]
+    assert [verdict for verdict, _ in classify_all(rows)] == [NEW, NEW, NEW, NEW]
+
+
+def test_shared_hosts_do_not_make_duplicates():
+    rows = [
+        {"Nombre de la startup": "AgroTech", "Sitio web": "https://github.com/agrotech"},
+        {"Nombre de la startup": "FinPay", "Sitio web": "https://github.com/finpay"},
+        {"Nombre de la startup": "Vetly", "Sitio web": "wa.me/51999888777"},
+        {"Nombre de la startup": "Kuna", "Sitio web": "https://wa.me/51911222333"},
+    ]
+    assert [verdict for verdict, _ in classify_all(rows)] == [NEW, NEW, NEW, NEW]
+
+
+def test_same_website_needs_compatible_names():
+    rows = [
+        {"Nombre de la startup": "NuevaCo", "Sitio web": "https://nuevaco.io"},
+        {"Nombre de la startup": "Nueva Co S.A.C.", "Sitio web": "www.nuevaco.io/en"},
+        {"Nombre de la startup": "", "Sitio web": "nuevaco.io"},
+        {"Nombre de la startup": "Totalmente Distinta", "Sitio web": "nuevaco.io"},
+    ]
+    assert classify_all(rows) == [(NEW, None), (DUPLICATE, 0), (DUPLICATE, 0), (NEW, None)]
+
+
+def test_fuzzy_names_require_equal_numbers():
+    assert name_similarity("lab 1", "lab 11") == 0.0
+    rows = [{"Nombre": "Artificio"}, {"Nombre": "Artifício S.A."}, {"Nombre": "Lab 1"}, {"Nombre": "Lab 11"}]
+    assert classify_all(rows) == [(NEW, None), (DUPLICATE, 0), (NEW, None), (NEW, None)]
+
+
+def test_known_startups_and_force_rescore():
+    known = KnownStartupIndex(
+        [{"Nombres": "Artificio", "Status": "Investment committee", "Promedio - Total (comite)": 2.09}],
+        [{"Startup": "OpenMed", "Puntaje_equipo": "Muy Bueno"}],
+    )
+    deduplicator = UploadDeduplicator(known)
+    verdict, _, historical = deduplicator.classify(0, {"Nombre": "Artifcio"})
+    assert verdict == KNOWN
+    assert (historical["decision"], historical["historical_score"], historical["match"]) == ("Investment committee", 2.09, "fuzzy")
+    assert deduplicator.classify(1, {"Nombre": "OpenMed"})[2]["scores"] == {"equipo": "Muy Bueno"}
+
+    verdict, _, historical = UploadDeduplicator(known, force_rescore=True).classify(0, {"Nombre": "Artificio"})
+    assert verdict == NEW and historical["name"] == "Artificio"
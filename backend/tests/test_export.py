@@ -0,0 +1,66 @@
+import csv
+import io
+
+from services.export import export_columns, flatten_result, iter_csv
+from services.jobs import JobStore
+
+
+def make_store(tmp_path, results):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create_job("a.csv", [{"Nombre": result["Nombre"]} for result in results], 1, "v1")
+    for row_index, result in enumerate(results):
+        store.save_result(job_id, row_index, {**result, "row_index": row_index})
+    return store, job_id
+
+
+SCORED = {
+    "Nombre": "NuevaCo",
+    "dimensional_scores": {"equipo": 80, "producto": 70, "tesis_utec": 60, "oportunidad": 50, "validacion": 40},
+    "qualitative_analysis": {"problem": "Pagos"},
+    "score_justification": {"equipo": "Buen equipo"},
+    "final_weighted_score": 71.5,
+}
+KNOWN = {
+    "Nombre": "Artificio",
+    "final_weighted_score": None,
+    "historical_match": {
+        "name": "Artificio", "decision": "Investment committee", "historical_score": 2.09, "match": "name",
+        "similarity": 1.0, "sources": ["Reporte_Final_con_Historicos.csv"],
+    },
+}
+DUPLICATE = {**SCORED, "Nombre": "Nueva Co", "duplicate_of": 0}
+
+
+def read_csv(store, job_id):
+    text = b"".join(iter_csv(store, job_id)).decode("utf-8-sig")
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def test_known_rows_explain_their_missing_scores(tmp_path):
+    store, job_id = make_store(tmp_path, [SCORED, KNOWN, DUPLICATE])
+    rows = read_csv(store, job_id)
+
+    assert [row["scoring_source"] for row in rows] == ["llm", "historical", "duplicate"]
+    assert rows[1]["historical_match.decision"] == "Investment committee"
+    assert rows[1]["historical_match.historical_score"] == "2.09"
+    assert rows[1]["final_weighted_score"] == ""
+    assert rows[2]["duplicate_of"] == "0"
+    assert rows[2]["dimensional_scores.equipo"] == "80"
+
+
+def test_result_only_keys_are_not_original_columns():
+    columns = export_columns([{**KNOWN, "row_index": 0}])
+    assert "historical_match" not in columns and "historical_match.decision" in columns
+    values = dict(zip(columns, flatten_result(KNOWN, columns)))
+    assert values["historical_match.sources"] == '["Reporte_Final_con_Historicos.csv"]'
+
+
+def test_columns_come_from_every_row_not_just_the_first(tmp_path):
+    # La primera fila no tiene "Web" ni una clave antigua en los puntajes; otras sí
+    legacy = {**SCORED, "Nombre": "Antigua", "Web": "antigua.pe",
+              "dimensional_scores": {**SCORED["dimensional_scores"], "mercado": 55}}
+    store, job_id = make_store(tmp_path, [SCORED, legacy])
+    rows = read_csv(store, job_id)
+
+    assert rows[1]["Web"] == "antigua.pe" and rows[0]["Web"] == ""
+    assert rows[1]["dimensional_scores.mercado"] == "55"
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+from services.jobs import COMPLETED, FAILED, JobManager, JobStore
+
+ROWS = [{"Nombre": f"Startup {letter}", "Descripción": f"Producto {letter}"} for letter in "ABC"]
+
+
+async def _collect(manager, job_id, context, last_event_id=0):
+    events = []
+    async for chunk in manager.stream(job_id, context, last_event_id):
+        fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+        events.append((fields.get("event", "message"), fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def run_stream(manager, job_id, context, last_event_id=0):
+    """Eventos SSE del job como (evento, id, datos) hasta que el stream cierra."""
+    return asyncio.run(_collect(manager, job_id, context, last_event_id))
+
+
+def test_stats_event_reports_the_cache_counts_of_the_run(tmp_path, context, fake_llm):
+    manager = JobManager(JobStore(str(tmp_path / "jobs.sqlite3")))
+    job_id = manager.store.create_job("a.csv", ROWS, 1, context.version)
+
+    events = run_stream(manager, job_id, context)
+
+    assert [kind for kind, _, _ in events if kind == "message"] == ["message"] * len(ROWS)
+    assert events[-1][0] == "stats"
+    assert events[-1][2] == {"cache_hits": 0, "cache_misses": len(ROWS)}
+    assert manager.store.get_job(job_id)["status"] == COMPLETED
+
+
+def test_cache_counts_are_saved_with_each_row(tmp_path):
+    # Otro worker (o el stream) puede ver la última fila antes de que el runner termine
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create_job("a.csv", ROWS, 1, "v1")
+    store.save_result(job_id, 0, {"row_index": 0}, {"cache_hits": 1, "cache_misses": 2})
+
+    job = store.get_job(job_id)
+    assert (job["cache_hits"], job["cache_misses"], job["completed_rows"]) == (1, 2, 1)
+
+
+def test_scoring_error_fails_the_job_instead_of_hanging(tmp_path, context, fake_llm, monkeypatch):
+    import services.jobs as jobs
+
+    async def broken(rows, total, context, stats, results, batch_size, **kwargs):
+        async for index, row in rows:
+            await results.put({"row_index": index, "Nombre": row["Nombre"], "final_weighted_score": 50.0})
+            raise RuntimeError("se cayó la base")
+
+    monkeypatch.setattr(jobs, "score_rows_into_queue", broken)
+    manager = JobManager(JobStore(str(tmp_path / "jobs.sqlite3")))
+    job_id = manager.store.create_job("a.csv", ROWS, 1, context.version)
+
+    events = asyncio.run(asyncio.wait_for(_collect(manager, job_id, context), timeout=5))
+
+    assert [kind for kind, _, _ in events if kind != "queue"] == ["job", "message", "failed"]
+    assert "se cayó la base" in events[-1][2]["error"]
+    job = manager.store.get_job(job_id)
+    assert job["status"] == FAILED and job["lease_owner"] is None
+    # Un job fallido no se vuelve a tomar al reconectar
+    assert not manager.store.try_claim(job_id, "otro-worker")
+
+
+def test_lease_is_exclusive_until_it_expires(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create_job("a.csv", ROWS, 1, "v1")
+
+    assert store.try_claim(job_id, "worker-a")
+    assert store.try_claim(job_id, "worker-a")  # renovar el propio
+    assert not store.try_claim(job_id, "worker-b")
+    assert store.orphaned_jobs() == []
+
+    store.update_job(job_id, lease_expires=0)  # worker-a murió sin renovar
+    assert store.orphaned_jobs() == [job_id]
+    assert store.try_claim(job_id, "worker-b")
+
+    store.release(job_id, "worker-a", COMPLETED)  # un dueño anterior ya no puede cerrarlo
+    assert store.get_job(job_id)["lease_owner"] == "worker-b"
+    store.release(job_id, "worker-b", COMPLETED)
+    assert not store.try_claim(job_id, "worker-a")
+
+
+def test_reconnect_replays_only_rows_after_last_event_id(tmp_path, context):
+    manager = JobManager(JobStore(str(tmp_path / "jobs.sqlite3")))
+    store = manager.store
+    job_id = store.create_job("a.csv", ROWS, 1, context.version)
+    # seq sigue el orden en que terminan las filas, no el del archivo
+    for row_index in (2, 0, 1):
+        assert store.save_result(job_id, row_index, {"row_index": row_index}) is not None
+    assert store.save_result(job_id, 0, {"row_index": 0}) is None  # ya guardada: no recibe otro seq
+    store.update_job(job_id, status=COMPLETED)
+
+    events = run_stream(manager, job_id, context, last_event_id=1)
+
+    replayed = [(event_id, data["row_index"]) for kind, event_id, data in events if kind == "message"]
+    assert replayed == [("2", 0), ("3", 1)]
+    assert events[-1][0] == "stats"
+
+
+def test_stream_on_another_worker_keeps_the_job_alive_and_takes_it_over(tmp_path, context, fake_llm, monkeypatch):
+    import services.jobs as jobs
+
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.3)  # heartbeat cada 0.1 s
+    monkeypatch.setattr(jobs, "JOB_DISCONNECT_GRACE_SECONDS", 0.3)
+    monkeypatch.setattr(jobs, "SUBSCRIBER_TOUCH_SECONDS", 0.05)
+    monkeypatch.setattr(jobs, "DISCONNECT_POLL_SECONDS", 0.05)
+    fake_llm.latency_seconds = 0.1
+    path = str(tmp_path / "jobs.sqlite3")
+    owner, other = JobManager(JobStore(path)), JobManager(JobStore(path))
+    rows = [{"Nombre": f"Startup {index}"} for index in range(60)]
+    job_id = owner.store.create_job("a.csv", rows, 1, context.version)
+
+    async def scenario():
+        assert owner.start(job_id, context)
+        # El cliente se reconectó al otro worker: el dueño no tiene suscriptores locales
+        stream = asyncio.create_task(_collect(other, job_id, context))
+        await asyncio.sleep(jobs.JOB_DISCONNECT_GRACE_SECONDS * 2)
+        still_running = owner.is_running_here(job_id)
+        # El dueño lo pausa (o se reinicia): el stream abierto lo retoma
+        owner._runners[job_id].cancel()
+        return still_running, await asyncio.wait_for(stream, timeout=10)
+
+    still_running, events = asyncio.run(scenario())
+
+    assert still_running
+    assert len([kind for kind, _, _ in events if kind == "message"]) == len(rows)
+    assert events[-1][0] == "stats"
+    job = other.store.get_job(job_id)
+    assert job["status"] == COMPLETED and 0 < job["completed_rows"] == len(rows)
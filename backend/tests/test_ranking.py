@@ -0,0 +1,22 @@
+from services.ranking import reweight_results
+
+
+def test_rows_without_dimensional_scores_are_left_unranked():
+    rows = [
+        {"row_index": 0, "Nombre": "Conocida", "final_weighted_score": 81.0, "historical_match": {"decision": "Invertida"}},
+        {"row_index": 1, "Nombre": "Baja", "dimensional_scores": {"equipo": 20}},
+        {"row_index": 2, "Nombre": "Alta", "dimensional_scores": {"equipo": 90}},
+    ]
+
+    ranked = reweight_results(rows, {"equipo": 1.0})["rows"]
+
+    assert [row["name"] for row in ranked] == ["Alta", "Baja", "Conocida"]
+    assert [row["rank"] for row in ranked] == [1, 2, None]
+    known = ranked[-1]
+    assert known["final_weighted_score"] is None and known["previous_score"] == 81.0
+
+
+def test_reweight_without_any_scored_row():
+    ranked = reweight_results([{"row_index": 0, "Nombre": "Conocida"}])["rows"]
+
+    assert ranked == [{"row_index": 0, "name": "Conocida", "final_weighted_score": None, "previous_score": None, "rank": None}]
@@ -0,0 +1,34 @@
+import asyncio
+import json
+from collections import Counter
+
+from services.result_cache import normalize_startup_json
+from services.scoring import run_single_scoring
+
+STARTUP = {"Nombre de la startup": "NuevaCo", "Descripción": "Pagos para bodegas"}
+
+
+def test_cache_key_ignores_result_and_dedup_fields():
+    exported = {
+        **STARTUP, "row_index": 3, "final_weighted_score": 71.5, "dimensional_scores": {"equipo": 80},
+        "historical_match": {"name": "NuevaCo"}, "duplicate_of": 1,
+    }
+    assert normalize_startup_json(json.dumps(exported)) == normalize_startup_json(json.dumps(STARTUP))
+
+
+def test_forced_rerun_calls_the_llm_and_refreshes_the_cache(context, fake_llm):
+    first = asyncio.run(run_single_scoring(STARTUP, context))
+    assert fake_llm.calls == 1
+
+    # Lo que manda el dashboard: la fila ya puntuada, con su análisis
+    stats = Counter()
+    asyncio.run(run_single_scoring({**first, "duplicate_of": 0}, context, use_cache=True, stats=stats))
+    assert (fake_llm.calls, stats["cache_hits"]) == (1, 1)
+
+    stats = Counter()
+    rerun = asyncio.run(run_single_scoring({**first, "duplicate_of": 0}, context, use_cache=False, stats=stats))
+    assert (fake_llm.calls, stats["cache_misses"]) == (2, 1)
+    assert "duplicate_of" not in rerun
+    # Al prompt no llegan el análisis anterior ni las marcas de la deduplicación
+    assert "final_weighted_score" not in fake_llm.prompts[-1]
+    assert "duplicate_of" not in fake_llm.prompts[-1]
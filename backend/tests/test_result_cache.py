@@ -0,0 +1,27 @@
+import asyncio
+
+import services.result_cache as result_cache
+import services.scoring as scoring
+from services.result_cache import ResultCache
+
+STARTUP = '{"Nombre": "Alfa"}'
+
+
+def test_scoring_works_when_the_cache_cannot_be_opened(tmp_path, context, fake_llm, monkeypatch):
+    cache = ResultCache(str(tmp_path / "no-existe" / "cache.sqlite3"))
+    monkeypatch.setattr(result_cache, "_result_cache", cache)
+
+    for _ in range(2):
+        result = asyncio.run(scoring.score_startup(STARTUP, context))
+        assert result["dimensional_scores"]
+    assert fake_llm.calls == 2  # sin caché, cada vez va al LLM
+    assert cache.stats()["enabled"] is False and cache.misses == 2
+
+
+def test_cache_errors_are_logged_and_skipped(tmp_path, capsys):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    cache._conn.execute("DROP TABLE results")
+
+    cache.store(STARTUP, "v1", "modelo", {"dimensional_scores": {}})
+    assert cache.lookup(STARTUP, "v1", ["modelo"]) is None
+    assert "Error al guardar en la caché" in capsys.readouterr().out
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from services.llm_scheduler import BULK, INTERACTIVE, LLMScheduler, llm_request_class
+from services.rate_limiter import ModelRateLimiter
+
+# 600 RPM: una petición cada 0.1 s una vez vacío el bucket
+INTERVAL = 0.1
+
+
+def drained_limiter(models):
+    limiter = ModelRateLimiter([(model, int(60 / INTERVAL), 10**12) for model in models])
+    for requests_bucket, _ in limiter._buckets.values():
+        requests_bucket.drain()
+    return limiter
+
+
+def test_interactive_takes_the_next_quota_before_waiting_bulk_calls():
+    async def scenario():
+        limiter = drained_limiter(["m"])
+        granted = []
+
+        async def call(tag, priority):
+            await limiter.acquire("m", 1, priority=priority)
+            granted.append(tag)
+
+        bulk = [asyncio.create_task(call(f"bulk{i}", 1)) for i in range(5)]
+        await asyncio.sleep(INTERVAL / 2)
+        await call("interactive", 0)
+        await asyncio.gather(*bulk)
+        return granted
+
+    granted = asyncio.run(scenario())
+    assert granted.index("interactive") <= 1
+    assert [tag for tag in granted if tag != "interactive"] == [f"bulk{i}" for i in range(5)]
+
+
+def test_interactive_rerun_is_not_stuck_behind_two_bulk_jobs(context, fake_llm, monkeypatch):
+    import services.scoring as scoring
+
+    limiter = drained_limiter([model for model, _, _ in scoring.MODEL_PRIORITY_CONFIG])
+    monkeypatch.setattr(scoring, "rate_limiter", limiter)
+    monkeypatch.setattr(scoring.model_router, "rate_limiter", limiter)
+
+    async def scenario():
+        async def bulk_call(job_key):
+            with llm_request_class(BULK, job_key):
+                await scoring.call_llm_with_fallback("fila masiva", context)
+
+        bulk = [asyncio.create_task(bulk_call(job)) for job in ("A", "B") for _ in range(8)]
+        await asyncio.sleep(INTERVAL * 2)
+        started = time.perf_counter()
+        with llm_request_class(INTERACTIVE):
+            await scoring.call_llm_with_fallback("re-análisis", context)
+        elapsed = time.perf_counter() - started
+        for task in bulk:
+            task.cancel()
+        await asyncio.gather(*bulk, return_exceptions=True)
+        return elapsed
+
+    # Sin prioridad en la cuota esperaría detrás de todas las masivas (~1.6 s)
+    assert asyncio.run(scenario()) < INTERVAL * 3
+
+
+def test_scheduler_round_robin_job_limits_and_interactive_first():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=3, interactive_reserved=1, job_concurrency=2)
+        order = []
+
+        async def call(tag, priority, job_key=None, job_limit=None):
+            async with scheduler.slot(priority, job_key, job_limit):
+                order.append(tag)
+                await asyncio.sleep(0.02)
+
+        tasks = [asyncio.create_task(call(f"A{i}", BULK, "A")) for i in range(6)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(call(f"B{i}", BULK, "B", 1)) for i in range(3)]
+        await asyncio.sleep(0.005)
+        status = scheduler.status("B")
+        tasks.append(asyncio.create_task(call("I0", INTERACTIVE)))
+        cancelled = asyncio.create_task(call("X", BULK, "C"))
+        await asyncio.sleep(0.005)
+        cancelled.cancel()
+        await asyncio.gather(*tasks)
+        return order, status, scheduler.status()
+
+    order, status_b, final = asyncio.run(scenario())
+    # A ocupa los 2 lugares masivos; la interactiva entra por el lugar reservado; después, turnos A/B
+    assert order == ["A0", "A1", "I0", "A2", "B0", "A3", "B1", "A4", "B2", "A5"]
+    assert (status_b["job_queued"], status_b["job_running"]) == (3, 0)
+    assert status_b["estimated_wait_seconds"] > 0
+    assert final["queued"] == {INTERACTIVE: 0, BULK: 0} and final["running"] == {INTERACTIVE: 0, BULK: 0}
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import services.scoring as scoring
+from services.llm_scheduler import get_llm_scheduler
+from services.model_router import OPEN
+
+
+def open_all_circuits(seconds):
+    for health in scoring.model_router.models.values():
+        scoring.model_router._open(health, seconds, "test")
+
+
+def test_long_circuit_pause_fails_the_row_without_waiting(context, fake_llm):
+    open_all_circuits(3600)
+
+    started = time.perf_counter()
+    assert asyncio.run(scoring.call_llm_with_fallback("fila", context)) == (None, None, None)
+    assert time.perf_counter() - started < 1
+    assert fake_llm.calls == 0
+
+
+def test_short_circuit_pause_is_waited_without_holding_a_slot(context, fake_llm):
+    open_all_circuits(0.2)
+
+    async def scenario():
+        call = asyncio.create_task(scoring.call_llm_with_fallback("fila", context))
+        await asyncio.sleep(0.1)
+        running_while_paused = get_llm_scheduler().status()["running"]
+        return await call, running_while_paused
+
+    (text, model_name, _), running = asyncio.run(scenario())
+    assert text is not None and model_name is not None
+    assert sum(running.values()) == 0
+
+
+def test_unparseable_response_counts_only_as_a_parse_failure(context, fake_llm, monkeypatch):
+    monkeypatch.setattr(scoring, "STRUCTURED_OUTPUT", False)
+    fake_llm.malformed_rate = 1.0
+
+    result, model_name = asyncio.run(scoring.get_llm_dimensional_scoring('{"Nombre": "Rota"}', context))
+
+    assert model_name is None and result == scoring.build_default_response()
+    outcomes = [outcome for health in scoring.model_router.models.values() for _, outcome, _ in health.samples]
+    assert outcomes == [scoring.PARSE_FAILURE]
+
+
+def test_half_open_probe_with_garbage_reopens_the_circuit(context, fake_llm, monkeypatch):
+    monkeypatch.setattr(scoring, "STRUCTURED_OUTPUT", False)
+    open_all_circuits(0)
+    fake_llm.malformed_rate = 1.0
+
+    asyncio.run(scoring.get_llm_dimensional_scoring('{"Nombre": "Rota"}', context))
+
+    states = [health.state for health in scoring.model_router.models.values() if health.samples]
+    assert states == [OPEN]
+
+
+# --- Lotes ---
+
+ROWS = [(index, f'{{"Nombre": "Startup {index}"}}') for index in range(3)]
+
+
+def fake_batch_responses(monkeypatch, batch_text):
+    """El lote responde `batch_text` (o falla si es None); las llamadas individuales, un JSON válido."""
+    prompts = []
+
+    async def fake_call(prompt, context, response_schema=None, stream_parser=None):
+        prompts.append(prompt)
+        if "row_id=" in prompt:
+            return (batch_text, "modelo-lote", 0.1) if batch_text is not None else (None, None, None)
+        return '{"dimensional_scores": {"equipo": 90}}', "modelo-fila", 0.1
+
+    monkeypatch.setattr(scoring, "call_llm_with_fallback", fake_call)
+    monkeypatch.setattr(scoring, "STRUCTURED_OUTPUT", False)
+    return prompts
+
+
+def test_only_entries_missing_from_a_parsed_batch_are_retried(context, fake_llm, monkeypatch):
+    batch_text = """```json
+    [{"row_id": 0, "dimensional_scores": {"equipo": 70}},
+     {"row_id": 1, "dimensional_scores": "no es un objeto"},
+     {"row_id": 7, "dimensional_scores": {"equipo": 10}},]
+    ```"""
+    prompts = fake_batch_responses(monkeypatch, batch_text)
+
+    results = asyncio.run(scoring.score_startups_batch(ROWS, context, scoring.Counter(), batch_size=3))
+
+    assert len(prompts) == 3  # el lote y las filas 1 y 2 (la 7 no era del lote)
+    assert results[0]["dimensional_scores"] == {"equipo": 70}
+    assert results[1]["dimensional_scores"] == results[2]["dimensional_scores"] == {"equipo": 90}
+
+
+def test_failed_batch_is_reported_without_retrying_each_row(context, fake_llm, monkeypatch):
+    for batch_text in (None, "Lo siento, no puedo responder en JSON."):
+        prompts = fake_batch_responses(monkeypatch, batch_text)
+
+        results = asyncio.run(scoring.score_startups_batch(ROWS, context, scoring.Counter(), batch_size=3))
+
+        assert len(prompts) == 1
+        assert all(result == scoring.build_default_response() for result in results.values())
+        assert sorted(results) == [0, 1, 2]
+    # Las respuestas por defecto no se guardan: la próxima vez se vuelve a pedir al LLM
+    stats = scoring.Counter()
+    fake_batch_responses(monkeypatch, None)
+    asyncio.run(scoring.score_startups_batch(ROWS, context, stats, batch_size=3))
+    assert stats["cache_hits"] == 0
+
+
+# --- Modo estructurado ---
+
+def cut_first_response(fake_llm, monkeypatch, repair_too=False):
+    """La primera respuesta (y la reparación, con `repair_too`) llega cortada a la mitad; guarda los esquemas pedidos."""
+    schemas = []
+    original = fake_llm.generate
+
+    async def generate(*args, response_schema=None, **kwargs):
+        schemas.append(response_schema)
+        fake_llm.malformed_rate = 1.0 if len(schemas) == 1 or repair_too else 0.0
+        return await original(*args, response_schema=response_schema, **kwargs)
+
+    monkeypatch.setattr(fake_llm, "generate", generate)
+    monkeypatch.setattr(scoring, "STRUCTURED_OUTPUT", True)
+    return schemas
+
+
+def test_structured_repair_asks_only_for_the_missing_fields(context, fake_llm, monkeypatch):
+    schemas = cut_first_response(fake_llm, monkeypatch)
+
+    result, model_name = asyncio.run(scoring.get_llm_dimensional_scoring('{"Nombre": "Cortada"}', context))
+
+    assert model_name is not None and not scoring.missing_fields(result)
+    full, repair = (
+        {(section, key) for section, part in schema["properties"].items() for key in part["properties"]}
+        for schema in schemas
+    )
+    assert repair and repair < full
+
+
+def test_unrepaired_fields_fall_back_to_defaults_and_are_not_cached(context, fake_llm, monkeypatch):
+    cut_first_response(fake_llm, monkeypatch, repair_too=True)
+
+    result, model_name = asyncio.run(scoring.get_llm_dimensional_scoring('{"Nombre": "Cortada"}', context))
+
+    assert model_name is None  # score_startup solo guarda en caché si hay modelo
+    assert not scoring.missing_fields(result)
+    assert fake_llm.calls == 2
+
+
+def test_partials_from_an_abandoned_attempt_are_reset(context, fake_llm, monkeypatch):
+    """El primer modelo envía la mitad de los puntajes y responde 429: sus parciales no deben quedar."""
+    monkeypatch.setattr(scoring, "STRUCTURED_OUTPUT", True)
+    original = fake_llm.generate
+
+    async def generate(model_name, *args, on_text=None, **kwargs):
+        if fake_llm.calls > 0:
+            return await original(model_name, *args, on_text=on_text, **kwargs)
+        chunks = []
+
+        def fail_halfway(text):
+            chunks.append(text)
+            on_text(text)
+            if len(chunks) == 2:
+                raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+
+        return await original(model_name, *args, on_text=fail_halfway, **kwargs)
+
+    monkeypatch.setattr(fake_llm, "generate", generate)
+    events = []
+    token = scoring._partial_listener.set(lambda category, score: events.append((category, score)))
+    try:
+        result, model_name = asyncio.run(scoring.get_llm_dimensional_scoring('{"Nombre": "Failover"}', context))
+    finally:
+        scoring._partial_listener.reset(token)
+
+    assert model_name is not None and fake_llm.calls == 2
+    reset = events.index((None, None))
+    assert events[:reset]  # el intento abandonado alcanzó a publicar
+    assert dict(events[reset + 1:]) == result["dimensional_scores"]